@@ -1,7 +1,13 @@
+import queue
 import sqlite3
-import json
+import time
 from datetime import datetime
-from typing import List
+from typing import List, Union
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from game.session_pipeline import SessionPipeline
+from game.session_recorder import SessionRecorder
 
 
 class DatabaseSync:
@@ -12,6 +18,7 @@ class DatabaseSync:
     def __init__(self, db_path: str = 'user_data.db'):
         self.db_path = db_path
         self.ensure_database_exists()
+        self.pipeline = SessionPipeline(db_path)
 
     def ensure_database_exists(self):
         """Upewnia się, że baza danych istnieje z tabelami używanymi przez stats"""
@@ -28,12 +35,15 @@ class DatabaseSync:
                     time_intervals TEXT,
                     total_time_seconds INTEGER DEFAULT 0,
                     score INTEGER DEFAULT 0,
+                    heartbeat_data TEXT,
                     avg_heartbeat REAL DEFAULT 0.0,
                     min_heartbeat INTEGER DEFAULT 0,
                     max_heartbeat INTEGER DEFAULT 0,
                     stress_level REAL DEFAULT 0.0,
                     rest_quality_score REAL DEFAULT 0.0,
-                    interruption_count INTEGER DEFAULT 0
+                    interruption_count INTEGER DEFAULT 0,
+                    session_completed BOOLEAN DEFAULT 1,
+                    notes TEXT
                 )
             ''')
 
@@ -47,7 +57,93 @@ class DatabaseSync:
                     total_sessions INTEGER DEFAULT 0,
                     total_time_seconds INTEGER DEFAULT 0,
                     current_streak INTEGER DEFAULT 0,
-                    longest_streak INTEGER DEFAULT 0
+                    longest_streak INTEGER DEFAULT 0,
+                    level INTEGER DEFAULT 1,
+                    experience_points INTEGER DEFAULT 0,
+                    created_date TEXT,
+                    last_activity TEXT,
+                    is_active BOOLEAN DEFAULT 1
+                )
+            ''')
+
+            # Tabele poziomów i osiągnięć - czytane przez SessionPipeline przy zapisie sesji
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS UserLevels (
+                    level INTEGER PRIMARY KEY,
+                    experience_required INTEGER NOT NULL,
+                    level_name TEXT NOT NULL,
+                    bonus_multiplier REAL DEFAULT 1.0
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS Achievements (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL UNIQUE,
+                    description TEXT NOT NULL,
+                    requirement_type TEXT NOT NULL,
+                    requirement_value INTEGER NOT NULL,
+                    points_reward INTEGER DEFAULT 0,
+                    badge_icon TEXT,
+                    rarity TEXT DEFAULT 'common',
+                    is_active BOOLEAN DEFAULT 1,
+                    created_date TEXT NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS UserAchievements (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    achievement_id INTEGER NOT NULL,
+                    earned_date TEXT NOT NULL,
+                    points_awarded INTEGER DEFAULT 0,
+                    UNIQUE(user_id, achievement_id)
+                )
+            ''')
+
+            # Próbki tętna sesji (z wskaźnikiem stresu HRV) - zapisywane przez SessionPipeline
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS HeartbeatData (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    heartbeat_bpm INTEGER NOT NULL,
+                    stress_indicator REAL DEFAULT 0.0,
+                    activity_level TEXT DEFAULT 'resting',
+                    data_quality REAL DEFAULT 1.0,
+                    FOREIGN KEY (session_id) REFERENCES Sessions (id) ON DELETE CASCADE,
+                    FOREIGN KEY (user_id) REFERENCES Users (id) ON DELETE CASCADE
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_heartbeat_session_time
+                ON HeartbeatData (session_id, timestamp)
+            ''')
+
+            # Mrugnięcia na minutę w trakcie pracy (zapisywane paczkami)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS BlinkRate (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    blinks_per_minute REAL NOT NULL,
+                    blink_count INTEGER NOT NULL,
+                    tracked_seconds REAL NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_blink_rate_user_time
+                ON BlinkRate (user_id, timestamp)
+            ''')
+
+            # Kalibracja postawy (PostureWorker) - jeden wiersz na użytkownika
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS PostureCalibration (
+                    user_id INTEGER PRIMARY KEY,
+                    base_dy REAL NOT NULL,
+                    base_dz REAL NOT NULL,
+                    base_torso_angle REAL NOT NULL,
+                    last_updated TEXT NOT NULL
                 )
             ''')
 
@@ -56,75 +152,170 @@ class DatabaseSync:
             if cursor.fetchone()[0] == 0:
                 cursor.execute('''
                     INSERT INTO Users (id, first_name, last_name, total_points, total_sessions, 
-                                     total_time_seconds, current_streak, longest_streak)
-                    VALUES (1, 'Jan', 'Kowalski', 0, 0, 0, 0, 0)
-                ''')
+                                     total_time_seconds, current_streak, longest_streak, created_date)
+                    VALUES (1, 'Jan', 'Kowalski', 0, 0, 0, 0, 0, ?)
+                ''', (datetime.now().isoformat(),))
 
             conn.commit()
 
     def sync_session(self,
                      user_id: int,
-                     heartbeat_data: List[int],
+                     heartbeat_data: Union[SessionRecorder, List[int]],
                      stress_level: float,
                      time_intervals: List[float],
                      points: int,
-                     exercise_type: str = 'break') -> int:
+                     exercise_type: str = 'break',
+                     interruption_count: int = 0) -> int:
         """
         Zapisuje sesję z niezbędnymi danymi dla statystyk.
 
+        Sesja, sumy użytkownika, seria dni, poziom i osiągnięcia zapisywane są
+        w jednej transakcji (SessionPipeline) - jeden commit na przerwę.
+
         Returns:
             int: ID utworzonej sesji
         """
+        if not isinstance(heartbeat_data, SessionRecorder):
+            heartbeat_data = SessionRecorder.from_samples(heartbeat_data)
+
+        # Oblicz ocenę jakości odpoczynku (0-10)
+        avg_heartbeat = heartbeat_data.mean
+        rest_quality = 5.0  # bazowa wartość
+        if avg_heartbeat < 70:
+            rest_quality += 2.0
+        if stress_level < 0.3:
+            rest_quality += 1.5
+        rest_quality = min(10.0, max(0.0, rest_quality))
+
+        result = self.pipeline.finalize_session(
+            user_id,
+            time_intervals,
+            heartbeat_data=heartbeat_data,  # zapisywane jako CSV (kompatybilność z chart_widgets)
+            stress_level=stress_level,
+            rest_quality=rest_quality,
+            points=points,
+            interruption_count=interruption_count,
+            exercise_type=exercise_type
+        )
+        return result['session_id'] or 0
+
+    def save_blink_rates(self, user_id: int, rows: List[tuple]) -> int:
+        """
+        Zapisuje paczkę pomiarów mrugania w jednej transakcji.
 
+        Args:
+            rows: (timestamp, blinks_per_minute, blink_count, tracked_seconds)
+
+        Returns:
+            int: Liczba zapisanych wierszy
+        """
         with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            current_time = datetime.now().isoformat()
+            conn.executemany('''
+                INSERT INTO BlinkRate (user_id, timestamp, blinks_per_minute, blink_count, tracked_seconds)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(user_id,) + tuple(row) for row in rows])
+        return len(rows)
+
+    def load_posture_calibration(self, user_id: int):
+        """
+        Returns:
+            tuple: (base_dy, base_dz, base_torso_angle) albo None, gdy brak kalibracji
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute('''
+                    SELECT base_dy, base_dz, base_torso_angle FROM PostureCalibration WHERE user_id = ?
+                ''', (user_id,)).fetchone()
+            return tuple(row) if row else None
+        except sqlite3.Error as e:
+            print(f"Błąd odczytu kalibracji postawy: {e}")
+            return None
 
-            # Oblicz statystyki tętna
-            avg_heartbeat = sum(heartbeat_data) / len(heartbeat_data)
-            min_heartbeat = min(heartbeat_data)
-            max_heartbeat = max(heartbeat_data)
+    def save_posture_calibration(self, user_id: int, base_dy: float, base_dz: float,
+                                 base_torso_angle: float) -> bool:
+        """Zapisuje (nadpisuje) kalibrację postawy użytkownika."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO PostureCalibration
+                    (user_id, base_dy, base_dz, base_torso_angle, last_updated)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, base_dy, base_dz, base_torso_angle, datetime.now().isoformat()))
+            return True
+        except sqlite3.Error as e:
+            print(f"Błąd zapisu kalibracji postawy: {e}")
+            return False
 
-            # Oblicz całkowity czas
-            total_time_seconds = int(sum(time_intervals))
 
-            # Oblicz ocenę jakości odpoczynku (0-10)
-            rest_quality = 5.0  # bazowa wartość
-            if avg_heartbeat < 70:
-                rest_quality += 2.0
-            if stress_level < 0.3:
-                rest_quality += 1.5
-            rest_quality = min(10.0, max(0.0, rest_quality))
+class SessionWriterThread(QThread):
+    """
+    Wątek zapisujący zakończone sesje do bazy poza pętlą zdarzeń Qt.
+
+    GUI tylko wrzuca gotowy rekord do kolejki (submit) - zapis, fsync i
+    ponawianie przy zablokowanej bazie (SQLITE_BUSY) dzieją się tutaj.
+    """
 
-            # Konwertuj heartbeat_data na CSV string (dla kompatybilności z chart_widgets)
-            heartbeat_csv = ','.join(map(str, heartbeat_data)) if heartbeat_data else ''
+    session_saved_signal = pyqtSignal(int, dict)  # session_id, zapisany rekord
+    session_failed_signal = pyqtSignal(str, dict)  # komunikat błędu, rekord
 
-            # Wstaw sesję
-            cursor.execute('''
-                INSERT INTO Sessions (
-                    user_id, timestamp, exercise_type, time_intervals, 
-                    total_time_seconds, score, heartbeat_data, avg_heartbeat, min_heartbeat, 
-                    max_heartbeat, stress_level, rest_quality_score, interruption_count
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                user_id, current_time, exercise_type, json.dumps(time_intervals),
-                total_time_seconds, points, heartbeat_csv, avg_heartbeat, min_heartbeat,
-                max_heartbeat, stress_level, rest_quality, 0
-            ))
-
-            session_id = cursor.lastrowid or 0
-
-            # Aktualizuj statystyki użytkownika
-            cursor.execute('''
-                UPDATE Users SET
-                    total_points = total_points + ?,
-                    total_sessions = total_sessions + 1,
-                    total_time_seconds = total_time_seconds + ?
-                WHERE id = ?
-            ''', (points, total_time_seconds, user_id))
+    MAX_RETRIES = 5
+    RETRY_BASE_DELAY_S = 0.2  # 0.2, 0.4, 0.8, ... (backoff wykładniczy)
 
-            conn.commit()
-            return session_id
+    _STOP = object()
+    _BLINKS = object()
+
+    def __init__(self, db_sync: DatabaseSync, parent=None):
+        super().__init__(parent)
+        self.db_sync = db_sync
+        self._queue = queue.Queue()
+
+    def submit(self, record: dict):
+        """Kolejkuje sesję do zapisu (argumenty DatabaseSync.sync_session). Nie blokuje."""
+        self._queue.put(record)
+
+    def submit_blink_rates(self, user_id: int, rows: List[tuple]):
+        """Kolejkuje paczkę pomiarów mrugania (DatabaseSync.save_blink_rates). Nie blokuje."""
+        self._queue.put((self._BLINKS, user_id, list(rows)))
+
+    def run(self):
+        while True:
+            record = self._queue.get()
+            if record is self._STOP:
+                break
+            if isinstance(record, tuple) and record[0] is self._BLINKS:
+                self._write_blink_rates(record[1], record[2])
+            else:
+                self._write(record)
+
+    def _with_retries(self, write):
+        """Wywołuje write(); przy zablokowanej bazie ponawia z backoffem, inne błędy przepuszcza."""
+        for attempt in range(self.MAX_RETRIES + 1):
+            try:
+                return write()
+            except sqlite3.OperationalError as e:
+                busy = 'locked' in str(e) or 'busy' in str(e)
+                if not busy or attempt == self.MAX_RETRIES:
+                    raise
+                time.sleep(self.RETRY_BASE_DELAY_S * (2 ** attempt))
+
+    def _write(self, record: dict):
+        try:
+            session_id = self._with_retries(lambda: self.db_sync.sync_session(**record))
+        except Exception as e:
+            self.session_failed_signal.emit(str(e), record)
+            return
+        self.session_saved_signal.emit(session_id, record)
+
+    def _write_blink_rates(self, user_id: int, rows: List[tuple]):
+        try:
+            self._with_retries(lambda: self.db_sync.save_blink_rates(user_id, rows))
+        except Exception as e:
+            print(f"Błąd zapisu pomiarów mrugania ({len(rows)}): {e}")
+
+    def stop(self):
+        """Zapisuje wszystko, co jest jeszcze w kolejce, i kończy wątek."""
+        self._queue.put(self._STOP)
+        self.wait()
 
 
 # Przykład użycia
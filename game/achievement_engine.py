@@ -0,0 +1,133 @@
+import bisect
+from datetime import datetime
+
+
+# Users column backing each Achievements.requirement_type
+REQUIREMENT_STAT_COLUMNS = {
+    'points': 'total_points',
+    'sessions': 'total_sessions',
+    'total_time': 'total_time_seconds',
+    'streak': 'current_streak',
+}
+
+
+class AchievementEngine:
+    """
+    Incremental achievement evaluation.
+
+    Active achievements are loaded once and indexed by requirement_type, with
+    thresholds kept sorted. When a stat moves from old to new value, the newly
+    crossed thresholds are found with two bisects instead of scanning every
+    unearned achievement. Awards are written through the caller's cursor, so
+    they land in the same transaction as the session that earned them.
+
+    Until a user is marked with mark_caught_up() (after the caller's commit),
+    every award for them runs a full catch-up (every threshold already
+    reached), so achievements a user qualified for before the crossing-only
+    path was used are still granted, also when an earlier catch-up was rolled back.
+    """
+
+    def __init__(self):
+        self._thresholds = None  # requirement_type -> sorted [requirement_value]
+        self._achievements = None  # requirement_type -> [(id, name, description, value, reward)] in the same order
+        self._caught_up = set()  # user ids whose already-reached thresholds were checked
+
+    def invalidate(self):
+        """Drop the cached index (call after editing the Achievements table)."""
+        self._thresholds = None
+        self._achievements = None
+        self._caught_up.clear()  # new achievements may already be reached
+
+    def mark_caught_up(self, user_id):
+        """Record a committed catch-up; later awards for the user only check crossings."""
+        self._caught_up.add(user_id)
+
+    def _ensure_index(self, cursor):
+        if self._thresholds is not None:
+            return
+
+        cursor.execute('''
+            SELECT id, name, description, requirement_type, requirement_value, points_reward
+            FROM Achievements
+            WHERE is_active = 1
+            ORDER BY requirement_type, requirement_value, id
+        ''')
+
+        thresholds = {}
+        achievements = {}
+        for achievement_id, name, description, req_type, req_value, points_reward in cursor.fetchall():
+            thresholds.setdefault(req_type, []).append(req_value)
+            achievements.setdefault(req_type, []).append((achievement_id, name, description, req_value, points_reward))
+
+        self._thresholds = thresholds
+        self._achievements = achievements
+
+    def crossed(self, cursor, req_type, old_value, new_value):
+        """
+        Achievements of one requirement type whose threshold lies in (old_value, new_value].
+
+        Pass old_value=None to get every threshold already reached (catch-up).
+        """
+        self._ensure_index(cursor)
+        values = self._thresholds.get(req_type)
+        if not values or new_value is None:
+            return []
+
+        lo = 0 if old_value is None else bisect.bisect_right(values, old_value)
+        hi = bisect.bisect_right(values, new_value)
+        return self._achievements[req_type][lo:hi]
+
+    def award_crossed(self, cursor, user_id, old_stats, new_stats):
+        """
+        Award every achievement crossed between two stat snapshots.
+
+        Args:
+            cursor: Cursor of the caller's open transaction (not committed here)
+            user_id (int): User receiving the achievements
+            old_stats (dict|None): requirement_type -> value before the change,
+                                   None to check everything already reached
+                                   (always the case until mark_caught_up(user_id))
+            new_stats (dict): requirement_type -> value after the change
+
+        Returns:
+            list: Newly earned achievements as dicts
+        """
+        current_time = datetime.now().isoformat()
+        newly_earned = []
+        if user_id not in self._caught_up:
+            old_stats = None
+
+        for req_type, new_value in new_stats.items():
+            old_value = None if old_stats is None else old_stats.get(req_type)
+            for achievement_id, name, description, req_value, points_reward in self.crossed(cursor, req_type, old_value, new_value):
+                # UNIQUE(user_id, achievement_id) makes re-awarding a no-op
+                cursor.execute('''
+                    INSERT OR IGNORE INTO UserAchievements (user_id, achievement_id, earned_date, points_awarded)
+                    VALUES (?, ?, ?, 0)
+                ''', (user_id, achievement_id, current_time))
+                if cursor.rowcount > 0:
+                    newly_earned.append({
+                        'id': achievement_id,
+                        'name': name,
+                        'description': description,
+                        'requirement_type': req_type,
+                        'requirement_value': req_value,
+                        'points_reward': points_reward
+                    })
+
+        if newly_earned:
+            cursor.execute('UPDATE Users SET last_activity = ? WHERE id = ?', (current_time, user_id))
+
+        return newly_earned
+
+
+def read_requirement_stats(cursor, user_id):
+    """Current values of all requirement stats for a user, or None if the user is missing."""
+    cursor.execute(f'''
+        SELECT {', '.join(REQUIREMENT_STAT_COLUMNS.values())}
+        FROM Users WHERE id = ?
+    ''', (user_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return dict(zip(REQUIREMENT_STAT_COLUMNS.keys(), row))
@@ -76,39 +76,21 @@ class AchievementSystem:
     
     def check_and_award_achievements(self, user_id, total_points, total_sessions, total_time):
         """Check and award achievements based on user stats"""
-        newly_earned = []
-        
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
-                # Get all achievements user doesn't have yet
-                cursor.execute('''
-                    SELECT a.* FROM Achievements a
-                    WHERE a.id NOT IN (
-                        SELECT achievement_id FROM UserAchievements WHERE user_id = ?
-                    )
-                ''', (user_id,))
-                
-                available_achievements = cursor.fetchall()
+                # Indexed, bisect-based check - awards go through this one connection
+                stats = {'points': total_points, 'sessions': total_sessions, 'total_time': total_time}
+                engine = self.db_manager.achievement_engine
+                earned = engine.award_crossed(cursor, user_id, None, stats)
+                conn.commit()
+                engine.mark_caught_up(user_id)
                 
-                for achievement in available_achievements:
-                    achievement_id, name, description, req_type, req_value, points = achievement
-                    
-                    # Check if requirements are met
-                    earned = False
-                    if req_type == 'points' and total_points >= req_value:
-                        earned = True
-                    elif req_type == 'sessions' and total_sessions >= req_value:
-                        earned = True
-                    elif req_type == 'total_time' and total_time >= req_value:
-                        earned = True
-                    
-                    if earned:
-                        # Award the achievement
-                        if self.db_manager.award_achievement(user_id, achievement_id):
-                            newly_earned.append((name, description, points))
-                            print(f"🏆 New achievement earned: {name}")
+                newly_earned = []
+                for achievement in earned:
+                    newly_earned.append((achievement['name'], achievement['description'], achievement['points_reward']))
+                    print(f"🏆 New achievement earned: {achievement['name']}")
                 
                 return newly_earned
                 
@@ -1,9 +1,18 @@
 import sqlite3
 import os
 
+try:
+    from achievement_engine import AchievementEngine, read_requirement_stats
+    from session_pipeline import SessionPipeline, check_level_up, heartbeat_data_quality
+except ImportError:  # imported as part of the `game` package
+    from game.achievement_engine import AchievementEngine, read_requirement_stats
+    from game.session_pipeline import SessionPipeline, check_level_up, heartbeat_data_quality
+
 class DatabaseManager:
     def __init__(self, db_path='../user_data.db'):
         self.db_path = db_path
+        self.achievement_engine = AchievementEngine()
+        self.session_pipeline = SessionPipeline(db_path, self.achievement_engine)
         self.init_database()
     
     def init_database(self):
@@ -128,11 +137,37 @@ class DatabaseManager:
                         created_date TEXT NOT NULL,
                         last_updated TEXT NOT NULL,
                         is_active BOOLEAN DEFAULT 1,
+                        spread_x_degrees REAL,
+                        spread_y_degrees REAL,
+                        sample_count INTEGER,
                         FOREIGN KEY (user_id) REFERENCES Users (id) ON DELETE CASCADE,
                         UNIQUE(user_id, monitor_name)
                     )
                 ''')
                 
+                # Create PostureCalibration table (upright baseline for the posture worker)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS PostureCalibration (
+                        user_id INTEGER PRIMARY KEY,
+                        base_dy REAL NOT NULL,
+                        base_dz REAL NOT NULL,
+                        base_torso_angle REAL NOT NULL,
+                        last_updated TEXT NOT NULL
+                    )
+                ''')
+                
+                # Create BlinkRate table (blinks per minute while working, written in batches)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS BlinkRate (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER NOT NULL,
+                        timestamp TEXT NOT NULL,
+                        blinks_per_minute REAL NOT NULL,
+                        blink_count INTEGER NOT NULL,
+                        tracked_seconds REAL NOT NULL
+                    )
+                ''')
+                
                 # Create EyeTrackingData table for storing gaze tracking history
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS EyeTrackingData (
@@ -208,6 +243,12 @@ class DatabaseManager:
                     ON DailyHealthStats (user_id, date)
                 ''')
                 
+                # Streak lookup (last completed session of a user)
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_sessions_user_time 
+                    ON Sessions (user_id, timestamp)
+                ''')
+                
                 conn.commit()
                 print(f"Database initialized successfully: {self.db_path}")
                 
@@ -345,6 +386,8 @@ class DatabaseManager:
                 cursor = conn.cursor()
                 from datetime import datetime
                 
+                stats_before = read_requirement_stats(cursor, user_id)
+                
                 # Add points to user
                 cursor.execute('''
                     UPDATE Users 
@@ -357,10 +400,11 @@ class DatabaseManager:
                 # Check for level up
                 self._check_level_up(cursor, user_id)
                 
-                conn.commit()
+                # Award achievements crossed by this change in the same transaction
+                newly_earned = self._award_crossed_achievements(cursor, user_id, stats_before)
                 
-                # After adding points, automatically check for new achievements
-                newly_earned = self.auto_check_and_award_achievements(user_id)
+                conn.commit()
+                self.achievement_engine.mark_caught_up(user_id)
                 
                 return {
                     'success': True,
@@ -452,23 +496,15 @@ class DatabaseManager:
     
     def _check_level_up(self, cursor, user_id):
         """Internal method to check and update user level"""
-        # Get user's current experience
-        cursor.execute('SELECT level, experience_points FROM Users WHERE id = ?', (user_id,))
-        current_level, experience = cursor.fetchone()
-        
-        # Find the highest level the user qualifies for
-        cursor.execute('''
-            SELECT level FROM UserLevels 
-            WHERE experience_required <= ? 
-            ORDER BY level DESC LIMIT 1
-        ''', (experience,))
-        
-        result = cursor.fetchone()
-        if result and result[0] > current_level:
-            new_level = result[0]
-            cursor.execute('UPDATE Users SET level = ? WHERE id = ?', (new_level, user_id))
-            return new_level
-        return current_level
+        return check_level_up(cursor, user_id)
+    
+    def _award_crossed_achievements(self, cursor, user_id, stats_before):
+        """Award achievements whose thresholds were crossed since stats_before
+        (no commit - call achievement_engine.mark_caught_up(user_id) after committing)"""
+        stats_after = read_requirement_stats(cursor, user_id)
+        if not stats_after:
+            return []
+        return self.achievement_engine.award_crossed(cursor, user_id, stats_before, stats_after)
     
     def auto_check_and_award_achievements(self, user_id):
         """Automatically check and award all eligible achievements for a user"""
@@ -476,54 +512,10 @@ class DatabaseManager:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
-                # Get user stats
-                cursor.execute('''
-                    SELECT total_points, total_sessions, total_time_seconds, current_streak
-                    FROM Users WHERE id = ?
-                ''', (user_id,))
-                
-                user_stats = cursor.fetchone()
-                if not user_stats:
-                    return []
-                
-                total_points, total_sessions, total_time, current_streak = user_stats
-                
-                # Get achievements user doesn't have yet
-                cursor.execute('''
-                    SELECT a.id, a.name, a.requirement_type, a.requirement_value, a.points_reward
-                    FROM Achievements a
-                    WHERE a.is_active = 1 
-                    AND a.id NOT IN (
-                        SELECT achievement_id FROM UserAchievements WHERE user_id = ?
-                    )
-                ''', (user_id,))
-                
-                available_achievements = cursor.fetchall()
-                newly_earned = []
-                
-                for achievement in available_achievements:
-                    achievement_id, name, req_type, req_value, points_reward = achievement
-                    
-                    # Check if requirements are met
-                    earned = False
-                    if req_type == 'points' and total_points >= req_value:
-                        earned = True
-                    elif req_type == 'sessions' and total_sessions >= req_value:
-                        earned = True
-                    elif req_type == 'total_time' and total_time >= req_value:
-                        earned = True
-                    elif req_type == 'streak' and current_streak >= req_value:
-                        earned = True
-                    
-                    if earned:
-                        if self.award_achievement(user_id, achievement_id):
-                            newly_earned.append({
-                                'id': achievement_id,
-                                'name': name,
-                                'requirement_type': req_type,
-                                'requirement_value': req_value
-                            })
-                
+                # Catch-up check: every threshold already reached (bisect per requirement type)
+                newly_earned = self._award_crossed_achievements(cursor, user_id, None)
+                conn.commit()
+                self.achievement_engine.mark_caught_up(user_id)
                 return newly_earned
                 
         except sqlite3.Error as e:
@@ -598,47 +590,17 @@ class DatabaseManager:
     def complete_exercise_session(self, user_id, time_intervals, exercise_type="general"):
         """Complete an exercise session: add session, update stats, add points, check achievements"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                from datetime import datetime
-                
-                # Calculate points using ScoreManager
-                from score_manager import ScoreManager
-                score_manager = ScoreManager()
-                session_points = score_manager.calculate_session_score(time_intervals)
-                total_time = sum(time_intervals)
-                
-                # Add session record
-                cursor.execute('''
-                    INSERT INTO Sessions (user_id, timestamp, exercise_type, time_intervals, total_time_seconds, score)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (user_id, datetime.now().isoformat(), exercise_type, str(time_intervals), total_time, session_points))
-                
-                # Update user stats
-                cursor.execute('''
-                    UPDATE Users 
-                    SET total_points = total_points + ?,
-                        total_sessions = total_sessions + 1,
-                        total_time_seconds = total_time_seconds + ?,
-                        experience_points = experience_points + ?,
-                        last_activity = ?
-                    WHERE id = ?
-                ''', (session_points, total_time, session_points, datetime.now().isoformat(), user_id))
-                
-                # Check for level up
-                self._check_level_up(cursor, user_id)
-                
-                conn.commit()
-                
-                # Check for newly earned achievements
-                newly_earned = self.auto_check_and_award_achievements(user_id)
-                
-                return {
-                    'success': True,
-                    'session_points': session_points,
-                    'total_time': total_time,
-                    'newly_earned_achievements': newly_earned
-                }
+            # Session insert, user stats, level and achievements in one transaction
+            result = self.session_pipeline.finalize_session(
+                user_id, time_intervals, exercise_type=exercise_type
+            )
+            
+            return {
+                'success': True,
+                'session_points': result['session_stats']['score'],
+                'total_time': result['session_stats']['total_time'],
+                'newly_earned_achievements': result['newly_earned_achievements']
+            }
                 
         except Exception as e:
             print(f"Error completing exercise session: {e}")
@@ -675,11 +637,7 @@ class DatabaseManager:
                 current_time = datetime.now().isoformat()
                 
                 # Calculate data quality based on reasonable heartbeat ranges
-                data_quality = 1.0
-                if heartbeat_bpm < 40 or heartbeat_bpm > 200:
-                    data_quality = 0.3  # Poor quality data
-                elif heartbeat_bpm < 50 or heartbeat_bpm > 150:
-                    data_quality = 0.7  # Medium quality data
+                data_quality = heartbeat_data_quality(heartbeat_bpm)
                 
                 cursor.execute('''
                     INSERT INTO HeartbeatData 
@@ -697,107 +655,27 @@ class DatabaseManager:
     def complete_health_session(self, session_id, time_intervals, interruption_count=0, notes=""):
         """Complete a health session with full analysis"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                from datetime import datetime
-                
-                # Get all heartbeat data for this session
-                cursor.execute('''
-                    SELECT heartbeat_bpm, stress_indicator, data_quality 
-                    FROM HeartbeatData 
-                    WHERE session_id = ?
-                    ORDER BY timestamp
-                ''', (session_id,))
-                
-                heartbeat_records = cursor.fetchall()
-                
-                if heartbeat_records:
-                    # Calculate heartbeat statistics
-                    heartbeats = [record[0] for record in heartbeat_records]
-                    stress_levels = [record[1] for record in heartbeat_records]
-                    
-                    avg_heartbeat = sum(heartbeats) / len(heartbeats)
-                    min_heartbeat = min(heartbeats)
-                    max_heartbeat = max(heartbeats)
-                    avg_stress = sum(stress_levels) / len(stress_levels) if stress_levels else 0.0
-                    
-                    # Calculate rest quality score (lower heartbeat variability = better rest)
-                    if len(heartbeats) > 1:
-                        heartbeat_variance = sum([(hb - avg_heartbeat) ** 2 for hb in heartbeats]) / len(heartbeats)
-                        rest_quality = max(0.0, min(10.0, 10.0 - (heartbeat_variance / 100)))
-                    else:
-                        rest_quality = 5.0  # Default moderate quality
-                    
-                    # Create heartbeat data JSON
-                    heartbeat_data = {
-                        'timestamps': [i * 5 for i in range(len(heartbeats))],  # Every 5 seconds
-                        'heartbeats': heartbeats,
-                        'stress_levels': stress_levels
-                    }
-                    
-                else:
-                    # No heartbeat data available
-                    avg_heartbeat = min_heartbeat = max_heartbeat = 0
-                    avg_stress = rest_quality = 0.0
-                    heartbeat_data = {'timestamps': [], 'heartbeats': [], 'stress_levels': []}
-                
-                # Calculate total time and score
-                total_time = sum(time_intervals) if time_intervals else 0
-                
-                # Calculate session score using ScoreManager
-                from score_manager import ScoreManager
-                score_manager = ScoreManager()
-                session_score = score_manager.calculate_session_score(time_intervals) if time_intervals else 0
-                
-                # Update session record
-                cursor.execute('''
-                    UPDATE Sessions 
-                    SET time_intervals = ?, total_time_seconds = ?, score = ?,
-                        heartbeat_data = ?, avg_heartbeat = ?, min_heartbeat = ?, max_heartbeat = ?,
-                        stress_level = ?, rest_quality_score = ?, interruption_count = ?,
-                        session_completed = 1, notes = ?
-                    WHERE id = ?
-                ''', (
-                    str(time_intervals), total_time, session_score,
-                    str(heartbeat_data), avg_heartbeat, min_heartbeat, max_heartbeat,
-                    avg_stress, rest_quality, interruption_count, notes, session_id
-                ))
-                
-                # Update user stats
-                cursor.execute('SELECT user_id FROM Sessions WHERE id = ?', (session_id,))
-                user_id = cursor.fetchone()[0]
-                
-                cursor.execute('''
-                    UPDATE Users 
-                    SET total_points = total_points + ?,
-                        total_sessions = total_sessions + 1,
-                        total_time_seconds = total_time_seconds + ?,
-                        experience_points = experience_points + ?,
-                        last_activity = ?
-                    WHERE id = ?
-                ''', (session_score, total_time, session_score, datetime.now().isoformat(), user_id))
-                
-                # Check for level up
-                self._check_level_up(cursor, user_id)
-                
-                conn.commit()
-                
-                # Check for newly earned achievements
-                newly_earned = self.auto_check_and_award_achievements(user_id)
-                
-                return {
-                    'success': True,
-                    'session_stats': {
-                        'total_time': total_time,
-                        'score': session_score,
-                        'avg_heartbeat': round(avg_heartbeat, 1),
-                        'heartbeat_range': f"{min_heartbeat}-{max_heartbeat}",
-                        'avg_stress': round(avg_stress, 2),
-                        'rest_quality': round(rest_quality, 1),
-                        'interruptions': interruption_count
-                    },
-                    'newly_earned_achievements': newly_earned
-                }
+            # Heartbeat aggregation (in SQL), session update, user stats, streak,
+            # level and achievements - one BEGIN IMMEDIATE transaction, one commit
+            result = self.session_pipeline.finalize_session(
+                None, time_intervals, session_id=session_id,
+                interruption_count=interruption_count, notes=notes
+            )
+            
+            stats = result['session_stats']
+            return {
+                'success': True,
+                'session_stats': {
+                    'total_time': stats['total_time'],
+                    'score': stats['score'],
+                    'avg_heartbeat': stats['avg_heartbeat'],
+                    'heartbeat_range': stats['heartbeat_range'],
+                    'avg_stress': stats['avg_stress'],
+                    'rest_quality': stats['rest_quality'],
+                    'interruptions': stats['interruptions']
+                },
+                'newly_earned_achievements': result['newly_earned_achievements']
+            }
                 
         except Exception as e:
             print(f"Error completing health session: {e}")
@@ -1,38 +1,213 @@
 import math
 import json
 import os
+import tempfile
 from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+MAX_TIME_SECONDS = 300  # 5 minutes
+TIME_SCALE_SECONDS = 120.0  # e^(x/120) -> e^2.5 at max time
+
+
+@lru_cache(maxsize=None)
+def _normalization_constant(max_time_seconds, time_scale_seconds):
+    """Denominator of the score normalization: e^(max/scale) - 1 (memoized)."""
+    return math.exp(max_time_seconds / time_scale_seconds) - 1.0
+
+
+class ScoringEngine:
+    """
+    Stateless scoring engine - pure math, never touches disk.
+
+    Scores the same way ScoreManager always did, but on NumPy arrays so that
+    whole histories of sessions can be (re)scored in a single call.
+    """
+
+    def __init__(self, max_time_seconds=MAX_TIME_SECONDS, time_scale_seconds=TIME_SCALE_SECONDS):
+        self.max_time_seconds = max_time_seconds
+        self.time_scale_seconds = time_scale_seconds
+        self._norm = _normalization_constant(max_time_seconds, time_scale_seconds)
+        self._score_table = None
+
+    def interval_scores(self, intervals):
+        """
+        Vectorized score for an array of intervals (seconds).
+
+        Args:
+            intervals (array-like): Interval lengths in seconds
+
+        Returns:
+            np.ndarray: int64 scores from 0 to 100, one per interval
+        """
+        t = np.clip(np.asarray(intervals, dtype=np.float64), 0.0, self.max_time_seconds)
+        normalized = ((np.exp(t / self.time_scale_seconds) - 1.0) / self._norm) * 100.0
+        return normalized.astype(np.int64)  # int() truncation, values are non-negative
+
+    def interval_score(self, exercise_time_seconds):
+        """Score for a single interval (scalar version of interval_scores)."""
+        time_clamped = max(0, min(exercise_time_seconds, self.max_time_seconds))
+        if time_clamped == 0:
+            return 0
+
+        # Use e^(x/120) instead of e^(x/60) for more balanced scoring
+        # This gives us e^2.5 ≈ 12.18 at max time (300s), much more reasonable
+        # Promotes continuous exercise but doesn't overly penalize breaks
+        raw_score = math.exp(time_clamped / self.time_scale_seconds)
+
+        # Normalize to 0-100: (e^(x/120) - 1) / (e^2.5 - 1) * 100
+        return int(((raw_score - 1) / self._norm) * 100)
+
+    def session_score(self, time_intervals):
+        """
+        Total score for one session; intervals are scaled down proportionally
+        when their sum exceeds the maximum time.
+        """
+        if time_intervals is None or len(time_intervals) == 0:
+            return 0
+        return int(self.batch_session_scores([time_intervals])[0])
+
+    def batch_session_scores(self, sessions):
+        """
+        Score many sessions at once.
+
+        Args:
+            sessions (list): List of interval lists, e.g. [[120, 70], [300], []]
+
+        Returns:
+            np.ndarray: int64 total score per session (0 for empty sessions)
+        """
+        lengths = np.fromiter((len(s) for s in sessions), dtype=np.int64, count=len(sessions))
+        if lengths.sum() == 0:
+            return np.zeros(len(sessions), dtype=np.int64)
+
+        flat = np.concatenate([np.asarray(s, dtype=np.float64) for s in sessions if len(s)])
+        owner = np.repeat(np.arange(len(sessions)), lengths)
+
+        totals = np.bincount(owner, weights=flat, minlength=len(sessions))
+        scale = np.ones_like(totals)
+        over = totals > self.max_time_seconds
+        scale[over] = self.max_time_seconds / totals[over]
+
+        scores = self.interval_scores(flat * scale[owner])
+        return np.bincount(owner, weights=scores, minlength=len(sessions)).astype(np.int64)
+
+    def score_table(self):
+        """Lookup table of interval scores for every whole second 0..max (built once)."""
+        if self._score_table is None:
+            self._score_table = self.interval_scores(np.arange(self.max_time_seconds + 1))
+            self._score_table.setflags(write=False)
+        return self._score_table
+
+
+_scoring_engine = None
+
+
+def get_scoring_engine():
+    """Shared ScoringEngine instance (no file I/O, safe to call per session)."""
+    global _scoring_engine
+    if _scoring_engine is None:
+        _scoring_engine = ScoringEngine()
+    return _scoring_engine
+
+
+def _atomic_write_json(path, data):
+    """Write JSON via temp file + fsync + rename, so the file is never half-written."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
 
 class ScoreManager:
+    """
+    Score history stored as a compacted JSON snapshot (data_file) plus an
+    append-only JSON-lines session log next to it. Adding a session appends
+    one line; the snapshot is rewritten only every COMPACT_EVERY sessions.
+    """
+
+    COMPACT_EVERY = 100  # sessions in the log before it is folded into the snapshot
+
     def __init__(self, data_file="user_data.json"):
         self.data_file = data_file
-        self.MAX_TIME_SECONDS = 300  # 5 minutes
+        self.log_file = os.path.splitext(data_file)[0] + ".jsonl"
+        self.MAX_TIME_SECONDS = MAX_TIME_SECONDS
+        self.engine = get_scoring_engine()
         self.load_data()
     
+    def _reset_state(self):
+        self.total_score = 0
+        self.sessions = []
+        self._score_sum = 0
+        self._snapshot_count = 0
+        self._log_count = 0
+
+    def _apply_session(self, session_data):
+        self.sessions.append(session_data)
+        self.total_score += session_data['score']
+        self._score_sum += session_data['score']
+
     def load_data(self):
-        """Load user score data from file"""
+        """Load user score data: snapshot first, then replay the session log"""
+        self._reset_state()
+
         if os.path.exists(self.data_file):
             try:
                 with open(self.data_file, 'r') as f:
                     data = json.load(f)
-                    self.total_score = data.get('total_score', 0)
                     self.sessions = data.get('sessions', [])
-            except (json.JSONDecodeError, KeyError):
-                self.total_score = 0
-                self.sessions = []
-        else:
-            self.total_score = 0
-            self.sessions = []
+                    self.total_score = data.get('total_score', 0)
+                    self._score_sum = sum(session.get('score', 0) for session in self.sessions)
+                    self._snapshot_count = len(self.sessions)
+            except (json.JSONDecodeError, KeyError, AttributeError):
+                self._reset_state()
+
+        if os.path.exists(self.log_file):
+            with open(self.log_file, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line after a crash
+                    # Entries already folded into the snapshot (crash between
+                    # snapshot rename and log truncation) are skipped by seq
+                    if entry.get('seq', 0) <= self._snapshot_count:
+                        continue
+                    entry.pop('seq', None)
+                    self._apply_session(entry)
+                    self._log_count += 1
     
     def save_data(self):
-        """Save user score data to file"""
+        """Compact: write a full snapshot atomically and truncate the session log"""
         data = {
             'total_score': self.total_score,
             'sessions': self.sessions,
             'last_updated': datetime.now().isoformat()
         }
-        with open(self.data_file, 'w') as f:
-            json.dump(data, indent=2, fp=f)
+        _atomic_write_json(self.data_file, data)
+        # Snapshot is durable - the log entries are now redundant
+        if os.path.exists(self.log_file):
+            os.remove(self.log_file)
+        self._snapshot_count = len(self.sessions)
+        self._log_count = 0
+
+    def _append_to_log(self, session_data):
+        """Append one session as a JSON line (O(1) per session)"""
+        entry = dict(session_data, seq=len(self.sessions))
+        with open(self.log_file, 'a') as f:
+            f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_count += 1
     
     def calculate_interval_score(self, exercise_time_seconds):
         """
@@ -45,27 +220,7 @@ class ScoreManager:
         Returns:
             int: Score from 0 to 100 points for this interval
         """
-        # Clamp time to maximum
-        time_clamped = min(exercise_time_seconds, self.MAX_TIME_SECONDS)
-        
-        # Ensure non-negative time
-        time_clamped = max(0, time_clamped)
-        
-        if time_clamped == 0:
-            return 0
-        
-        # Calculate fairer exponential score
-        # Use e^(x/120) instead of e^(x/60) for more balanced scoring
-        # This gives us e^2.5 ≈ 12.18 at max time (300s), much more reasonable
-        # Promotes continuous exercise but doesn't overly penalize breaks
-        scaled_time = time_clamped / 120.0  # Scale to [0, 2.5] for 300 seconds
-        raw_score = math.exp(scaled_time)
-        
-        # Normalize to 0-100: (e^(x/120) - 1) / (e^2.5 - 1) * 100
-        max_raw_score = math.exp(2.5)  # e^2.5 ≈ 12.18
-        normalized_score = ((raw_score - 1) / (max_raw_score - 1)) * 100
-        
-        return int(normalized_score)  # Cast to int as requested
+        return self.engine.interval_score(exercise_time_seconds)
     
     def calculate_session_score(self, time_intervals):
         """
@@ -78,18 +233,7 @@ class ScoreManager:
         Returns:
             int: Total score summed from all intervals
         """
-        if not time_intervals:
-            return 0
-        
-        # Ensure total time doesn't exceed maximum
-        total_time = sum(time_intervals)
-        if total_time > self.MAX_TIME_SECONDS:
-            # Scale down intervals proportionally if they exceed max time
-            scale_factor = self.MAX_TIME_SECONDS / total_time
-            time_intervals = [interval * scale_factor for interval in time_intervals]
-        
-        # Calculate score for each interval and sum them
-        return sum(self.calculate_interval_score(interval) for interval in time_intervals)
+        return self.engine.session_score(time_intervals)
     
     def add_session(self, time_intervals, exercise_type="general"):
         """
@@ -112,9 +256,10 @@ class ScoreManager:
             'score': session_score
         }
         
-        self.sessions.append(session_data)
-        self.total_score += session_score
-        self.save_data()
+        self._apply_session(session_data)
+        self._append_to_log(session_data)
+        if self._log_count >= self.COMPACT_EVERY:
+            self.save_data()
         
         return session_score
     
@@ -127,10 +272,10 @@ class ScoreManager:
         return len(self.sessions)
     
     def get_average_session_score(self):
-        """Get average score per session"""
+        """Get average score per session (running sum, O(1))"""
         if not self.sessions:
             return 0
-        return sum(session['score'] for session in self.sessions) / len(self.sessions)
+        return self._score_sum / len(self.sessions)
     
     def get_recent_sessions(self, count=10):
         """Get most recent sessions"""
@@ -138,8 +283,7 @@ class ScoreManager:
     
     def reset_scores(self):
         """Reset all scores and sessions"""
-        self.total_score = 0
-        self.sessions = []
+        self._reset_state()
         self.save_data()
     
     def get_score_breakdown_for_time(self, max_seconds=300, step_seconds=30):
@@ -153,11 +297,10 @@ class ScoreManager:
         Returns:
             list: List of (time, score) tuples
         """
-        breakdown = []
-        for seconds in range(0, max_seconds + 1, step_seconds):
-            score = self.calculate_interval_score(seconds)
-            breakdown.append((seconds, score))
-        return breakdown
+        table = self.engine.score_table()
+        seconds = np.arange(0, max_seconds + 1, step_seconds)
+        scores = table[np.minimum(seconds, self.engine.max_time_seconds)]  # clamped like calculate_interval_score
+        return list(zip(seconds.tolist(), scores.tolist()))
     
     def calculate_example_scores(self):
         """
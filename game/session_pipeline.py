@@ -0,0 +1,313 @@
+import json
+import math
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+
+try:
+    from achievement_engine import AchievementEngine, read_requirement_stats
+    from score_manager import get_scoring_engine
+    from session_recorder import SessionRecorder
+except ImportError:  # imported as part of the `game` package
+    from game.achievement_engine import AchievementEngine, read_requirement_stats
+    from game.score_manager import get_scoring_engine
+    from game.session_recorder import SessionRecorder
+
+HEARTBEAT_SAMPLE_INTERVAL_SECONDS = 5  # HeartbeatData is recorded every 5 seconds
+
+
+def heartbeat_data_quality(bpm):
+    """HeartbeatData.data_quality from how plausible the BPM value is"""
+    if bpm < 40 or bpm > 200:
+        return 0.3  # Poor quality data
+    if bpm < 50 or bpm > 150:
+        return 0.7  # Medium quality data
+    return 1.0
+
+
+def check_level_up(cursor, user_id):
+    """Update the user's level from experience_points; returns the (possibly new) level"""
+    cursor.execute('SELECT level, experience_points FROM Users WHERE id = ?', (user_id,))
+    current_level, experience = cursor.fetchone()
+
+    # Find the highest level the user qualifies for
+    cursor.execute('''
+        SELECT level FROM UserLevels
+        WHERE experience_required <= ?
+        ORDER BY level DESC LIMIT 1
+    ''', (experience,))
+
+    result = cursor.fetchone()
+    if result and result[0] > current_level:
+        new_level = result[0]
+        cursor.execute('UPDATE Users SET level = ? WHERE id = ?', (new_level, user_id))
+        return new_level
+    return current_level
+
+
+class SessionPipeline:
+    """
+    Finalizes a break/exercise session in ONE write transaction:
+    heartbeat aggregation, scoring, Sessions row, user totals, streak,
+    level and achievements. Either everything is committed or nothing is,
+    and a finished break costs a single commit (fsync) instead of several.
+    """
+
+    def __init__(self, db_path, achievement_engine=None):
+        self.db_path = db_path
+        self.achievement_engine = achievement_engine or AchievementEngine()
+        self.scoring_engine = get_scoring_engine()
+
+    def _connect(self):
+        # isolation_level=None -> we issue BEGIN IMMEDIATE / COMMIT ourselves
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+
+    def finalize_session(self, user_id, time_intervals, session_id=None, heartbeat_data=None,
+                         stress_level=None, rest_quality=None, points=None,
+                         interruption_count=0, exercise_type='break', notes=None):
+        """
+        Finalize a session.
+
+        Args:
+            user_id (int): Owner of the session (ignored if session_id points to an existing row)
+            time_intervals (list): Rest intervals in seconds
+            session_id (int|None): Existing Sessions row (from start_health_session) whose
+                                   HeartbeatData samples are aggregated; None inserts a new row
+            heartbeat_data (SessionRecorder|list|None): In-memory BPM samples; used instead of HeartbeatData
+            stress_level (float|None): Overrides the stress derived from heartbeat samples
+            rest_quality (float|None): Overrides the variance-based rest quality (0-10)
+            points (int|None): Precomputed score; None scores time_intervals
+            interruption_count (int): Number of interruptions during the session
+            exercise_type (str): Session type for newly inserted rows
+            notes (str|None): Free-form notes
+
+        Returns:
+            dict: session_id, session_stats, level, newly_earned_achievements
+
+        Raises:
+            sqlite3.Error: The transaction is rolled back and the error re-raised
+        """
+        time_intervals = list(time_intervals or [])
+        total_time = int(sum(time_intervals))
+        score = self.scoring_engine.session_score(time_intervals) if points is None else int(points)
+        now = datetime.now()
+
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+
+            if session_id is not None:
+                cursor.execute('SELECT user_id FROM Sessions WHERE id = ?', (session_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    raise sqlite3.IntegrityError(f"Session {session_id} does not exist")
+                user_id = row[0]
+
+            if isinstance(heartbeat_data, SessionRecorder):
+                hb = self._aggregate_recorder(heartbeat_data)
+            elif heartbeat_data is not None:
+                hb = self._aggregate_samples(heartbeat_data)
+            elif session_id is not None:
+                hb = self._aggregate_heartbeat_table(cursor, session_id)
+            else:
+                hb = self._aggregate_samples([])
+
+            if stress_level is None:
+                stress_level = hb['avg_stress']
+            if rest_quality is None:
+                rest_quality = hb['rest_quality']
+
+            stats_before = read_requirement_stats(cursor, user_id)
+
+            # 1. Sessions row
+            new_session = session_id is None
+            if not new_session:
+                cursor.execute('''
+                    UPDATE Sessions
+                    SET time_intervals = ?, total_time_seconds = ?, score = ?,
+                        heartbeat_data = ?, avg_heartbeat = ?, min_heartbeat = ?, max_heartbeat = ?,
+                        stress_level = ?, rest_quality_score = ?, interruption_count = ?,
+                        session_completed = 1, notes = ?
+                    WHERE id = ?
+                ''', (
+                    json.dumps(time_intervals), total_time, score,
+                    hb['serialized'], hb['avg'], hb['min'], hb['max'],
+                    stress_level, rest_quality, interruption_count, notes, session_id
+                ))
+            else:
+                cursor.execute('''
+                    INSERT INTO Sessions (
+                        user_id, timestamp, exercise_type, time_intervals,
+                        total_time_seconds, score, heartbeat_data, avg_heartbeat, min_heartbeat,
+                        max_heartbeat, stress_level, rest_quality_score, interruption_count,
+                        session_completed, notes
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
+                ''', (
+                    user_id, now.isoformat(), exercise_type, json.dumps(time_intervals),
+                    total_time, score, hb['serialized'], hb['avg'], hb['min'],
+                    hb['max'], stress_level, rest_quality, interruption_count, notes
+                ))
+                session_id = cursor.lastrowid
+
+            # Per-sample rows (BPM + HRV stress) for sessions recorded in memory
+            if new_session and isinstance(heartbeat_data, SessionRecorder):
+                self._insert_heartbeat_rows(cursor, session_id, user_id, heartbeat_data, now)
+
+            # 2. User totals + streak
+            current_streak, longest_streak = self._next_streak(cursor, user_id, session_id, now.date())
+            cursor.execute('''
+                UPDATE Users
+                SET total_points = total_points + ?,
+                    total_sessions = total_sessions + 1,
+                    total_time_seconds = total_time_seconds + ?,
+                    experience_points = experience_points + ?,
+                    current_streak = ?,
+                    longest_streak = ?,
+                    last_activity = ?
+                WHERE id = ?
+            ''', (score, total_time, score, current_streak, longest_streak, now.isoformat(), user_id))
+
+            # 3. Level
+            level = check_level_up(cursor, user_id)
+
+            # 4. Achievements crossed by this session
+            stats_after = read_requirement_stats(cursor, user_id)
+            newly_earned = self.achievement_engine.award_crossed(cursor, user_id, stats_before, stats_after)
+
+            cursor.execute('COMMIT')
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        self.achievement_engine.mark_caught_up(user_id)  # only once the catch-up is committed
+
+        return {
+            'session_id': session_id,
+            'session_stats': {
+                'total_time': total_time,
+                'score': score,
+                'avg_heartbeat': round(hb['avg'], 1),
+                'heartbeat_range': f"{hb['min']}-{hb['max']}",
+                'heartbeat_samples': hb['count'],
+                'avg_stress': round(stress_level, 2),
+                'rest_quality': round(rest_quality, 1),
+                'interruptions': interruption_count,
+                'current_streak': current_streak
+            },
+            'level': level,
+            'newly_earned_achievements': newly_earned
+        }
+
+    @staticmethod
+    def _rest_quality(count, variance):
+        """Lower heartbeat variability = better rest (0-10)"""
+        if count == 0:
+            return 0.0
+        if count == 1:
+            return 5.0  # Default moderate quality
+        return max(0.0, min(10.0, 10.0 - (variance / 100)))
+
+    def _aggregate_recorder(self, recorder):
+        """Stats kept by a SessionRecorder - O(1), no pass over the samples"""
+        stats = recorder.aggregate()
+        stats['avg_stress'] = stats.pop('stress_mean') or 0.0
+        stats['rest_quality'] = self._rest_quality(stats['count'], stats.pop('variance'))
+        return stats
+
+    @staticmethod
+    def _insert_heartbeat_rows(cursor, session_id, user_id, recorder, now):
+        """HeartbeatData rows for the samples kept by a recorder; unknown stress is stored as NULL"""
+        offsets = recorder.timestamps()
+        if not offsets:
+            return
+        end = offsets[-1]  # the last sample is taken as "now"
+        rows = []
+        for offset, bpm, stress in zip(offsets, recorder.samples(), recorder.stresses()):
+            rows.append((
+                session_id, user_id, (now - timedelta(seconds=end - offset)).isoformat(), bpm,
+                None if math.isnan(stress) else stress, 'resting', heartbeat_data_quality(bpm)
+            ))
+        cursor.executemany('''
+            INSERT INTO HeartbeatData
+            (session_id, user_id, timestamp, heartbeat_bpm, stress_indicator, activity_level, data_quality)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+    def _aggregate_samples(self, heartbeat_data):
+        """Stats for in-memory BPM samples (NumPy); serialized as CSV like DatabaseSync always did"""
+        samples = np.asarray(heartbeat_data, dtype=np.float64)
+        if samples.size == 0:
+            return {'count': 0, 'avg': 0.0, 'min': 0, 'max': 0, 'avg_stress': 0.0,
+                    'rest_quality': 0.0, 'serialized': ''}
+        return {
+            'count': int(samples.size),
+            'avg': float(samples.mean()),
+            'min': int(samples.min()),
+            'max': int(samples.max()),
+            'avg_stress': 0.0,
+            'rest_quality': self._rest_quality(samples.size, float(samples.var())),
+            'serialized': ','.join(map(str, heartbeat_data))
+        }
+
+    def _aggregate_heartbeat_table(self, cursor, session_id):
+        """Stats for HeartbeatData rows of a session, computed in a single SQL pass"""
+        cursor.execute('''
+            SELECT COUNT(*), AVG(heartbeat_bpm), MIN(heartbeat_bpm), MAX(heartbeat_bpm),
+                   AVG(heartbeat_bpm * heartbeat_bpm), AVG(stress_indicator),
+                   json_group_array(heartbeat_bpm), json_group_array(stress_indicator)
+            FROM (
+                SELECT heartbeat_bpm, stress_indicator
+                FROM HeartbeatData
+                WHERE session_id = ?
+                ORDER BY timestamp
+            )
+        ''', (session_id,))
+        count, avg, min_bpm, max_bpm, avg_sq, avg_stress, heartbeats_json, stress_json = cursor.fetchone()
+
+        if not count:
+            return {'count': 0, 'avg': 0.0, 'min': 0, 'max': 0, 'avg_stress': 0.0, 'rest_quality': 0.0,
+                    'serialized': json.dumps({'timestamps': [], 'heartbeats': [], 'stress_levels': []})}
+
+        variance = max(0.0, avg_sq - avg * avg)
+        timestamps = list(range(0, count * HEARTBEAT_SAMPLE_INTERVAL_SECONDS, HEARTBEAT_SAMPLE_INTERVAL_SECONDS))
+        serialized = (f'{{"timestamps": {json.dumps(timestamps)}, '
+                      f'"heartbeats": {heartbeats_json}, "stress_levels": {stress_json}}}')
+        return {
+            'count': count,
+            'avg': avg,
+            'min': min_bpm,
+            'max': max_bpm,
+            'avg_stress': avg_stress or 0.0,
+            'rest_quality': self._rest_quality(count, variance),
+            'serialized': serialized
+        }
+
+    @staticmethod
+    def _next_streak(cursor, user_id, session_id, today):
+        """Daily streak after a session completed today: (current_streak, longest_streak)"""
+        cursor.execute('SELECT current_streak, longest_streak FROM Users WHERE id = ?', (user_id,))
+        current_streak, longest_streak = cursor.fetchone()
+        current_streak = current_streak or 0
+        longest_streak = longest_streak or 0
+
+        cursor.execute('''
+            SELECT MAX(DATE(timestamp)) FROM Sessions
+            WHERE user_id = ? AND session_completed = 1 AND id != ?
+        ''', (user_id, session_id))
+        last_day = cursor.fetchone()[0]
+
+        if last_day == today.isoformat():
+            current_streak = max(current_streak, 1)
+        elif last_day == (today - timedelta(days=1)).isoformat():
+            current_streak += 1
+        else:
+            current_streak = 1
+
+        return current_streak, max(longest_streak, current_streak)
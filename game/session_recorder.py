@@ -0,0 +1,125 @@
+import math
+import time
+from array import array
+
+DEFAULT_CAPACITY = 3600  # ~1h of samples at 1 Hz
+
+
+class SessionRecorder:
+    """
+    In-memory recorder of BPM samples for one break.
+
+    Samples and their monotonic timestamps live in fixed-size typed ring
+    buffers (array('H') / array('d')), so memory does not grow with the break
+    length. Mean, variance, min and max are updated with Welford's algorithm
+    on every sample, which makes finalizing a session O(1) and covers all
+    samples, including ones already overwritten in the ring.
+
+    Each sample can carry an HRV stress indicator (0-1); samples without one
+    store NaN and are left out of stress_mean.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, start_time=None):
+        self.capacity = max(1, int(capacity))
+        self.start_time = time.monotonic() if start_time is None else start_time
+        self._bpm = array('H', [0]) * self.capacity
+        self._times = array('d', [0.0]) * self.capacity
+        self._stress = array('d', [math.nan]) * self.capacity
+        self.stress_count = 0
+        self._stress_sum = 0.0
+        self.count = 0  # all samples seen, not only the ones kept in the ring
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = 0
+        self.max = 0
+
+    @classmethod
+    def from_samples(cls, samples, capacity=None):
+        """Build a recorder from a plain list of BPM values (e.g. legacy callers)."""
+        samples = list(samples or [])
+        recorder = cls(capacity or max(len(samples), DEFAULT_CAPACITY), start_time=0.0)
+        for index, bpm in enumerate(samples):
+            recorder.add(bpm, float(index))
+        return recorder
+
+    def __len__(self):
+        return self.count
+
+    def add(self, bpm, now=None, stress=None):
+        """Record one BPM sample, optionally with its HRV stress indicator (0-1)."""
+        bpm = min(0xFFFF, max(0, int(bpm)))
+        now = time.monotonic() if now is None else now
+
+        slot = self.count % self.capacity
+        self._bpm[slot] = bpm
+        self._times[slot] = now - self.start_time
+        if stress is None:
+            self._stress[slot] = math.nan
+        else:
+            stress = min(1.0, max(0.0, float(stress)))
+            self._stress[slot] = stress
+            self.stress_count += 1
+            self._stress_sum += stress
+
+        self.count += 1
+        delta = bpm - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (bpm - self._mean)
+        if self.count == 1:
+            self.min = self.max = bpm
+        else:
+            self.min = min(self.min, bpm)
+            self.max = max(self.max, bpm)
+
+    @property
+    def mean(self):
+        return self._mean if self.count else 0.0
+
+    @property
+    def variance(self):
+        """Population variance (same as numpy.var)."""
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def stress_mean(self):
+        """Mean HRV stress over all samples that had one; None if none did."""
+        return self._stress_sum / self.stress_count if self.stress_count else None
+
+    def _ordered(self, buffer):
+        kept = min(self.count, self.capacity)
+        if self.count <= self.capacity:
+            return buffer[:kept]
+        head = self.count % self.capacity
+        return buffer[head:] + buffer[:head]
+
+    def samples(self):
+        """Kept BPM samples, oldest first."""
+        return self._ordered(self._bpm)
+
+    def timestamps(self):
+        """Seconds since start_time for each kept sample, oldest first."""
+        return self._ordered(self._times)
+
+    def stresses(self):
+        """HRV stress for each kept sample (NaN = not available), oldest first."""
+        return self._ordered(self._stress)
+
+    def to_csv(self):
+        """Kept samples as the comma-separated text stored in Sessions.heartbeat_data."""
+        return ','.join(map(str, self.samples()))
+
+    def aggregate(self):
+        """Session heartbeat stats in the shape SessionPipeline expects."""
+        return {
+            'count': self.count,
+            'avg': self.mean,
+            'min': self.min,
+            'max': self.max,
+            'variance': self.variance,
+            'stress_mean': self.stress_mean,
+            'serialized': self.to_csv()
+        }
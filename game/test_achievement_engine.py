@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for the bisect-based achievement engine (run with pytest)."""
+
+import sqlite3
+
+import pytest
+
+try:
+    from achievement_engine import AchievementEngine
+except ImportError:  # collected as part of the `game` package
+    from game.achievement_engine import AchievementEngine
+
+THRESHOLDS = {'points': [50, 100, 100, 200], 'sessions': [1, 5]}
+
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(':memory:')
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE Achievements (
+            id INTEGER PRIMARY KEY, name TEXT, description TEXT, requirement_type TEXT,
+            requirement_value INTEGER, points_reward INTEGER, is_active INTEGER DEFAULT 1
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE UserAchievements (
+            user_id INTEGER, achievement_id INTEGER, earned_date TEXT, points_awarded INTEGER,
+            UNIQUE(user_id, achievement_id)
+        )
+    ''')
+    cursor.execute('CREATE TABLE Users (id INTEGER PRIMARY KEY, last_activity TEXT)')
+    cursor.execute('INSERT INTO Users (id) VALUES (1)')
+    for req_type, values in THRESHOLDS.items():
+        for value in values:
+            cursor.execute('''
+                INSERT INTO Achievements (name, description, requirement_type, requirement_value, points_reward)
+                VALUES (?, '', ?, ?, 0)
+            ''', (f'{req_type} {value}', req_type, value))
+    cursor.execute("INSERT INTO Achievements (name, requirement_type, requirement_value, is_active) "
+                   "VALUES ('retired', 'points', 60, 0)")
+    yield cursor
+    conn.close()
+
+
+def values(achievements):
+    return [achievement[3] for achievement in achievements]
+
+
+@pytest.mark.parametrize('old, new, expected', [
+    (0, 49, []),                 # just below the first threshold
+    (0, 50, [50]),               # reaching a threshold exactly crosses it
+    (50, 99, []),                # starting on a threshold does not cross it again
+    (99, 100, [100, 100]),       # equal thresholds are crossed together
+    (100, 100, []),              # no change
+    (49, 500, [50, 100, 100, 200]),
+    (None, 100, [50, 100, 100]),  # catch-up: everything already reached
+    (120, 90, []),               # a decrease never awards
+])
+def test_crossed_boundaries(cursor, old, new, expected):
+    assert values(AchievementEngine().crossed(cursor, 'points', old, new)) == expected
+
+
+def test_crossed_unknown_type_or_missing_value(cursor):
+    engine = AchievementEngine()
+    assert engine.crossed(cursor, 'streak', 0, 10) == []
+    assert engine.crossed(cursor, 'points', 0, None) == []
+
+
+def test_first_award_catches_up_then_only_crossings(cursor):
+    engine = AchievementEngine()
+
+    first = engine.award_crossed(cursor, 1, {'points': 150, 'sessions': 5}, {'points': 160, 'sessions': 6})
+    assert sorted(a['requirement_value'] for a in first if a['requirement_type'] == 'points') == [50, 100, 100]
+    assert [a['requirement_value'] for a in first if a['requirement_type'] == 'sessions'] == [1, 5]
+    engine.mark_caught_up(1)  # the caller committed
+
+    assert engine.award_crossed(cursor, 1, {'points': 160, 'sessions': 6}, {'points': 199, 'sessions': 7}) == []
+    second = engine.award_crossed(cursor, 1, {'points': 199, 'sessions': 7}, {'points': 200, 'sessions': 8})
+    assert [a['requirement_value'] for a in second] == [200]
+    cursor.execute('SELECT COUNT(*) FROM UserAchievements WHERE user_id = 1')
+    assert cursor.fetchone()[0] == 6
+
+
+def test_rolled_back_catch_up_runs_again(cursor):
+    engine = AchievementEngine()
+    cursor.execute('SAVEPOINT award')
+    assert len(engine.award_crossed(cursor, 1, {'points': 150}, {'points': 160})) == 3
+    cursor.execute('ROLLBACK TO award')  # the caller's transaction failed - no mark_caught_up()
+
+    again = engine.award_crossed(cursor, 1, {'points': 160}, {'points': 170})
+    assert sorted(a['requirement_value'] for a in again) == [50, 100, 100]
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for the single-transaction session pipeline (run with pytest)."""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+try:
+    from database_manager import DatabaseManager
+except ImportError:  # collected as part of the `game` package
+    from game.database_manager import DatabaseManager
+
+HEARTBEATS = [(72, 0.4), (68, 0.3), (75, 0.5), (70, 0.2), (66, 0.1), (71, 0.3)]
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / 'user_data.db'))
+
+
+def query(db, sql, params=()):
+    with sqlite3.connect(db.db_path) as conn:
+        return conn.execute(sql, params).fetchone()
+
+
+def baseline_heartbeat_stats(records):
+    """The aggregation complete_health_session did before the pipeline (Python loop over rows)"""
+    heartbeats = [record[0] for record in records]
+    stress_levels = [record[1] for record in records]
+    avg_heartbeat = sum(heartbeats) / len(heartbeats)
+    avg_stress = sum(stress_levels) / len(stress_levels)
+    variance = sum([(hb - avg_heartbeat) ** 2 for hb in heartbeats]) / len(heartbeats)
+    rest_quality = max(0.0, min(10.0, 10.0 - (variance / 100))) if len(heartbeats) > 1 else 5.0
+    return {
+        'avg_heartbeat': round(avg_heartbeat, 1),
+        'heartbeat_range': f"{min(heartbeats)}-{max(heartbeats)}",
+        'avg_stress': round(avg_stress, 2),
+        'rest_quality': round(rest_quality, 1)
+    }
+
+
+def set_last_session(db, user_id, day, streak):
+    """Leave exactly one completed session for the user, on `day`, and set the stored streak."""
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute('DELETE FROM Sessions WHERE user_id = ?', (user_id,))
+        conn.execute('''
+            INSERT INTO Sessions (user_id, timestamp, exercise_type, session_completed)
+            VALUES (?, ?, 'break', 1)
+        ''', (user_id, datetime.combine(day, datetime.min.time()).isoformat()))
+        conn.execute('UPDATE Users SET current_streak = ?, longest_streak = ? WHERE id = ?',
+                     (streak, streak, user_id))
+
+
+def test_heartbeat_aggregates_match_baseline(db):
+    """SQL aggregation gives the same session stats as the old per-row Python loop"""
+    session_id = db.start_health_session(1)['session_id']
+    for bpm, stress in HEARTBEATS:
+        db.record_heartbeat(session_id, 1, bpm, stress)
+
+    result = db.complete_health_session(session_id, [120, 95, 85], interruption_count=2)
+
+    assert result['success']
+    stats = result['session_stats']
+    for key, value in baseline_heartbeat_stats(HEARTBEATS).items():
+        assert stats[key] == pytest.approx(value), key
+    assert stats['interruptions'] == 2
+    completed, avg_heartbeat = query(db, 'SELECT session_completed, avg_heartbeat FROM Sessions WHERE id = ?',
+                                     (session_id,))
+    assert completed == 1
+    assert avg_heartbeat == pytest.approx(sum(bpm for bpm, _ in HEARTBEATS) / len(HEARTBEATS))
+
+
+def test_single_heartbeat_and_empty_session_match_baseline(db):
+    single = db.start_health_session(2)['session_id']
+    db.record_heartbeat(single, 2, 64, 0.2)
+    stats = db.complete_health_session(single, [60])['session_stats']
+    assert stats['rest_quality'] == 5.0
+    assert stats['heartbeat_range'] == '64-64'
+
+    empty = db.start_health_session(2)['session_id']
+    stats = db.complete_health_session(empty, [60])['session_stats']
+    assert (stats['avg_heartbeat'], stats['heartbeat_range'], stats['avg_stress'], stats['rest_quality']) == \
+        (0.0, '0-0', 0.0, 0.0)
+
+
+def test_user_totals_follow_the_session(db):
+    before = query(db, 'SELECT total_points, total_sessions, total_time_seconds, experience_points '
+                       'FROM Users WHERE id = 1')
+
+    result = db.session_pipeline.finalize_session(1, [120, 95, 85], heartbeat_data=[70, 68, 72])
+
+    score = result['session_stats']['score']
+    after = query(db, 'SELECT total_points, total_sessions, total_time_seconds, experience_points '
+                      'FROM Users WHERE id = 1')
+    assert after == (before[0] + score, before[1] + 1, before[2] + 300, before[3] + score)
+    assert result['session_stats']['total_time'] == 300
+
+
+@pytest.mark.parametrize('days_ago, stored_streak, expected', [
+    (0, 4, 4),   # second session today keeps the streak
+    (0, 0, 1),   # ...but a finished session counts at least as day one
+    (1, 4, 5),   # yesterday -> streak continues
+    (2, 4, 1),   # a missed day resets it
+])
+def test_streak(db, days_ago, stored_streak, expected):
+    set_last_session(db, 1, datetime.now().date() - timedelta(days=days_ago), stored_streak)
+
+    result = db.session_pipeline.finalize_session(1, [60])
+
+    assert result['session_stats']['current_streak'] == expected
+    assert query(db, 'SELECT current_streak, longest_streak FROM Users WHERE id = 1') == \
+        (expected, max(expected, stored_streak))
+
+
+def test_failed_session_changes_nothing(db):
+    before = query(db, 'SELECT total_points, total_sessions, current_streak FROM Users WHERE id = 1')
+
+    with pytest.raises(sqlite3.IntegrityError):
+        db.session_pipeline.finalize_session(1, [60], session_id=9999)
+
+    assert query(db, 'SELECT total_points, total_sessions, current_streak FROM Users WHERE id = 1') == before
+    assert query(db, 'SELECT COUNT(*) FROM UserAchievements') == (0,)
@@ -10,47 +10,19 @@ from PyQt5.QtGui import QMovie
 from ui.tray_icon import BreakReminderTrayIcon
 from ui.enhanced_wellness_window import EnhancedWellnessWindow
 from vision.eye_monitor import EyeMonitorWorker, EyeTracker
-from databaseSync import DatabaseSync
+from vision.camera_factory import CameraOpenThread
+from vision.camera_registry import CameraRegistry, CameraHub
+from vision.spine_monitor import PostureWorker
+from vision.shared_inference import SharedInference, INFERENCE_SEPARATE
+from vision.landmark_recorder import LandmarkRecorder
+from vision.gaze_timeline import GazeTimeline
+from game.session_recorder import SessionRecorder
+from databaseSync import DatabaseSync, SessionWriterThread
 
-import cv2
-import mediapipe as mp
-import numpy as np
 import time
-import math
+from datetime import datetime
 
 
-def create_linux_eye_tracker(rest_threshold=10):
-    """Tworzy EyeTracker naprawiony dla Linuxa."""
-    # Monkey patch - zastępujemy tylko problematyczną linię
-    original_init = EyeTracker.__init__
-    
-    def linux_init(self, rest_threshold=10):
-        # Wywołaj oryginalny __init__ ale z poprawką dla Linuxa
-        self.cap = cv2.VideoCapture(0)  # Bez CAP_DSHOW
-        if not self.cap.isOpened():
-            raise RuntimeError("Camera not accessible")
-
-        import mediapipe as mp
-        mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = mp_face_mesh.FaceMesh(
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.6,
-            min_tracking_confidence=0.6
-        )
-        self.last_focus_time = time.time()
-        self.rest_threshold = rest_threshold
-        self.h = 0
-        self.w = 0
-    
-    # Tymczasowo zastąp __init__
-    EyeTracker.__init__ = linux_init
-    tracker = EyeTracker(rest_threshold)
-    # Przywróć oryginalny __init__
-    EyeTracker.__init__ = original_init
-    
-    return tracker
-
 class ApplicationController:
     """
     Główny kontroler łączący logikę (Timer, Vision) z UI (TrayIcon, Windows).
@@ -60,6 +32,25 @@ class ApplicationController:
     STATE_WORKING = "WORKING"
     STATE_BREAK = "BREAK"
 
+    # Tryb inferencji przy kilku monitorach: INFERENCE_SEPARATE, INFERENCE_HOLISTIC
+    # albo INFERENCE_SHARED (najtańszy dla danego sprzętu - vision/inference_benchmark.py)
+    INFERENCE_MODE = INFERENCE_SEPARATE
+
+    # Liczenie mrugnięć w trakcie pracy (te same landmarki FaceMesh co wzrok).
+    # Domyślnie wyłączone: FaceMesh z pełną częstotliwością kamery przez cały czas pracy,
+    # a bez tego w pracy nie działa żadna inferencja poza rzadkim Pose
+    BLINK_TRACKING = False
+    BLINK_BATCH_SIZE = 10  # raporty (co ~minutę) zapisywane do bazy paczkami
+
+    # Przerwa to ćwiczenie palmingu (palming.gif) - zakrycie oczu sprawdzane bez FaceMesh.
+    # Domyślnie wyłączone: wykrywanie zależy od światła, okularów i ustawienia kamery
+    PALMING_MODE = False
+    PALMING_PAUSE_TIMEOUT_MS = 15000  # po tylu ms bez wykrytego zakrycia odliczanie rusza samo
+
+    # Katalog na nagrania landmarków (analiza/strojenie progów: vision/landmark_recorder.py);
+    # None = bez nagrywania
+    LANDMARK_RECORDING_DIR = None
+
     def __init__(self):
         # 0. Ustawienie aplikacji
         self.app = QApplication(sys.argv)
@@ -95,12 +86,27 @@ class ApplicationController:
         # Inicjalizacja synchronizacji bazy danych
         self.db_sync = DatabaseSync('user_data.db')
         print("DatabaseSync zainicjalizowany")
+
+        # Zapis sesji w osobnym wątku - przejście przerwa -> praca nie czeka na dysk
+        self.session_writer = SessionWriterThread(self.db_sync)
+        self.session_writer.session_saved_signal.connect(self._on_session_saved)
+        self.session_writer.session_failed_signal.connect(self._on_session_save_failed)
+        self.session_writer.start()
         
         # Zmienne do śledzenia sesji odpoczynku
         self.session_start_time = None
-        self.session_heartbeat_data = []
+        self.session_recorder = SessionRecorder()
         self.session_time_intervals = []
         self.session_stress_level = 0.0
+        self.session_hrv_stress = None
+        self.gaze_timeline = GazeTimeline()
+        self.blink_rate_batch = []
+
+        # Pauza palmingu nie może zatrzymać przerwy na zawsze (nieudane wykrywanie)
+        self.palming_pause_timer = QTimer()
+        self.palming_pause_timer.setSingleShot(True)
+        self.palming_pause_timer.setInterval(self.PALMING_PAUSE_TIMEOUT_MS)
+        self.palming_pause_timer.timeout.connect(self._on_palming_pause_timeout)
 
         self._start_main_timer()
 
@@ -112,39 +118,33 @@ class ApplicationController:
 
         self.gaze_tracker_instance = None
         self.eye_monitor_worker = None
-
-        # Testuj kamerę prostym sposobem
-        print("Testowanie dostępu do kamery...")
-        try:
-            import cv2
-            cap = cv2.VideoCapture(0)
-            if cap.isOpened():
-                print("OpenCV: Kamera dostępna")
-                cap.release()
-                
-                # Próbuj zainicjalizować EyeTracker z workaround dla Linuxa
-                try:
-                    print("Inicjalizacja EyeTracker...")
-                    # Tworzymy LinuxEyeTracker - wrapper który naprawia problem CAP_DSHOW
-                    self.gaze_tracker_instance = create_linux_eye_tracker()
-                    print("LinuxEyeTracker zainicjalizowany pomyślnie")
-                    
-                    print("Inicjalizacja EyeMonitorWorker...")
-                    self.eye_monitor_worker = EyeMonitorWorker(self.gaze_tracker_instance)
-                    print("EyeMonitorWorker zainicjalizowany pomyślnie")
-                    
-                except Exception as e:
-                    print(f"Błąd podczas inicjalizacji EyeTracker: {type(e).__name__}: {e}")
-                    self.gaze_tracker_instance = None
-                    self.eye_monitor_worker = None
-            else:
-                print("OpenCV: Kamera niedostępna")
-                self.gaze_tracker_instance = None
-                self.eye_monitor_worker = None
-        except Exception as e:
-            print(f"OpenCV test error: {e}")
-            self.gaze_tracker_instance = None
-            self.eye_monitor_worker = None
+        self.pulse_monitor_worker = None
+        self.posture_worker = None
+        self.landmark_recorder = None
+        self.shared_inference = None
+        if self.INFERENCE_MODE != INFERENCE_SEPARATE:
+            self.shared_inference = SharedInference(self.INFERENCE_MODE)
+
+        # Rejestr kamer (camera_registry.json): tętno/postawa na innym źródle niż wzrok
+        # działają w osobnych procesach kamer, wyniki przez CameraHub
+        self.camera_registry = CameraRegistry.load()
+        self.camera_hub = None
+        remote_sources = self.camera_registry.remote_sources()
+        if remote_sources:
+            self.camera_hub = CameraHub(remote_sources)
+            self.camera_hub.start()
+            print(f"Procesy kamer: {remote_sources}")
+
+        # Kamera otwierana raz, w tle (zapamiętany backend/indeks) - start nie czeka na sterownik
+        print("Otwieranie kamery w tle...")
+        self.camera_opener = CameraOpenThread(
+            factory=lambda cap, backend, index: EyeTracker(cap=cap, camera_index=index,
+                                                           inference=self.shared_inference),
+            source=self.camera_registry.source_for('gaze')
+        )
+        self.camera_opener.camera_opened_signal.connect(self._on_eye_tracker_ready)
+        self.camera_opener.camera_failed_signal.connect(self._on_camera_failed)
+        self.camera_opener.start()
 
         # UI: Okno Enhanced Wellness (zamiast SettingsStatsWindow)
         self.settings_window = EnhancedWellnessWindow()
@@ -165,6 +165,7 @@ class ApplicationController:
         # 1. Połączenia UI / Timer:
         self.tray_icon.show_settings_signal.connect(self.settings_window.show)
         self.tray_icon.exit_app_signal.connect(self.exit_application)
+        self.tray_icon.recalibrate_posture_signal.connect(self._recalibrate_posture)
 
         # Główny Timer ZAKOŃCZONY -> Pokaż przypomnienie
         self.main_work_timer.timeout.connect(self.start_break_prompt)
@@ -180,9 +181,148 @@ class ApplicationController:
         self.settings_window.window_opened_signal.connect(self.pause_main_timer)
         self.settings_window.window_closed_signal.connect(self.resume_main_timer)
         
-        # 3. Połączenie Vision / UI (Pauza/Wznowienie Timera przerwy):
+        # 3. Połączenie Vision / UI - po otwarciu kamery (_on_eye_tracker_ready)
+
+    def _on_eye_tracker_ready(self, tracker):
+        """Kamera otwarta i EyeTracker gotowy (sygnał z CameraOpenThread)."""
+        self.gaze_tracker_instance = tracker
+        print("EyeTracker zainicjalizowany pomyślnie")
+
+        if self.LANDMARK_RECORDING_DIR:
+            directory = os.path.join(self.LANDMARK_RECORDING_DIR, datetime.now().strftime("%Y%m%d_%H%M%S"))
+            self.landmark_recorder = LandmarkRecorder(directory)
+            tracker.recorder = self.landmark_recorder
+            print(f"Nagrywanie landmarków: {directory}")
+
+        self.eye_monitor_worker = EyeMonitorWorker(self.gaze_tracker_instance)
+        # Pauza/Wznowienie Timera przerwy
+        self.eye_monitor_worker.gaze_detected_signal.connect(self.handle_gaze_change)
+        self.eye_monitor_worker.models_ready_signal.connect(self._on_eye_models_ready)
+        self.eye_monitor_worker.blink_rate_signal.connect(self._on_blink_rate)
+        self.eye_monitor_worker.palming_signal.connect(self._on_palming_change)
+        if self.current_state == self.STATE_WORKING:
+            self.gaze_tracker_instance.set_camera_consumers(self._work_camera_consumers())
+        self._start_eye_monitor()
+
+        self._create_pulse_worker()
+        if self.pulse_monitor_worker and self.current_state == self.STATE_BREAK:
+            self._start_pulse_monitor()
+
+        # Postawa: ~1 próbka/s z tych samych klatek, tylko w trakcie pracy
+        posture_remote = self._remote_for('posture')
+        self.posture_worker = PostureWorker(None if posture_remote else self.gaze_tracker_instance.frames,
+                                            calibration=self.db_sync.load_posture_calibration(1),
+                                            inference=self.shared_inference,
+                                            recorder=self.landmark_recorder,
+                                            remote=posture_remote)
+        self.posture_worker.slouch_signal.connect(self._on_slouch_detected)
+        self.posture_worker.calibrated_signal.connect(self._on_posture_calibrated)
+        self.posture_worker.start()
+        self.posture_worker.set_active(self.current_state == self.STATE_WORKING)
+
+    def _create_pulse_worker(self):
+        """Tętno z tych samych klatek, tylko w trakcie przerwy -> set_bpm."""
+        try:
+            # Import dopiero tutaj - brak zależności pomiaru tętna wyłącza tylko tętno
+            from vision.pulse_monitor import PulseMonitorWorker
+        except ImportError as e:
+            print(f"Pulse Monitor niedostępny ({e}) - pomiar tętna wyłączony.")
+            return
+        pulse_remote = self._remote_for('pulse')
+        self.pulse_monitor_worker = PulseMonitorWorker(None if pulse_remote else self.gaze_tracker_instance.frames,
+                                                       inference=self.shared_inference,
+                                                       recorder=self.landmark_recorder,
+                                                       remote=pulse_remote)
+        self.pulse_monitor_worker.hrv_signal.connect(self._on_hrv_update)
+        self.pulse_monitor_worker.bpm_signal.connect(self.set_bpm)
+        self.pulse_monitor_worker.start()
+
+    def _remote_for(self, monitor):
+        """CameraHub, gdy monitor jest przypisany do innej kamery niż wzrok; inaczej None."""
+        if self.camera_hub is not None and self.camera_registry.is_remote(monitor):
+            return self.camera_hub
+        return None
+
+    def _on_eye_models_ready(self, ready):
+        """Graf FaceMesh zbudowany w tle - od teraz przerwy mają śledzenie wzroku."""
+        if ready:
+            print("Eye Monitor: modele gotowe")
+        else:
+            print("Eye Monitor: nie udało się zbudować modelu - śledzenie wzroku wyłączone")
+
+    def _start_pulse_monitor(self):
+        if self.pulse_monitor_worker:
+            self.gaze_tracker_instance.set_camera_consumers(self._break_camera_consumers())
+            self.pulse_monitor_worker.begin_break()
+            print("Pulse Monitor: pomiar tętna AKTYWNY.")
+
+    def _stop_pulse_monitor(self):
+        if self.pulse_monitor_worker:
+            self.pulse_monitor_worker.end_break()
+            self.gaze_tracker_instance.set_camera_consumers(self._work_camera_consumers())
+            print("Pulse Monitor: pomiar tętna WYŁĄCZONY.")
+
+    def _break_camera_consumers(self):
+        consumers = ('palming',) if self.PALMING_MODE else ('gaze',)
+        if self.pulse_monitor_worker and not self.camera_registry.is_remote('pulse'):
+            consumers += ('pulse',)
+        return consumers
+
+    def _work_camera_consumers(self):
+        return ('gaze', 'blink') if self.BLINK_TRACKING else ('gaze',)
+
+    def _on_blink_rate(self, blinks_per_minute, blink_count, tracked_s):
+        """Raport mrugnięć z EyeMonitorWorker (co ~minutę pracy) - zapis paczkami."""
+        if self.current_state != self.STATE_WORKING:
+            return
+        print(f"Mrugnięcia: {blinks_per_minute:.1f}/min ({blink_count} w {tracked_s:.0f} s)")
+        self.blink_rate_batch.append((datetime.now().isoformat(), blinks_per_minute, blink_count, tracked_s))
+        if len(self.blink_rate_batch) >= self.BLINK_BATCH_SIZE:
+            self._flush_blink_rates()
+
+    def _flush_blink_rates(self):
+        if self.blink_rate_batch:
+            self.session_writer.submit_blink_rates(1, self.blink_rate_batch)
+            self.blink_rate_batch = []
+
+    def _on_slouch_detected(self, diff_y, diff_z, diff_torso):
+        # Nie nadpisuj przypomnienia o przerwie (timer pracy stoi, gdy czeka na kliknięcie)
+        if self.current_state != self.STATE_WORKING or not self.main_work_timer.isActive():
+            return
+        print(f"Postawa: garbienie się (dy={diff_y:.3f}, dz={diff_z:.3f}, tułów={diff_torso:.1f}°)")
+        self.tray_icon.show_notification("Wyprostuj się!", "Od dłuższej chwili siedzisz zgarbiony.")
+
+    def _on_posture_calibrated(self, base_dy, base_dz, base_torso_angle):
+        if self.db_sync.save_posture_calibration(1, base_dy, base_dz, base_torso_angle):
+            print("Postawa: kalibracja zapisana w bazie")
+
+    def _recalibrate_posture(self):
+        if self.posture_worker:
+            self.posture_worker.recalibrate()
+            self.tray_icon.show_notification("Kalibracja postawy", "Usiądź prosto przez kilkanaście sekund.")
+
+    def _on_hrv_update(self, rmssd_ms, sdnn_ms, stress):
+        """HRV z PulseMonitorWorker (tuż przed kolejną próbką BPM) - stres do zapisu z tą próbką."""
+        if self.current_state == self.STATE_BREAK:
+            self.session_hrv_stress = stress
+            print(f"HRV: RMSSD={rmssd_ms:.0f} ms, SDNN={sdnn_ms:.0f} ms, stres={stress*100:.0f}%")
+
+    def _on_camera_failed(self, error):
+        print(f"Kamera niedostępna - śledzenie wzroku wyłączone ({error})")
+
+    def _start_eye_monitor(self):
+        """Uruchamia wątek monitora (raz); śledzenie aktywne tylko w trakcie przerwy."""
         if self.eye_monitor_worker:
-            self.eye_monitor_worker.gaze_detected_signal.connect(self.handle_gaze_change)
+            if not self.eye_monitor_worker.isRunning():
+                self.eye_monitor_worker.start()
+                print("Eye Monitor: Wątek uruchomiony (w tle).")
+            on_break = self.current_state == self.STATE_BREAK
+            self.eye_monitor_worker.set_tracking_enabled(on_break and not self.PALMING_MODE)
+            self.eye_monitor_worker.set_palming_mode(on_break and self.PALMING_MODE)
+            self.eye_monitor_worker.set_blink_tracking(
+                self.BLINK_TRACKING and self.current_state == self.STATE_WORKING)
+        else:
+            print("Eye Monitor: Wątek nie uruchomiony (kamera jeszcze niegotowa lub brak kamery).")
 
     def start_break_prompt(self):
         """Timer pracy zakończony. Zatrzymuje timer, pokazuje powiadomienie."""
@@ -201,16 +341,23 @@ class ApplicationController:
         
         # Inicjalizuj dane sesji odpoczynku
         self.session_start_time = time.time()
-        self.session_heartbeat_data = []
+        self.session_recorder = SessionRecorder()
         self.session_time_intervals = []
         self.session_stress_level = 0.0
+        self.session_hrv_stress = None
+        self.gaze_timeline.reset()  # oś zaczyna pierwszy sygnał wzroku/palmingu (mark)
         print("Rozpoczęto zbieranie danych sesji odpoczynku")
         print("Oczekiwanie na dane tętna...")
 
         # 1. Zmień stan w wątku Vision, aby zaczął przetwarzać
         if self.eye_monitor_worker:
-            self.eye_monitor_worker.set_tracking_enabled(True)  # NOWOŚĆ!
+            self.eye_monitor_worker.set_tracking_enabled(not self.PALMING_MODE)  # NOWOŚĆ!
+            self.eye_monitor_worker.set_palming_mode(self.PALMING_MODE)
+            self.eye_monitor_worker.set_blink_tracking(False)
             print("Eye Monitor: Wątek AKTYWOWANY do śledzenia przerwy.")
+        self._start_pulse_monitor()
+        if self.posture_worker:
+            self.posture_worker.set_active(False)
 
         # 2. Otwórz okno i przejdź do main tab
         self.settings_window.show()
@@ -243,7 +390,12 @@ class ApplicationController:
         # 2. Zmień stan w wątku Vision, aby przestał przetwarzać (lub ignorował wyniki)
         if self.eye_monitor_worker and self.eye_monitor_worker.isRunning():
             self.eye_monitor_worker.set_tracking_enabled(False)  # NOWOŚĆ!
+            self.eye_monitor_worker.set_palming_mode(False)
             print("Eye Monitor: Wątek ZAWIESZONY/WYŁĄCZONY (czeka).")
+        self.palming_pause_timer.stop()
+        self._stop_pulse_monitor()
+        if self.posture_worker:
+            self.posture_worker.set_active(True)
 
         # 3. Hide the window and resume main work timer
         self.settings_window.hide()
@@ -252,10 +404,13 @@ class ApplicationController:
     def handle_gaze_change(self, looking_at_screen, x_angle, y_angle):
         """
         Obsługuje zmianę stanu patrzenia użytkownika. Aktywna tylko w trakcie przerwy.
+        Sygnał przychodzi tylko przy zmianie stanu (EyeMonitorWorker).
         """
         if self.current_state != self.STATE_BREAK:
             return  # Ignoruj śledzenie wzroku w trybie pracy
 
+        self.gaze_timeline.mark(looking_at_screen)
+
         if looking_at_screen:
             # Użytkownik zaczął patrzeć w ekran - zapauzuj timer i zwiększ stres
             self.pause_main_break_timer(x_angle, y_angle)
@@ -267,6 +422,32 @@ class ApplicationController:
             if hasattr(self, 'session_stress_level'):
                 self.session_stress_level = max(0.0, self.session_stress_level - 0.05)
 
+    def _on_palming_change(self, covered, at):
+        """
+        Zakrycie oczu w trakcie palmingu (EyeMonitorWorker). `at` to czas przechwycenia
+        pierwszej klatki nowego stanu - oś czasu przerwy ma dokładne granice odcinków.
+        """
+        if self.current_state != self.STATE_BREAK:
+            return
+
+        self.gaze_timeline.mark(not covered, now=at)
+        if covered:
+            self.palming_pause_timer.stop()
+            self.resume_main_break_timer()
+        else:
+            # Odliczanie przerwy stoi, dopóki dłonie nie zakryją oczu (najdłużej PALMING_PAUSE_TIMEOUT_MS)
+            self.pause_main_break_timer(0.0, 0.0, "PAUZA! Zakryj oczy dłońmi")
+            self.palming_pause_timer.start()
+
+    def _on_palming_pause_timeout(self):
+        """Zakrycia oczu nie wykryto - przerwa biegnie dalej bez weryfikacji palmingu."""
+        if self.current_state != self.STATE_BREAK:
+            return
+        print("Palming: nie wykryto zakrycia oczu - wznawiam odliczanie przerwy")
+        # Przerwa znów się liczy, więc na osi czasu to odpoczynek, nie patrzenie w ekran
+        self.gaze_timeline.mark(False)
+        self.resume_main_break_timer()
+
     def pause_main_timer(self):
         """Zatrzymuje główny timer odliczający czas pracy (np. gdy otwarte ustawienia)."""
         if self.current_state == self.STATE_WORKING and self.main_work_timer.isActive():
@@ -281,26 +462,38 @@ class ApplicationController:
         """Uruchamia główny timer pracy."""
         self.resume_main_timer()
 
-        # Uruchamiamy wątek monitora tylko raz na starcie aplikacji.
-        if self.eye_monitor_worker:
-            self.eye_monitor_worker.start()
-            self.eye_monitor_worker.set_tracking_enabled(False)  # Początkowo wyłączony
-            print("Eye Monitor: Wątek uruchomiony (w tle, wyłączony).")
-        else:
-            print("Eye Monitor: Wątek nie uruchomiony (brak kamery).")
+        # Wątek monitora uruchamiany tylko raz (tu albo po otwarciu kamery)
+        self._start_eye_monitor()
 
     def exit_application(self):
         """Bezpiecznie zamyka aplikację, wątek i zwalnia zasoby kamery."""
         print("Zamykanie aplikacji...")
 
         # 1. Zatrzymanie wątku Vision (tutaj musi być stop, by zamknąć wątek)
+        if self.camera_opener.isRunning():
+            self.camera_opener.wait()
         if self.eye_monitor_worker and self.eye_monitor_worker.isRunning():
             self.eye_monitor_worker.stop()
+        if self.pulse_monitor_worker and self.pulse_monitor_worker.isRunning():
+            self.pulse_monitor_worker.stop()
+        if self.posture_worker and self.posture_worker.isRunning():
+            self.posture_worker.stop()
+        if self.camera_hub:
+            self.camera_hub.stop()
+        if self.landmark_recorder:
+            self.landmark_recorder.close()
+
+        # Dokończ zapis sesji oczekujących w kolejce
+        if hasattr(self, 'session_writer') and self.session_writer.isRunning():
+            self._flush_blink_rates()
+            self.session_writer.stop()
 
         # 2. Zwolnienie zasobów EyeTracker
         if self.gaze_tracker_instance:
             self.gaze_tracker_instance.release()
             print("Zwolniono zasoby EyeTracker.")
+        if self.shared_inference:
+            self.shared_inference.close()
 
         self.tray_icon.hide()
         QCoreApplication.quit()
@@ -570,12 +763,12 @@ class ApplicationController:
         else:
             print("Nie można uruchomić muzyki w tle - brak pliku.")
 
-    def pause_main_break_timer(self, x_angle, y_angle):
-        """Pauzuje timer przerwy gdy użytkownik patrzy w ekran."""
+    def pause_main_break_timer(self, x_angle, y_angle, message="PAUZA! Patrzysz w ekran!"):
+        """Pauzuje timer przerwy gdy użytkownik patrzy w ekran (albo odsłonił oczy w palmingu)."""
         if not self.is_main_paused and self.main_page_timer.isActive():
             self.main_page_timer.stop()
             self.is_main_paused = True
-            self.status_label.setText(f"PAUZA! Patrzysz w ekran!")
+            self.status_label.setText(message)
             self.status_label.setStyleSheet("font-size: 20px; font-weight: bold; color: #ff6b6b;")
 
     def resume_main_break_timer(self):
@@ -639,11 +832,9 @@ class ApplicationController:
                         text = f"BPM: {bpm_value}"
                         
                         # Zapisz dane tętna podczas sesji przerwy (tylko wartości w rozsądnym zakresie)
-                        if (self.current_state == self.STATE_BREAK and 
-                            hasattr(self, 'session_heartbeat_data') and
+                        if (self.current_state == self.STATE_BREAK and
                             40 <= bpm_value <= 200):  # filtruj nieprawdopodobne wartości
-                            self.session_heartbeat_data.append(bpm_value)
-                            print(f"Zapisano tętno: {bpm_value} BPM (łącznie: {len(self.session_heartbeat_data)} pomiarów)")
+                            self.session_recorder.add(bpm_value, stress=self.session_hrv_stress)
                             
                     except (ValueError, TypeError):
                         text = "BPM: --"
@@ -652,23 +843,20 @@ class ApplicationController:
             print(f"Failed to set BPM label: {e}")
     
     def _calculate_session_intervals(self):
-        """Oblicza interwały czasowe sesji odpoczynku"""
-        if not hasattr(self, 'session_start_time') or self.session_start_time is None:
-            return [300.0]  # domyślny 5-minutowy interwał
-        
-        session_duration = time.time() - self.session_start_time
-        # Symuluj 3 interwały odpoczynku
-        interval1 = session_duration * 0.4
-        interval2 = session_duration * 0.35  
-        interval3 = session_duration * 0.25
-        
-        return [interval1, interval2, interval3]
+        """Rzeczywiste interwały odpoczynku z osi czasu patrzenia (odcinki bez patrzenia w ekran)"""
+        if not self.gaze_timeline.started:
+            # Brak sygnału wzroku (kamera nie działała) - cała zmierzona przerwa, bez stałego bonusu
+            if self.session_start_time is None:
+                return []
+            return [max(0.0, time.time() - self.session_start_time)]
+
+        self.gaze_timeline.stop()
+        return self.gaze_timeline.time_intervals()
     
     def _calculate_session_score(self, time_intervals):
-        """Oblicza punkty za sesję używając ScoreManager"""
-        from game.score_manager import ScoreManager
-        score_manager = ScoreManager()
-        return score_manager.calculate_session_score(time_intervals)
+        """Oblicza punkty za sesję (współdzielony ScoringEngine - bez odczytu z dysku)"""
+        from game.score_manager import get_scoring_engine
+        return get_scoring_engine().session_score(time_intervals)
     
     def _save_break_session_data(self):
         """Zapisuje dane sesji odpoczynku do bazy danych - tylko jeśli są rzeczywiste dane"""
@@ -681,47 +869,63 @@ class ApplicationController:
             return
         
         # Sprawdź czy są rzeczywiste dane tętna
-        if not self.session_heartbeat_data or len(self.session_heartbeat_data) == 0:
+        if len(self.session_recorder) == 0:
             print("Brak danych tętna - tętno nie zostanie zapisane")
             # Wyczyść dane sesji
             self.session_start_time = None
-            self.session_heartbeat_data = [0]
+            self.session_recorder = SessionRecorder()
             self.session_stress_level = 0.0
             return
         
         try:
             # Przygotuj dane sesji (tylko rzeczywiste dane)
-            heartbeat_data = self.session_heartbeat_data
+            heartbeat_data = self.session_recorder
             time_intervals = self._calculate_session_intervals()
-            stress_level = max(0.0, min(1.0, self.session_stress_level))
+            interruption_count = self.gaze_timeline.interruption_count()
+            # Stres z HRV (RMSSD), gdy był mierzony; inaczej heurystyka z odwracania wzroku
+            stress_level = self.session_recorder.stress_mean
+            if stress_level is None:
+                stress_level = max(0.0, min(1.0, self.session_stress_level))
             points = self._calculate_session_score(time_intervals)
             
-            # Zapisz do bazy danych
-            session_id = self.db_sync.sync_session(
-                user_id=1,
-                heartbeat_data=heartbeat_data,
-                stress_level=stress_level,
-                time_intervals=time_intervals,
-                points=points,
-                exercise_type='break'
-            )
-            print(f"Sesja odpoczynku zapisana:")
-            print(f"   - ID sesji: {session_id}")
-            print(f"   - Czas trwania: {sum(time_intervals):.1f}s")
-            print(f"   - Pomiary tętna: {len(heartbeat_data)}")
-            print(f"   - Średnie tętno: {sum(heartbeat_data)/len(heartbeat_data):.1f} BPM")
-            print(f"   - Poziom stresu: {stress_level*100:.0f}%")
-            print(f"   - Punkty: {points}")
+            # Zapis w wątku SessionWriterThread (wynik -> _on_session_saved)
+            self.session_writer.submit({
+                'user_id': 1,
+                'heartbeat_data': heartbeat_data,
+                'stress_level': stress_level,
+                'time_intervals': time_intervals,
+                'points': points,
+                'interruption_count': interruption_count,
+                'exercise_type': 'break'
+            })
+            print("Sesja odpoczynku przekazana do zapisu w tle")
             
             # Wyczyść dane sesji
             self.session_start_time = None
-            self.session_heartbeat_data = []
+            self.session_recorder = SessionRecorder()  # poprzedni należy teraz do wątku zapisu
             self.session_time_intervals = []
             self.session_stress_level = 0.0
             
         except Exception as e:
             print(f"Błąd zapisywania sesji: {e}")
 
+    def _on_session_saved(self, session_id, record):
+        """Wywoływane (w wątku GUI) po zapisaniu sesji przez SessionWriterThread."""
+        heartbeat_data = record['heartbeat_data']
+        time_intervals = record['time_intervals']
+        print(f"Sesja odpoczynku zapisana:")
+        print(f"   - ID sesji: {session_id}")
+        print(f"   - Czas odpoczynku: {sum(time_intervals):.1f}s ({len(time_intervals)} interwałów)")
+        print(f"   - Przerwania: {record.get('interruption_count', 0)}")
+        print(f"   - Pomiary tętna: {len(heartbeat_data)}")
+        print(f"   - Średnie tętno: {heartbeat_data.mean:.1f} BPM ({heartbeat_data.min}-{heartbeat_data.max})")
+        print(f"   - Poziom stresu: {record['stress_level']*100:.0f}%")
+        print(f"   - Punkty: {record['points']}")
+
+    def _on_session_save_failed(self, error, record):
+        """Wywoływane (w wątku GUI), gdy zapis sesji nie powiódł się mimo ponowień."""
+        print(f"Błąd zapisywania sesji: {error}")
+
     def run(self):
         """Uruchamia pętlę zdarzeń aplikacji."""
         return self.app.exec_()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Testy pauzy palmingu w ApplicationController (pytest)."""
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('PyQt5')
+pytest.importorskip('mediapipe')
+
+from main import ApplicationController
+from vision.gaze_timeline import GazeTimeline
+
+
+class StoppedTimer:
+    def __init__(self):
+        self.active = False
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+
+def controller(now):
+    """Minimalny stan kontrolera potrzebny metodom palmingu (bez okien i kamery)."""
+    calls = []
+    state = SimpleNamespace(
+        STATE_BREAK=ApplicationController.STATE_BREAK,
+        current_state=ApplicationController.STATE_BREAK,
+        gaze_timeline=GazeTimeline(),
+        palming_pause_timer=StoppedTimer(),
+        calls=calls,
+        pause_main_break_timer=lambda *args: calls.append('pause'),
+        resume_main_break_timer=lambda: calls.append('resume'),
+    )
+    state.gaze_timeline.mark(False, now=now)  # dłonie zakrywają oczy od początku przerwy
+    return state
+
+
+def test_timeout_counts_the_rest_of_the_break_as_rest(monkeypatch):
+    state = controller(now=0.0)
+
+    ApplicationController._on_palming_change(state, False, 30.0)  # dłonie opuszczone
+    assert state.calls == ['pause'] and state.palming_pause_timer.active
+
+    monkeypatch.setattr('time.monotonic', lambda: 45.0)  # minęło PALMING_PAUSE_TIMEOUT_MS
+    ApplicationController._on_palming_pause_timeout(state)
+    state.gaze_timeline.stop(now=120.0)
+
+    assert state.calls == ['pause', 'resume']
+    assert state.gaze_timeline.time_intervals() == [30.0, 75.0]
+    assert state.gaze_timeline.interruption_count() == 1
+
+
+def test_timeout_after_break_ended_does_nothing():
+    state = controller(now=0.0)
+    state.current_state = ApplicationController.STATE_WORKING
+
+    ApplicationController._on_palming_pause_timeout(state)
+
+    assert state.calls == []
+    assert state.gaze_timeline.time_intervals(now=10.0) == [10.0]
@@ -2,6 +2,13 @@ import sqlite3
 import json
 from datetime import datetime, timedelta
 
+# Columns added to MonitorConfiguration for robust monitor calibration (spread of the fit)
+MONITOR_CALIBRATION_COLUMNS = (
+    ('spread_x_degrees', 'REAL'),
+    ('spread_y_degrees', 'REAL'),
+    ('sample_count', 'INTEGER'),
+)
+
 
 class DatabaseManager:
     """Handles all database operations for the wellness application."""
@@ -267,4 +274,64 @@ class DatabaseManager:
             
         except Exception as e:
             print(f"Error saving calibration data: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    def _ensure_monitor_calibration_columns(self, conn):
+        """Add the calibration spread columns to an existing MonitorConfiguration table."""
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(MonitorConfiguration)")}
+        for name, column_type in MONITOR_CALIBRATION_COLUMNS:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE MonitorConfiguration ADD COLUMN {name} {column_type}")
+
+    def save_monitor_calibration(self, user_id, fits, monitors=None):
+        """
+        Save a monitor calibration (CalibrationEngine fits) in one transaction.
+
+        The calibrated monitors replace the user's active configuration: other
+        monitors are deactivated, calibrated ones are upserted with the fitted
+        head yaw/pitch as angle_x/angle_y and their spreads. Failed monitors
+        (None fits) are skipped.
+        """
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                self._ensure_monitor_calibration_columns(conn)
+                current_time = datetime.now().isoformat()
+                rows = []
+                for fit in fits:
+                    if fit is None:
+                        continue
+                    number = fit['monitor']
+                    monitor = monitors[number - 1] if monitors and number <= len(monitors) else None
+                    is_primary = bool(getattr(monitor, 'is_primary', number == 1))
+                    rows.append((user_id, f"Monitor {number}", fit['yaw'], fit['pitch'], is_primary,
+                                 fit['yaw_spread'], fit['pitch_spread'], fit['inliers'],
+                                 current_time, current_time))
+
+                with conn:
+                    conn.execute('''
+                        UPDATE MonitorConfiguration SET is_active = 0, last_updated = ?
+                        WHERE user_id = ? AND is_active = 1
+                    ''', (current_time, user_id))
+                    conn.executemany('''
+                        INSERT INTO MonitorConfiguration
+                        (user_id, monitor_name, angle_x_degrees, angle_y_degrees, is_primary,
+                         spread_x_degrees, spread_y_degrees, sample_count, created_date, last_updated, is_active)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+                        ON CONFLICT(user_id, monitor_name) DO UPDATE SET
+                            angle_x_degrees = excluded.angle_x_degrees,
+                            angle_y_degrees = excluded.angle_y_degrees,
+                            is_primary = excluded.is_primary,
+                            spread_x_degrees = excluded.spread_x_degrees,
+                            spread_y_degrees = excluded.spread_y_degrees,
+                            sample_count = excluded.sample_count,
+                            last_updated = excluded.last_updated,
+                            is_active = 1
+                    ''', rows)
+            finally:
+                conn.close()
+            return True
+
+        except Exception as e:
+            print(f"Error saving monitor calibration: {e}")
+            return False
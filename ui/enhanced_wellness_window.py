@@ -50,7 +50,7 @@ class EnhancedWellnessWindow(QMainWindow):
         self.chart_widgets = ChartWidgets(self.ui_scaling)
         self.stats_widgets = StatsWidgets(self.ui_scaling)
         self.achievements_widgets = AchievementsWidgets(self.ui_scaling)
-        self.camera_calibration = CameraCalibration(self.ui_scaling, self.database_manager)
+        self.camera_calibration = CameraCalibration(self.ui_scaling, self.database_manager, self.user_id)
 
         self.setWindowTitle("Rest&Blink - Enhanced Wellness Dashboard")
         self.setup_window_geometry()
@@ -3,15 +3,13 @@ camera_config_demo.py
 Demo: ConfigureTab - Camera preview + calibration saving
 - DPI-aware UIScaling
 - Stable camera preview (no growth loop)
-- SQLite saving of calibration entries
+- Calibration on a worker thread (CalibrationEngine), saved to MonitorConfiguration
 """
 import sys
 import os
+import importlib.util
 import logging
-import sqlite3
-import datetime
 import cv2
-import numpy as np
 
 # --- Qt imports ---
 from PyQt5.QtWidgets import (
@@ -20,7 +18,12 @@ from PyQt5.QtWidgets import (
     QSizePolicy
 )
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QSize
-from PyQt5.QtGui import QFont, QImage, QPixmap, QGuiApplication
+from PyQt5.QtGui import QFont, QPixmap, QGuiApplication
+
+from vision.calibration_engine import CalibrationEngine
+from vision.camera_registry import CameraRegistry
+from vision.model_loader import face_mesh_async
+from ui.components.database_manager import DatabaseManager
 
 # Optional: screeninfo and mediapipe
 try:
@@ -29,13 +32,8 @@ except Exception:
     def get_monitors():
         return []
 
-try:
-    import mediapipe as mp
-    MP_AVAILABLE_GLOBAL = True
-    mp_face_mesh = mp.solutions.face_mesh
-except Exception:
-    MP_AVAILABLE_GLOBAL = False
-    mp_face_mesh = None
+# Only check that mediapipe is installed - FaceMesh is built by the model-init thread
+MP_AVAILABLE_GLOBAL = importlib.util.find_spec("mediapipe") is not None
 
 # --- Logging ---
 LOG_PATH = os.path.join(os.path.dirname(__file__), "camera_debug.log")
@@ -254,8 +252,6 @@ class ConfigureTab(QWidget):
 
     # --- Calibration system initialization ---
     def _init_calibration_system(self):
-        self.cap = {"obj": None}
-        self.timer = QTimer()
         try:
             self.monitors = get_monitors()
         except Exception:
@@ -263,9 +259,13 @@ class ConfigureTab(QWidget):
             self.monitors = []
         self.num_monitors = max(1, len(self.monitors))
         self.current_index = {"i": 0}
-        self.timer_connected = {"v": False}
         self.calibration_active = {"v": False}
         self.calibration_templates = []
+        self.engine = None
+
+        # Results go to MonitorConfiguration of the window's user
+        self.database_manager = getattr(self.parent_window, "database_manager", None) or DatabaseManager()
+        self.user_id = getattr(self.parent_window, "user_id", 1)
 
         # detection init
         self._init_eye_detection()
@@ -273,20 +273,14 @@ class ConfigureTab(QWidget):
     def _init_eye_detection(self):
         """Initialize MediaPipe (if available) and Haar fallback."""
         self.MP_AVAILABLE = False
-        self.face_mesh = None
-        global MP_AVAILABLE_GLOBAL, mp_face_mesh
-        try:
-            if MP_AVAILABLE_GLOBAL and mp_face_mesh is not None:
-                self.MP_AVAILABLE = True
-                self.face_mesh = mp_face_mesh.FaceMesh(
-                    static_image_mode=False, max_num_faces=1, refine_landmarks=True,
-                    min_detection_confidence=0.5, min_tracking_confidence=0.5
-                )
-                logging.info("MediaPipe initialized")
-        except Exception:
-            logging.exception("MediaPipe init failed")
-            self.MP_AVAILABLE = False
-            self.face_mesh = None
+        self._face_mesh_model = None
+        if MP_AVAILABLE_GLOBAL:
+            # Built on the model-init thread; Haar fallback is used until it is ready
+            self.MP_AVAILABLE = True
+            self._face_mesh_model = face_mesh_async(
+                static_image_mode=False, max_num_faces=1, refine_landmarks=True,
+                min_detection_confidence=0.5, min_tracking_confidence=0.5
+            )
 
         # Haar fallback
         self.eye_cascade = None
@@ -298,235 +292,81 @@ class ConfigureTab(QWidget):
             self.eye_cascade = None
             logging.warning("Haar cascade not available")
 
-    # --- detection & head pose (same approach as you had) ---
-    def estimate_head_pose(self, landmarks, image_shape):
-        try:
-            h, w = image_shape[0], image_shape[1]
-            idx_map = {"nose": 1, "l_eye": 33, "r_eye": 263, "l_mouth": 61, "r_mouth": 291, "chin": 199}
-            image_points = np.array([
-                (landmarks[idx_map["nose"]].x * w, landmarks[idx_map["nose"]].y * h),
-                (landmarks[idx_map["l_eye"]].x * w, landmarks[idx_map["l_eye"]].y * h),
-                (landmarks[idx_map["r_eye"]].x * w, landmarks[idx_map["r_eye"]].y * h),
-                (landmarks[idx_map["l_mouth"]].x * w, landmarks[idx_map["l_mouth"]].y * h),
-                (landmarks[idx_map["r_mouth"]].x * w, landmarks[idx_map["r_mouth"]].y * h),
-                (landmarks[idx_map["chin"]].x * w, landmarks[idx_map["chin"]].y * h)
-            ], dtype=np.float64)
-            model_points = np.array([
-                (0.0, 0.0, 0.0),
-                (-60.0, -40.0, -30.0),
-                (60.0, -40.0, -30.0),
-                (-50.0, 40.0, -60.0),
-                (50.0, 40.0, -60.0),
-                (0.0, 110.0, -20.0)
-            ], dtype=np.float64)
-            focal_length = w
-            center = (w / 2, h / 2)
-            camera_matrix = np.array([[focal_length, 0, center[0]],
-                                      [0, focal_length, center[1]],
-                                      [0, 0, 1]], dtype=np.float64)
-            dist_coeffs = np.zeros((4, 1))
-            success, rotation_vector, translation_vector = cv2.solvePnP(
-                model_points, image_points, camera_matrix, dist_coeffs, flags=cv2.SOLVEPNP_ITERATIVE
-            )
-            if not success:
-                return False, (0.0, 0.0, 0.0)
-            rmat, _ = cv2.Rodrigues(rotation_vector)
-            sy = np.sqrt(rmat[0, 0] * rmat[0, 0] + rmat[1, 0] * rmat[1, 0])
-            singular = sy < 1e-6
-            if not singular:
-                x = np.arctan2(rmat[2, 1], rmat[2, 2])
-                y = np.arctan2(-rmat[2, 0], sy)
-                z = np.arctan2(rmat[1, 0], rmat[0, 0])
-            else:
-                x = np.arctan2(-rmat[1, 2], rmat[1, 1])
-                y = np.arctan2(-rmat[2, 0], sy)
-                z = 0.0
-            pitch = np.degrees(x)
-            yaw = np.degrees(y)
-            roll = np.degrees(z)
-            return True, (yaw, pitch, roll)
-        except Exception:
-            logging.exception("estimate_head_pose failed")
-            return False, (0.0, 0.0, 0.0)
+    # --- calibration engine (camera, detection and fitting run on its thread) ---
+    def _store_calibration(self, fits):
+        """Called on the engine thread: all monitors in one MonitorConfiguration transaction."""
+        return self.database_manager.save_monitor_calibration(self.user_id, fits, self.monitors)
 
-    def detect_eyes_in_frame(self, frame):
-        try:
-            h, w = frame.shape[:2]
-            if self.MP_AVAILABLE and self.face_mesh is not None:
-                img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results = self.face_mesh.process(img_rgb)
-                if results and getattr(results, "multi_face_landmarks", None):
-                    lm = results.multi_face_landmarks[0].landmark
-                    left_idxs = [33, 133, 160, 159, 158, 157, 173, 246]
-                    right_idxs = [362, 263, 387, 386, 385, 384, 398, 466]
-                    def avg_points(idxs):
-                        xs = [lm[i].x for i in idxs if i < len(lm)]
-                        ys = [lm[i].y for i in idxs if i < len(lm)]
-                        if not xs:
-                            return None
-                        return (int(sum(xs) / len(xs) * w), int(sum(ys) / len(ys) * h))
-                    left = avg_points(left_idxs)
-                    right = avg_points(right_idxs)
-                    return left, right, lm
-            if self.eye_cascade is not None:
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                eyes = self.eye_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=3, minSize=(30, 30))
-                eyes = sorted(eyes, key=lambda e: e[0])
-                if len(eyes) >= 2:
-                    l, r = eyes[0], eyes[1]
-                    left_center = (int(l[0] + l[2] / 2), int(l[1] + l[3] / 2))
-                    right_center = (int(r[0] + r[2] / 2), int(r[1] + r[3] / 2))
-                    return left_center, right_center, None
-                elif len(eyes) == 1:
-                    e = eyes[0]
-                    center = (int(e[0] + e[2] / 2), int(e[1] + e[3] / 2))
-                    return center, None, None
-        except Exception:
-            logging.exception("detect_eyes_in_frame exception")
-        return None, None, None
-
-    def update_frame(self):
-        """Read camera, detect, and draw — scale pixmap to fit label (do not resize label)."""
-        try:
-            if self.cap["obj"] is None:
-                return
-            ret, frame = self.cap["obj"].read()
-            if not ret or frame is None:
-                return
-
-            left, right, lm = self.detect_eyes_in_frame(frame)
-            head = None
-            if self.MP_AVAILABLE and lm is not None:
-                ok, head = self.estimate_head_pose(lm, frame.shape)
-                if ok:
-                    self.camera_label._last_head = head
-                else:
-                    self.camera_label._last_head = None
-            else:
-                self.camera_label._last_head = None
-
-            vis = frame.copy()
-            if left:
-                cv2.circle(vis, left, 4, (0, 255, 0), -1)
-            if right:
-                cv2.circle(vis, right, 4, (0, 255, 0), -1)
-            if getattr(self.camera_label, "_last_head", None):
-                yv, pv, rv = self.camera_label._last_head
-                cv2.putText(vis, f"yaw:{yv:.1f} pitch:{pv:.1f}", (10, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (200, 200, 50), 2)
-
-            # Convert and scale pixmap to label size (without changing label size)
-            frame_rgb = cv2.cvtColor(vis, cv2.COLOR_BGR2RGB)
-            h, w, ch = frame_rgb.shape
-            bytes_per_line = ch * w
-            qimg = QImage(frame_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-            pix = QPixmap.fromImage(qimg)
-
-            lbl_w = max(1, self.camera_label.width())
-            lbl_h = max(1, self.camera_label.height())
-
-            scaled = pix.scaled(lbl_w, lbl_h, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            self.camera_label.setPixmap(scaled)
-
-            # store detections
-            self.camera_label._last_left = left
-            self.camera_label._last_right = right
-
-        except Exception:
-            logging.exception("Exception in update_frame")
-            self.safe_release()
-            self.status_label.setText("❌ Błąd przetwarzania kamery. Sprawdź logi.")
-            self.calibrate_btn.setEnabled(True)
-            self.calibration_active["v"] = False
-
-    def record_current_monitor_and_continue(self):
-        try:
-            left = getattr(self.camera_label, "_last_left", None)
-            right = getattr(self.camera_label, "_last_right", None)
-            head = getattr(self.camera_label, "_last_head", None)
-            mi = self.current_index['i'] + 1
-
-            logging.info(f"Recorded monitor {mi}: left={left}, right={right}, head={head}")
-            self.calibration_templates.append({"monitor": mi, "left": left, "right": right, "head": head})
-
-            item_text = f"Ekran {mi}: head={head}, left={left}, right={right}"
-            #self.eyes_list.addItem(QListWidgetItem(item_text))
-            self.status_label.setText(f"Zarejestrowano pozycję oczu dla ekranu {mi}.")
+    def _on_preview(self, image):
+        if self.engine is None:
+            return
+        # Frame is already scaled by the engine - just show it
+        self.camera_label.setPixmap(QPixmap.fromImage(image))
+        self.engine.set_preview_size(self.camera_label.width(), self.camera_label.height())
 
-            # save
-            self._save_configuration_to_db(mi, left, right, head)
-        except Exception:
-            logging.exception("Error saving eye data")
-            self.status_label.setText("❌ Błąd zapisu pozycji oczu.")
+    def _on_sample(self, monitor, collected, needed):
+        if self.engine is None:
+            return
+        done = (monitor - 1) + collected / max(1, needed)
+        self.progress.setValue(int(done / self.num_monitors * 100))
 
+    def _on_monitor_collected(self, monitor, collected):
+        if self.engine is None:
+            return
+        logging.info(f"Collected {collected} samples for monitor {monitor}")
+        self.status_label.setText(f"Zarejestrowano pozycję oczu dla ekranu {monitor} ({collected} próbek).")
         self.current_index['i'] += 1
         self.progress.setValue(int(self.current_index['i'] / self.num_monitors * 100))
         QTimer.singleShot(800, self.next_monitor_step)
 
-    def _save_configuration_to_db(self, monitor_num, left, right, head):
-        try:
-            db_path = os.path.join(os.path.dirname(__file__), "user_data.db")
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-
-            head_yaw, head_pitch, head_roll = head if head else (None, None, None)
-            left_x, left_y = left if left else (None, None)
-            right_x, right_y = right if right else (None, None)
-            created_at = datetime.datetime.now().isoformat(timespec='seconds')
-
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS calibration_templates (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    monitor INTEGER,
-                    head_yaw REAL,
-                    head_pitch REAL,
-                    head_roll REAL,
-                    left_x INTEGER,
-                    left_y INTEGER,
-                    right_x INTEGER,
-                    right_y INTEGER,
-                    created_at TEXT
-                )
-            ''')
-
-            cursor.execute('''
-                INSERT INTO calibration_templates
-                (monitor, head_yaw, head_pitch, head_roll, left_x, left_y, right_x, right_y, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (monitor_num, head_yaw, head_pitch, head_roll, left_x, left_y, right_x, right_y, created_at))
-
-            conn.commit()
-            conn.close()
-            logging.info(f"Saved configuration for monitor {monitor_num}")
-        except Exception:
-            logging.exception("Error saving configuration to database")
+    def _on_calibration_finished(self, fits, saved):
+        if self.engine is None:
+            return
+        self.calibration_templates = fits
+        for number, fit in enumerate(fits, start=1):
+            logging.info(f"Monitor {number} fit: {fit}")
+        failed = [str(number) for number, fit in enumerate(fits, start=1) if fit is None]
+        self.safe_release()
+        if not saved:
+            self.status_label.setText("❌ Błąd zapisu pozycji oczu.")
+        elif failed:
+            self.status_label.setText(f"⚠️ Konfiguracja zakończona, nie wykryto twarzy dla ekranu: {', '.join(failed)}.")
+        else:
+            self.status_label.setText("✅ Konfiguracja zakończona.")
+        self.progress.setValue(100)
+        self.calibrate_btn.setEnabled(True)
+        self.calibration_active['v'] = False
+        if saved:
+            self.configuration_updated.emit()
+
+    def _on_camera_failed(self, message):
+        if self.engine is None:
+            return
+        logging.error(f"Calibration camera error: {message}")
+        self.safe_release()
+        self.status_label.setText("❌ Nie udało się otworzyć kamery.")
+        self.calibrate_btn.setEnabled(True)
+        self.calibration_active['v'] = False
 
     def next_monitor_step(self):
-        try:
-            total = self.num_monitors
-            if self.current_index['i'] >= total:
-                self.safe_release()
-                self.status_label.setText("✅ Konfiguracja zakończona.")
-                self.progress.setValue(100)
-                self.calibrate_btn.setEnabled(True)
-                self.calibration_active['v'] = False
-                self.configuration_updated.emit()
-                return
+        if self.engine is None:
+            return
+        total = self.num_monitors
+        if self.current_index['i'] >= total:
+            self.status_label.setText("Obliczam pozycje ekranów...")
+            self.engine.finish()
+            return
 
-            mon = self.monitors[self.current_index['i']] if self.monitors else None
-            if mon:
-                self.status_label.setText(
-                    f"📺 Ekran {self.current_index['i'] + 1}/{total} — ({getattr(mon,'width', '?')}x{getattr(mon,'height','?')}). Popatrz teraz."
-                )
-            else:
-                self.status_label.setText(f"Ekran {self.current_index['i'] + 1}/{total}. Popatrz teraz.")
-            QTimer.singleShot(2000, self.record_current_monitor_and_continue)
-        except Exception:
-            logging.exception("next_monitor_step error")
-            self.safe_release()
-            self.status_label.setText("❌ Błąd w procesie konfiguracji.")
-            self.calibrate_btn.setEnabled(True)
-            self.calibration_active['v'] = False
+        monitor = self.current_index['i'] + 1
+        mon = self.monitors[self.current_index['i']] if self.monitors else None
+        if mon:
+            self.status_label.setText(
+                f"📺 Ekran {monitor}/{total} — ({getattr(mon,'width', '?')}x{getattr(mon,'height','?')}). Popatrz teraz."
+            )
+        else:
+            self.status_label.setText(f"Ekran {monitor}/{total}. Popatrz teraz.")
+        # Time to turn towards the screen, then the engine collects its samples
+        QTimer.singleShot(1200, lambda: self.engine is not None and self.engine.collect(monitor))
 
     def start_calibration(self):
         if self.calibration_active['v']:
@@ -535,65 +375,36 @@ class ConfigureTab(QWidget):
         self.calibrate_btn.setEnabled(False)
         self.current_index['i'] = 0
         self.progress.setValue(0)
-        #self.eyes_list.clear()
-        self.calibration_templates.clear()
+        self.calibration_templates = []
 
         self.status_label.setText("Inicjalizuję kamerę...")
         logging.info("Starting camera calibration")
-        try:
-            try:
-                self.cap["obj"] = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-            except Exception:
-                self.cap["obj"] = cv2.VideoCapture(0)
-
-            if not (self.cap["obj"] and self.cap["obj"].isOpened()):
-                self.status_label.setText("❌ Nie udało się otworzyć kamery.")
-                logging.error("Camera initialization failed")
-                self.cap["obj"] = None
-                self.calibrate_btn.setEnabled(True)
-                self.calibration_active['v'] = False
-                return
-
-            if not self.timer_connected["v"]:
-                self.timer.timeout.connect(self.update_frame)
-                self.timer_connected["v"] = True
-            self.timer.start(30)
-            QTimer.singleShot(800, self.next_monitor_step)
-        except Exception:
-            logging.exception("start_calibration failed")
-            self.status_label.setText("❌ Błąd inicjalizacji kamery.")
-            self.safe_release()
-            self.calibrate_btn.setEnabled(True)
-            self.calibration_active['v'] = False
+        # Camera is opened on the engine thread - the tab never waits for the driver
+        self.engine = CalibrationEngine(face_mesh_model=self._face_mesh_model,
+                                        eye_cascade=self.eye_cascade,
+                                        store=self._store_calibration,
+                                        source=CameraRegistry.load().source_for('gaze'))
+        self.engine.set_preview_size(self.camera_label.width(), self.camera_label.height())
+        self.engine.preview_signal.connect(self._on_preview)
+        self.engine.sample_signal.connect(self._on_sample)
+        self.engine.monitor_collected_signal.connect(self._on_monitor_collected)
+        self.engine.calibration_finished_signal.connect(self._on_calibration_finished)
+        self.engine.camera_failed_signal.connect(self._on_camera_failed)
+        self.engine.start()
+        QTimer.singleShot(800, self.next_monitor_step)
 
     def safe_release(self):
         try:
-            if self.cap.get("obj") is not None:
-                try:
-                    self.cap["obj"].release()
-                except Exception:
-                    logging.exception("Camera release failed")
-                self.cap["obj"] = None
-            if self.timer.isActive():
-                self.timer.stop()
-            if self.timer_connected["v"]:
-                try:
-                    self.timer.timeout.disconnect(self.update_frame)
-                except Exception:
-                    pass
-                self.timer_connected["v"] = False
+            if self.engine is not None:
+                engine, self.engine = self.engine, None
+                engine.stop()
         except Exception:
             logging.exception("safe_release exception")
-        try:
-            if self.face_mesh is not None:
-                try:
-                    self.face_mesh.close()
-                except Exception:
-                    pass
-        except Exception:
-            pass
 
     def closeEvent(self, event):
         self.safe_release()
+        # The model outlives single calibrations; close it with the tab only
+        if self._face_mesh_model is not None:
+            self._face_mesh_model.close()
+            self._face_mesh_model = None
         super().closeEvent(event)
-
@@ -15,6 +15,8 @@ class BreakReminderTrayIcon(QSystemTrayIcon):
     # NOWY SYGNAŁ: Aktywacja przerwy (kluczem jest kliknięcie w powiadomienie)
     break_activated_signal = pyqtSignal()
     exit_app_signal = pyqtSignal()
+    # Ponowna kalibracja postawy (użytkownik siedzi prosto)
+    recalibrate_posture_signal = pyqtSignal()
 
     def __init__(self, icon_path, parent=None):
         super().__init__(QIcon(icon_path), parent)
@@ -41,6 +43,10 @@ class BreakReminderTrayIcon(QSystemTrayIcon):
         settings_action.triggered.connect(self._emit_show_settings)
         self.menu.addAction(settings_action)
 
+        posture_action = QAction("Skalibruj postawę", self)
+        posture_action.triggered.connect(self._on_posture_action)
+        self.menu.addAction(posture_action)
+
         self.menu.addSeparator()
 
         exit_action = QAction("Zamknij", self)
@@ -96,5 +102,9 @@ class BreakReminderTrayIcon(QSystemTrayIcon):
     def _emit_show_settings(self):
         self.show_settings_signal.emit()
 
+    def _on_posture_action(self):
+        # Bez argumentu: triggered(bool) przekazałby `checked` do sygnału bez parametrów
+        self.recalibrate_posture_signal.emit()
+
     def _emit_exit_application(self):
         self.exit_app_signal.emit()
\ No newline at end of file
@@ -0,0 +1,84 @@
+import math
+import time
+from array import array
+
+
+class OneEuroAngleFilter:
+    """
+    Filtr One-Euro dla kątów głowy (domyślnie yaw, pitch, roll).
+
+    Przy powolnym ruchu mocno wygładza szum, przy szybkim zmniejsza
+    opóźnienie (odcięcie rośnie z prędkością). Cały stan siedzi we
+    wstępnie zaalokowanych array('d') - update() niczego nie alokuje.
+    Dzięki temu decyzję patrzy/nie patrzy można podejmować przy 3-5 Hz
+    zamiast 10 Hz.
+    """
+
+    def __init__(self, channels=3, min_cutoff=0.5, beta=0.1, d_cutoff=1.0,
+                 max_gap_s=1.0, velocity_ref=90.0):
+        self.channels = channels
+        self.min_cutoff = min_cutoff  # Hz, wygładzanie w spoczynku
+        self.beta = beta              # jak szybko odcięcie rośnie z prędkością
+        self.d_cutoff = d_cutoff      # Hz, wygładzanie pochodnej
+        self.max_gap_s = max_gap_s    # dłuższa przerwa w próbkach -> start od nowa
+        self.velocity_ref = velocity_ref  # deg/s, przy tej prędkości pewność spada o połowę
+
+        self.value = array('d', [0.0]) * channels
+        self.velocity = array('d', [0.0]) * channels
+        self.last_time = 0.0
+        self.initialized = False
+
+    def reset(self):
+        self.initialized = False
+        for i in range(self.channels):
+            self.value[i] = 0.0
+            self.velocity[i] = 0.0
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2.0 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def update(self, *samples, now=None):
+        """Dodaje pomiar (po jednym kącie na kanał). Wynik w self.value / self.velocity."""
+        now = time.monotonic() if now is None else now
+        dt = now - self.last_time
+
+        if not self.initialized or dt > self.max_gap_s:
+            for i in range(self.channels):
+                self.value[i] = samples[i]
+                self.velocity[i] = 0.0
+            self.last_time = now
+            self.initialized = True
+            return
+        if dt <= 0.0:
+            return
+
+        a_d = self._alpha(self.d_cutoff, dt)
+        for i in range(self.channels):
+            raw_velocity = (samples[i] - self.value[i]) / dt
+            velocity = self.velocity[i] + a_d * (raw_velocity - self.velocity[i])
+            cutoff = self.min_cutoff + self.beta * abs(velocity)
+            self.value[i] += self._alpha(cutoff, dt) * (samples[i] - self.value[i])
+            self.velocity[i] = velocity
+        self.last_time = now
+
+    def predict(self, index, now=None):
+        """Ekstrapolacja kanału na chwilę `now` (stała prędkość, max max_gap_s naprzód)."""
+        now = time.monotonic() if now is None else now
+        ahead = min(max(0.0, now - self.last_time), self.max_gap_s)
+        return self.value[index] + self.velocity[index] * ahead
+
+    def confidence(self, now=None):
+        """
+        Pewność estymaty 0-1: maleje z wiekiem ostatniego pomiaru
+        i z prędkością ruchu głowy (szybki ruch = niestabilna decyzja).
+        """
+        if not self.initialized:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        age = max(0.0, now - self.last_time)
+        if age > self.max_gap_s:
+            return 0.0
+        speed = max(abs(self.velocity[i]) for i in range(self.channels))
+        return (1.0 - age / self.max_gap_s) / (1.0 + speed / self.velocity_ref)
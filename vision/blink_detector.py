@@ -0,0 +1,120 @@
+import time
+
+import numpy as np
+
+# Punkty powiek FaceMesh (p1..p6 na oko): kąciki p1/p4, powieka górna p2/p3, dolna p6/p5
+LEFT_EYE = (33, 160, 158, 133, 153, 144)
+RIGHT_EYE = (362, 385, 387, 263, 373, 380)
+EYELID_LANDMARKS = LEFT_EYE + RIGHT_EYE
+
+# Progi względem bazowego EAR otwartego oka (adaptacyjnie, per użytkownik/kamera)
+BLINK_CLOSE_RATIO = 0.75   # EAR < baza * 0.75 -> oko zamknięte
+BLINK_OPEN_RATIO = 0.85    # EAR > baza * 0.85 -> oko znów otwarte (histereza)
+BASELINE_ALPHA = 0.02      # tempo EMA bazy (tylko klatki z otwartym okiem)
+MAX_BLINK_S = 0.5          # dłużej zamknięte = zamknięte oczy, nie mrugnięcie
+MAX_FRAME_GAP_S = 0.25     # większa przerwa między klatkami = mrugnięcie mogło umknąć
+
+BLINK_LATENCY_BUDGET_S = 0.1  # budżet przechwycenie klatki -> decyzja o mrugnięciu
+BLINK_REPORT_INTERVAL_S = 60.0
+MIN_TRACKED_S = 20.0       # minimalny czas z widoczną twarzą w oknie raportu
+
+
+class BlinkDetector:
+    """
+    Mrugnięcia z EAR (eye aspect ratio) na landmarkach FaceMesh z EyeTrackera.
+
+    O(1) na klatkę: 12 punktów powiek trafia do prealokowanej tablicy
+    (12, 2), EAR obu oczu liczony wektorowo. Progi zamknięcia/otwarcia są
+    względne do bazowego EAR (EMA z klatek z otwartym okiem). Czas jest
+    brany z chwili przechwycenia klatki, nie z chwili przetworzenia.
+
+    Mrugnięcia na minutę liczone są względem czasu z widoczną twarzą
+    (tracked_s), więc chwile bez twarzy nie zaniżają wyniku.
+    """
+
+    def __init__(self, latency_budget_s=BLINK_LATENCY_BUDGET_S):
+        self.latency_budget_s = latency_budget_s
+        self._points = np.zeros((12, 2), dtype=np.float64)
+        self._eyes = self._points.reshape(2, 6, 2)  # widok: (LEFT_EYE/RIGHT_EYE, p1..p6, xy)
+        self.total_blinks = 0
+        self.frames = 0
+        self.over_budget = 0
+        self.reset()
+        self.start_report()
+
+    def reset(self):
+        """Nowa sesja śledzenia (np. po zmianie użytkownika/oświetlenia)."""
+        self.baseline = None
+        self.ear = 0.0
+        self.closed = False
+        self._closed_since = 0.0
+        self._last_time = None
+
+    def start_report(self, now=None):
+        """Zaczyna nowe okno raportu mrugnięć na minutę."""
+        self.report_start = time.monotonic() if now is None else now
+        self.report_blinks = 0
+        self.tracked_s = 0.0
+
+    def eye_aspect_ratio(self, landmarks, width, height):
+        """Średni EAR obu oczu z 12 punktów powiek (współrzędne w pikselach)."""
+        points = self._points
+        for i, index in enumerate(EYELID_LANDMARKS):
+            p = landmarks[index]
+            points[i, 0] = p.x * width
+            points[i, 1] = p.y * height
+        eyes = self._eyes
+        vertical = (np.linalg.norm(eyes[:, 1] - eyes[:, 5], axis=1) +
+                    np.linalg.norm(eyes[:, 2] - eyes[:, 4], axis=1))
+        horizontal = np.linalg.norm(eyes[:, 0] - eyes[:, 3], axis=1)
+        return float(np.mean(vertical / (2.0 * np.maximum(horizontal, 1e-6))))
+
+    def update(self, landmarks, width, height, capture_time, now=None):
+        """
+        Jedna klatka z twarzą (landmarks) albo bez (None). capture_time - czas
+        przechwycenia (time.monotonic()). Zwraca True, gdy zakończyło się mrugnięcie.
+        """
+        now = time.monotonic() if now is None else now
+        self.frames += 1
+        if now - capture_time > self.latency_budget_s:
+            self.over_budget += 1
+
+        gap = None if self._last_time is None else capture_time - self._last_time
+        if landmarks is None or (gap is not None and gap > MAX_FRAME_GAP_S):
+            self.closed = False  # przerwa w danych - zamknięcie nie jest wiarygodne
+        elif gap is not None and gap > 0:
+            self.tracked_s += gap
+        self._last_time = capture_time if landmarks is not None else None
+        if landmarks is None:
+            return False
+
+        ear = self.ear = self.eye_aspect_ratio(landmarks, width, height)
+        if self.baseline is None:
+            self.baseline = ear
+            return False
+
+        if not self.closed:
+            if ear < self.baseline * BLINK_CLOSE_RATIO:
+                self.closed = True
+                self._closed_since = capture_time
+                return False
+            self.baseline += BASELINE_ALPHA * (ear - self.baseline)
+            return False
+
+        if ear > self.baseline * BLINK_OPEN_RATIO:
+            self.closed = False
+            if capture_time - self._closed_since <= MAX_BLINK_S:
+                self.total_blinks += 1
+                self.report_blinks += 1
+                return True
+        return False
+
+    def report_due(self, now=None):
+        now = time.monotonic() if now is None else now
+        return now - self.report_start >= BLINK_REPORT_INTERVAL_S
+
+    def blinks_per_minute(self):
+        """Mrugnięcia na minutę w bieżącym oknie; None, gdy twarz była widoczna zbyt krótko."""
+        if self.tracked_s < MIN_TRACKED_S:
+            return None
+        return 60.0 * self.report_blinks / self.tracked_s
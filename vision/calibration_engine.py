@@ -0,0 +1,244 @@
+"""
+Kalibracja monitorów w wątku roboczym.
+
+Wątek sam czyta kamerę, uruchamia FaceMesh i solvePnP, rysuje podgląd
+i skaluje go do rozmiaru etykiety - GUI dostaje gotowy QImage i tylko go
+wyświetla. Na polecenie collect(monitor) zbiera CALIBRATION_SAMPLES póz
+głowy i środków oczu; po finish() wszystkie monitory są dopasowywane
+naraz (mediana/MAD na tablicy monitory x próbki x cechy), a wynik trafia
+do `store` (np. zapis MonitorConfiguration w jednej transakcji) i do
+sygnału calibration_finished_signal.
+"""
+import queue
+import time
+import warnings
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QImage
+
+try:
+    from vision.camera_factory import open_camera_source
+    from vision.head_pose import HeadPoseEstimator
+except ImportError:  # uruchamiany bezpośrednio jako skrypt z katalogu vision/
+    from camera_factory import open_camera_source
+    from head_pose import HeadPoseEstimator
+
+# Cechy próbki: poza głowy (stopnie) i środki oczu (piksele)
+SAMPLE_FIELDS = ('yaw', 'pitch', 'roll', 'left_x', 'left_y', 'right_x', 'right_y')
+
+CALIBRATION_SAMPLES = 30      # próbek na monitor (~1 s przy 30 fps)
+CALIBRATION_TIMEOUT_S = 5.0   # dłużej bez twarzy - monitor z tym, co zebrano
+MIN_INLIERS = 8               # mniej zgodnych próbek = monitor niezkalibrowany
+MAD_SCALE = 1.4826            # MAD -> odchylenie standardowe (rozkład normalny)
+OUTLIER_MADS = 3.0            # próbka dalej niż 3 MAD w dowolnej cesze = odrzucona
+MIN_SPREAD = (0.5, 0.5, 0.5, 1.0, 1.0, 1.0, 1.0)  # dolna granica MAD (idealnie stała głowa)
+WRAPPED = (False, False, True, False, False, False, False)  # roll skacze między +180 a -180
+
+# Punkty FaceMesh wokół oczu - środek oka do podglądu i szablonu
+LEFT_EYE_POINTS = (33, 133, 160, 159, 158, 157, 173, 246)
+RIGHT_EYE_POINTS = (362, 263, 387, 386, 385, 384, 398, 466)
+
+
+def fit_monitors(samples):
+    """
+    Odporne dopasowanie wszystkich monitorów naraz.
+
+    Args:
+        samples: tablica (monitory, próbki, len(SAMPLE_FIELDS)); brakujące próbki = NaN
+
+    Returns:
+        tuple: (środki, rozrzuty, liczby zgodnych próbek) - (M, F), (M, F), (M,).
+        Środek to mediana próbek zgodnych (w granicy OUTLIER_MADS od mediany
+        wszystkich), rozrzut to ich MAD przeskalowane do odchylenia standardowego.
+        Cechy z WRAPPED (roll) liczone są modulo 360 stopni.
+    """
+    samples = np.asarray(samples, dtype=np.float64).copy()
+    floor = np.asarray(MIN_SPREAD, dtype=np.float64)
+    wrapped = np.asarray(WRAPPED)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # monitor bez próbek - wiersz NaN
+        # Kąty okresowe rozwijane wokół średniej kołowej: 179 i -179 to 2 stopnie, nie 358
+        angles = np.radians(samples[..., wrapped])
+        mean = np.degrees(np.arctan2(np.nanmean(np.sin(angles), axis=1),
+                                     np.nanmean(np.cos(angles), axis=1)))
+        samples[..., wrapped] = mean[:, None, :] + _wrap(samples[..., wrapped] - mean[:, None, :])
+
+        center = np.nanmedian(samples, axis=1)
+        deviation = np.abs(samples - center[:, None, :])
+        spread = np.maximum(np.nanmedian(deviation, axis=1) * MAD_SCALE, floor)
+        inliers = np.all(deviation <= OUTLIER_MADS * spread[:, None, :], axis=2)  # NaN -> False
+
+        kept = np.where(inliers[..., None], samples, np.nan)
+        center = np.nanmedian(kept, axis=1)
+        spread = np.nanmedian(np.abs(kept - center[:, None, :]), axis=1) * MAD_SCALE
+    center[:, wrapped] = _wrap(center[:, wrapped])
+    return center, spread, inliers.sum(axis=1)
+
+
+def _wrap(degrees):
+    """Kąt sprowadzony do [-180, 180)."""
+    return (degrees + 180.0) % 360.0 - 180.0
+
+
+class CalibrationEngine(QThread):
+    """
+    Wątek kalibracji: kamera + FaceMesh + poza głowy + podgląd poza pętlą zdarzeń Qt.
+
+    face_mesh_model - AsyncModel FaceMesh właściciela (do czasu zbudowania
+    działa tylko podgląd z kaskadą Haara); eye_cascade - opcjonalny
+    cv2.CascadeClassifier; store(fits) -> bool - zapis wyników, wołany w tym wątku.
+    """
+    preview_signal = pyqtSignal(QImage)
+    sample_signal = pyqtSignal(int, int, int)  # monitor, zebrane próbki, wymagane
+    monitor_collected_signal = pyqtSignal(int, int)  # monitor, zebrane próbki
+    calibration_finished_signal = pyqtSignal(list, bool)  # wyniki per monitor, czy zapisano
+    camera_failed_signal = pyqtSignal(str)
+
+    def __init__(self, face_mesh_model=None, eye_cascade=None, store=None, source=None,
+                 samples_per_monitor=CALIBRATION_SAMPLES, timeout_s=CALIBRATION_TIMEOUT_S, parent=None):
+        super().__init__(parent)
+        self.face_mesh_model = face_mesh_model
+        self.eye_cascade = eye_cascade
+        self.store = store
+        self.source = source
+        self.samples_per_monitor = samples_per_monitor
+        self.timeout_s = timeout_s
+        self.head_pose = HeadPoseEstimator()
+        self.preview_size = (640, 480)
+        self.running = True
+        self._commands = queue.Queue()
+        self._samples = {}  # monitor -> lista wierszy SAMPLE_FIELDS
+        self._collecting = None  # (monitor, początek zbierania)
+
+    def set_preview_size(self, width, height):
+        self.preview_size = (max(1, width), max(1, height))
+
+    def collect(self, monitor):
+        """Zacznij zbierać próbki dla monitora (użytkownik już na niego patrzy)."""
+        self._commands.put(('collect', monitor))
+
+    def finish(self):
+        """Dopasuj i zapisz wszystkie zebrane monitory; wątek kończy się po zapisie."""
+        self._commands.put(('finish', None))
+
+    def stop(self):
+        self.running = False
+        self.wait()
+
+    def detect(self, frame):
+        """(środek lewego oka, środek prawego oka, landmarki FaceMesh albo None)."""
+        h, w = frame.shape[:2]
+        face_mesh = self.face_mesh_model.get() if self.face_mesh_model is not None else None
+        if face_mesh is not None:
+            results = face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            if results.multi_face_landmarks:
+                lm = results.multi_face_landmarks[0].landmark
+
+                def eye_center(points):
+                    return (int(sum(lm[i].x for i in points) / len(points) * w),
+                            int(sum(lm[i].y for i in points) / len(points) * h))
+
+                return eye_center(LEFT_EYE_POINTS), eye_center(RIGHT_EYE_POINTS), lm
+            self.head_pose.reset()
+        if self.eye_cascade is not None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            eyes = sorted(self.eye_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=3,
+                                                            minSize=(30, 30)), key=lambda e: e[0])
+            centers = [(int(x + ew / 2), int(y + eh / 2)) for x, y, ew, eh in eyes[:2]]
+            centers += [None] * (2 - len(centers))
+            return centers[0], centers[1], None
+        return None, None, None
+
+    def _preview(self, frame, left, right, head):
+        for eye in (left, right):
+            if eye:
+                cv2.circle(frame, eye, 4, (0, 255, 0), -1)
+        if head is not None:
+            cv2.putText(frame, f"yaw:{head[0]:.1f} pitch:{head[1]:.1f}", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (200, 200, 50), 2)
+        # Skalowanie do etykiety tutaj - w GUI zostaje samo setPixmap
+        h, w = frame.shape[:2]
+        scale = min(self.preview_size[0] / w, self.preview_size[1] / h)
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+        rgb = cv2.cvtColor(cv2.resize(frame, size, interpolation=interpolation), cv2.COLOR_BGR2RGB)
+        image = QImage(rgb.data, size[0], size[1], 3 * size[0], QImage.Format_RGB888)
+        self.preview_signal.emit(image.copy())  # kopia - bufor rgb znika po powrocie
+
+    def _handle_commands(self):
+        """Zwraca True po 'finish'."""
+        while True:
+            try:
+                command, monitor = self._commands.get_nowait()
+            except queue.Empty:
+                return False
+            if command == 'finish':
+                return True
+            self._samples[monitor] = []
+            self._collecting = (monitor, time.monotonic())
+
+    def _add_sample(self, head, left, right):
+        monitor, started = self._collecting
+        rows = self._samples[monitor]
+        if head is not None and left and right:
+            rows.append(head + left + right)
+            self.sample_signal.emit(monitor, len(rows), self.samples_per_monitor)
+        if len(rows) >= self.samples_per_monitor or time.monotonic() - started >= self.timeout_s:
+            self._collecting = None
+            self.monitor_collected_signal.emit(monitor, len(rows))
+
+    def fit(self):
+        """Wyniki per monitor (słowniki, kolejność numerów monitorów); None dla nieudanych."""
+        monitors = sorted(self._samples)
+        if not monitors:
+            return []
+        size = max(1, max(len(rows) for rows in self._samples.values()))
+        samples = np.full((len(monitors), size, len(SAMPLE_FIELDS)), np.nan)
+        for row, monitor in enumerate(monitors):
+            if self._samples[monitor]:
+                samples[row, :len(self._samples[monitor])] = self._samples[monitor]
+        center, spread, inliers = fit_monitors(samples)
+
+        fits = []
+        for row, monitor in enumerate(monitors):
+            if inliers[row] < MIN_INLIERS:
+                fits.append(None)
+                continue
+            fit = {'monitor': monitor, 'samples': len(self._samples[monitor]), 'inliers': int(inliers[row])}
+            fit.update((name, float(center[row, i])) for i, name in enumerate(SAMPLE_FIELDS))
+            fit.update((f"{name}_spread", float(spread[row, i])) for i, name in enumerate(SAMPLE_FIELDS))
+            fits.append(fit)
+        return fits
+
+    def run(self):
+        try:
+            cap = open_camera_source(self.source)[0]
+        except Exception as e:
+            self.camera_failed_signal.emit(f"{type(e).__name__}: {e}")
+            return
+        try:
+            while self.running:
+                if self._handle_commands():
+                    fits = self.fit()
+                    saved = bool(self.store(fits)) if self.store is not None else False
+                    self.calibration_finished_signal.emit(fits, saved)
+                    return
+                ret, frame = cap.read()
+                if not ret or frame is None:
+                    time.sleep(0.01)
+                    continue
+
+                left, right, lm = self.detect(frame)
+                head = None
+                if lm is not None:
+                    ok, pose = self.head_pose.estimate(lm, frame.shape)
+                    head = pose if ok else None
+                if self._collecting is not None:
+                    self._add_sample(head, left, right)
+                self._preview(frame, left, right, head)
+        except Exception as e:
+            self.camera_failed_signal.emit(f"{type(e).__name__}: {e}")
+        finally:
+            cap.release()
@@ -0,0 +1,183 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import cv2
+from PyQt5.QtCore import QThread, pyqtSignal
+
+# Ostatnio działający backend i indeks kamery - kolejne uruchomienia próbują go najpierw
+CAMERA_DEVICE_CACHE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   'camera_device.json')
+
+# Kolejność prób: V4L2, DSHOW, MSMF, dowolny (tylko backendy sensowne dla platformy)
+if sys.platform.startswith('linux'):
+    BACKEND_ORDER = [('V4L2', cv2.CAP_V4L2), ('ANY', cv2.CAP_ANY)]
+elif sys.platform.startswith('win'):
+    BACKEND_ORDER = [('DSHOW', cv2.CAP_DSHOW), ('MSMF', cv2.CAP_MSMF), ('ANY', cv2.CAP_ANY)]
+else:
+    BACKEND_ORDER = [('ANY', cv2.CAP_ANY)]
+
+CAMERA_INDICES = (0, 1, 2)
+
+_open_lock = threading.Lock()
+
+
+def _load_selection(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data['backend'], int(data['index'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_selection(path, backend_name, index):
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'backend': backend_name, 'index': index}, f)
+    except OSError as e:
+        print(f"Nie można zapisać wyboru kamery: {e}")
+
+
+def _try_open(backend_name, backend_id, index):
+    cap = cv2.VideoCapture(index, backend_id)
+    if cap.isOpened() and cap.grab():
+        return cap
+    cap.release()
+    return None
+
+
+def open_camera(indices=CAMERA_INDICES, cache_path=CAMERA_DEVICE_CACHE):
+    """
+    Otwiera kamerę dokładnie raz.
+
+    Najpierw zapamiętany (backend, indeks), potem kolejne backendy z BACKEND_ORDER
+    dla kolejnych indeksów. Zwycięska kombinacja jest zapisywana w cache_path.
+
+    Returns:
+        tuple: (cap, backend_name, index)
+
+    Raises:
+        RuntimeError: Żadna kombinacja nie dała działającej kamery
+    """
+    with _open_lock:
+        backends = dict(BACKEND_ORDER)
+        candidates = []
+        selection = _load_selection(cache_path)
+        if selection and selection[0] in backends:
+            candidates.append(selection)
+        candidates.extend((name, index) for index in indices for name, _ in BACKEND_ORDER
+                          if (name, index) != selection)
+
+        for backend_name, index in candidates:
+            cap = _try_open(backend_name, backends[backend_name], index)
+            if cap is not None:
+                if (backend_name, index) != selection:
+                    _save_selection(cache_path, backend_name, index)
+                print(f"Kamera otwarta: {backend_name}, indeks {index}")
+                return cap, backend_name, index
+
+    raise RuntimeError("Camera not accessible")
+
+
+class VideoFileSource:
+    """
+    Plik wideo udający kamerę: read()/grab() oddają klatki w tempie nagrania
+    (czas przechwycenia jak z kamery), set() nic nie zmienia.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 1.0 / 30
+        self._next_frame = None
+
+    def _pace(self):
+        now = time.monotonic()
+        if self._next_frame is None:
+            self._next_frame = now
+        elif now < self._next_frame:
+            time.sleep(self._next_frame - now)
+        self._next_frame = max(self._next_frame + self.frame_interval, time.monotonic() - self.frame_interval)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        self._pace()
+        return self.cap.read()
+
+    def grab(self):
+        self._pace()
+        return self.cap.grab()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return False
+
+    def getBackendName(self):
+        return 'FILE'
+
+    def release(self):
+        self.cap.release()
+
+
+def open_camera_source(source=None):
+    """
+    Otwiera źródło z rejestru kamer (vision/camera_registry.py): None - open_camera()
+    (zapamiętany wybór), int - konkretny indeks urządzenia, str - plik wideo.
+
+    Returns:
+        tuple: (cap, backend_name, index albo ścieżka)
+
+    Raises:
+        RuntimeError: Źródła nie da się otworzyć
+    """
+    if source is None:
+        return open_camera()
+    if isinstance(source, str):
+        cap = VideoFileSource(source)
+        if not cap.isOpened():
+            raise RuntimeError(f"Cannot open video file {source}")
+        return cap, 'FILE', source
+    with _open_lock:
+        for backend_name, backend_id in BACKEND_ORDER:
+            cap = _try_open(backend_name, backend_id, source)
+            if cap is not None:
+                print(f"Kamera otwarta: {backend_name}, indeks {source}")
+                return cap, backend_name, source
+    raise RuntimeError(f"Camera {source} not accessible")
+
+
+class CameraOpenThread(QThread):
+    """
+    Otwiera kamerę w tle, żeby start aplikacji nie czekał na sterownik.
+
+    `factory(cap, backend_name, index)` (opcjonalny) buduje na otwartej kamerze
+    obiekt docelowy, np. EyeTracker - również poza wątkiem GUI.
+    `source` - źródło z rejestru kamer (None = open_camera()).
+    """
+    camera_opened_signal = pyqtSignal(object)  # cap albo wynik factory
+    camera_failed_signal = pyqtSignal(str)
+
+    def __init__(self, factory=None, source=None, parent=None):
+        super().__init__(parent)
+        self.factory = factory
+        self.source = source
+
+    def run(self):
+        cap = None
+        try:
+            cap, backend_name, index = open_camera_source(self.source)
+            result = self.factory(cap, backend_name, index) if self.factory else cap
+        except Exception as e:
+            if cap is not None and self.factory is not None:
+                cap.release()
+            self.camera_failed_signal.emit(f"{type(e).__name__}: {e}")
+            return
+        self.camera_opened_signal.emit(result)
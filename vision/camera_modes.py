@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+
+import cv2
+
+# Plik z wynikami sondowania kamer (per urządzenie) - sondowanie trwa kilka sekund
+CAMERA_MODES_CACHE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  'camera_modes.json')
+
+# Minimalne wymagania konsumentów: (szerokość, wysokość, fps)
+CONSUMER_REQUIREMENTS = {
+    'gaze': (320, 240, 10),
+    'pulse': (640, 480, 30),
+    'posture': (320, 240, 10),  # Pose model_complexity=0 i tak skaluje do 256x256
+    'blink': (320, 240, 15),  # mrugnięcie trwa ~100-300 ms - potrzeba kilku klatek
+    'palming': (320, 240, 10),  # tylko statystyki wycinka oczu
+}
+
+CANDIDATE_RESOLUTIONS = [(320, 240), (640, 480), (800, 600), (1280, 720), (1920, 1080)]
+CANDIDATE_FPS = [10, 15, 30]
+CANDIDATE_FOURCCS = ['MJPG', 'YUYV']
+
+# Powyżej tej przepustowości (piksele/s) wolimy MJPEG (mniej danych po USB),
+# poniżej YUYV (brak dekodowania JPEG)
+MJPEG_PIXEL_RATE = 640 * 480 * 15
+
+_cache_lock = threading.Lock()
+
+
+def _fourcc_code(name):
+    return cv2.VideoWriter_fourcc(*name)
+
+
+def _fourcc_name(code):
+    code = int(code)
+    return ''.join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 ')
+
+
+def _load_cache(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(path, cache):
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        print(f"Nie można zapisać trybów kamery: {e}")
+
+
+def probe_modes(cap):
+    """Sprawdza, które (format, rozdzielczość, fps) kamera faktycznie przyjmuje."""
+    modes = []
+    seen = set()
+    for fourcc in CANDIDATE_FOURCCS:
+        cap.set(cv2.CAP_PROP_FOURCC, _fourcc_code(fourcc))
+        if _fourcc_name(cap.get(cv2.CAP_PROP_FOURCC)) != fourcc:
+            continue  # format nieobsługiwany (albo backend go nie raportuje)
+        for width, height in CANDIDATE_RESOLUTIONS:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            if (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))) != (width, height):
+                continue
+            for fps in CANDIDATE_FPS:
+                cap.set(cv2.CAP_PROP_FPS, fps)
+                actual_fps = cap.get(cv2.CAP_PROP_FPS)
+                key = (fourcc, width, height, int(round(actual_fps)))
+                if actual_fps <= 0 or key in seen:
+                    continue
+                seen.add(key)
+                modes.append({'fourcc': fourcc, 'width': width, 'height': height,
+                              'fps': int(round(actual_fps))})
+    return modes
+
+
+def required_mode(consumers):
+    """Najmniejsze (w, h, fps) spełniające wszystkich aktywnych konsumentów."""
+    requirements = [CONSUMER_REQUIREMENTS[c] for c in consumers if c in CONSUMER_REQUIREMENTS]
+    if not requirements:
+        requirements = [CONSUMER_REQUIREMENTS['gaze']]
+    return (max(r[0] for r in requirements),
+            max(r[1] for r in requirements),
+            max(r[2] for r in requirements))
+
+
+def choose_mode(modes, consumers):
+    """Najtańszy obsługiwany tryb spełniający wymagania; None, gdy żaden nie pasuje."""
+    width, height, fps = required_mode(consumers)
+    matching = [m for m in modes if m['width'] >= width and m['height'] >= height and m['fps'] >= fps]
+    if not matching:
+        return None
+
+    def cost(mode):
+        pixel_rate = mode['width'] * mode['height'] * mode['fps']
+        preferred = 'MJPG' if pixel_rate > MJPEG_PIXEL_RATE else 'YUYV'
+        return (mode['width'] * mode['height'], mode['fps'], mode['fourcc'] != preferred)
+
+    return min(matching, key=cost)
+
+
+def apply_mode(cap, mode):
+    cap.set(cv2.CAP_PROP_FOURCC, _fourcc_code(mode['fourcc']))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, mode['width'])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, mode['height'])
+    cap.set(cv2.CAP_PROP_FPS, mode['fps'])
+
+
+def negotiate_camera_mode(cap, consumers, device_key, cache_path=CAMERA_MODES_CACHE):
+    """
+    Ustawia najtańszy tryb kamery wystarczający dla `consumers` (np. ('gaze',)).
+
+    Obsługiwane tryby są sondowane raz na urządzenie i zapisywane w cache_path.
+    Gdy sondowanie nic nie da (backend nie raportuje trybów), ustawiamy samo
+    wymagane (w, h, fps) i zostawiamy resztę sterownikowi.
+
+    Returns:
+        dict: Zastosowany tryb (fourcc może być None)
+    """
+    with _cache_lock:
+        cache = _load_cache(cache_path)
+        modes = cache.get(device_key)
+        if modes is None:
+            print(f"Sondowanie trybów kamery {device_key}...")
+            modes = probe_modes(cap)
+            cache[device_key] = modes
+            _save_cache(cache_path, cache)
+
+    mode = choose_mode(modes, consumers)
+    if mode is None:
+        width, height, fps = required_mode(consumers)
+        mode = {'fourcc': None, 'width': width, 'height': height, 'fps': fps}
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        cap.set(cv2.CAP_PROP_FPS, fps)
+    else:
+        apply_mode(cap, mode)
+
+    print(f"Kamera {device_key}: {mode['width']}x{mode['height']}@{mode['fps']} "
+          f"{mode['fourcc'] or ''} dla {', '.join(consumers)}")
+    return mode
+
+
+def device_key(cap, index):
+    """Klucz urządzenia w cache: backend + indeks."""
+    try:
+        backend = cap.getBackendName()
+    except Exception:
+        backend = 'unknown'
+    return f"{backend}:{index}"
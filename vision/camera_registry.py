@@ -0,0 +1,297 @@
+"""
+Rejestr kamer: który monitor (wzrok, tętno, postawa) korzysta z którego źródła.
+
+Źródło to indeks urządzenia, ścieżka pliku wideo albo None (open_camera() -
+zapamiętana kamera). Wzrok działa w procesie aplikacji (EyeTracker i jego
+skrzynka klatek); tętno i postawa na tym samym źródle dzielą tę skrzynkę.
+Monitory przypisane do innego źródła działają w osobnym procesie na każde
+źródło (przechwytywanie + inferencja), więc kamery nie czekają na siebie
+i obciążenie rozkłada się na rdzenie.
+
+Procesy odsyłają tylko wyniki (landmarki, średnie ROI), oznaczone czasem
+przechwycenia z time.monotonic() - zegar wspólny dla wszystkich procesów.
+CameraHub łączy je w kolejności czasu przechwycenia i przekazuje monitorom.
+
+Przykładowy camera_registry.json (kamera laptopa - twarz, zewnętrzna - sylwetka):
+    {"gaze": 0, "pulse": 0, "posture": 1}
+"""
+import heapq
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import time
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import QThread
+
+MONITORS = ('gaze', 'pulse', 'posture')
+REMOTE_MONITORS = ('pulse', 'posture')  # wzrok zawsze w procesie aplikacji
+
+CAMERA_REGISTRY_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    'camera_registry.json')
+
+# Odstęp próbek w procesie kamery (s) - jak PulseMonitorWorker (20 fps) i PostureWorker (1 Hz)
+MONITOR_INTERVALS_S = {'pulse': 1.0 / 20, 'posture': 1.0}
+IDLE_GRAB_INTERVAL_S = 0.25
+REORDER_DELAY_S = 0.15  # wyniki z różnych procesów czekają tyle na spóźnione starsze
+RESULT_QUEUE_SIZE = 256
+
+
+class CameraRegistry:
+    """Przypisanie monitor -> źródło (None, indeks urządzenia albo ścieżka pliku)."""
+
+    def __init__(self, bindings=None):
+        self.bindings = {monitor: None for monitor in MONITORS}
+        for monitor, source in (bindings or {}).items():
+            if monitor not in self.bindings:
+                raise ValueError(f"Nieznany monitor {monitor!r}")
+            if source is not None and not isinstance(source, (int, str)):
+                raise ValueError(f"Nieprawidłowe źródło {source!r} dla {monitor}")
+            self.bindings[monitor] = source
+
+    @classmethod
+    def load(cls, path=CAMERA_REGISTRY_FILE):
+        """Rejestr z pliku JSON; brak pliku albo błąd = wszystko na domyślnej kamerze."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls(json.load(f))
+        except OSError:
+            return cls()
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"Nieprawidłowy rejestr kamer {path}: {e} - wszystkie monitory na domyślnej kamerze")
+            return cls()
+
+    def save(self, path=CAMERA_REGISTRY_FILE):
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.bindings, f, indent=2)
+        except OSError as e:
+            print(f"Nie można zapisać rejestru kamer: {e}")
+
+    def source_for(self, monitor):
+        return self.bindings[monitor]
+
+    def is_remote(self, monitor):
+        """Monitor na innym źródle niż wzrok - działa w osobnym procesie."""
+        return monitor in REMOTE_MONITORS and self.bindings[monitor] != self.bindings['gaze']
+
+    def remote_sources(self):
+        """{źródło: monitory} dla procesów kamer (bez źródła wzroku)."""
+        sources = {}
+        for monitor in REMOTE_MONITORS:
+            if self.is_remote(monitor):
+                sources.setdefault(self.bindings[monitor], []).append(monitor)
+        return {source: tuple(monitors) for source, monitors in sources.items()}
+
+
+def _pose_array(pose_landmarks):
+    if pose_landmarks is None:
+        return None
+    return np.array([(p.x, p.y, p.z, p.visibility) for p in pose_landmarks.landmark], dtype=np.float32)
+
+
+def _put_latest(results, message):
+    """Wynik do kolejki; gdy aplikacja nie nadąża, najstarszy wynik przepada (nie blokujemy kamery)."""
+    try:
+        results.put_nowait(message)
+    except queue_module.Full:
+        try:
+            results.get_nowait()
+        except queue_module.Empty:
+            pass
+        try:
+            results.put_nowait(message)
+        except queue_module.Full:
+            pass
+
+
+def camera_process_main(source, monitors, results, active, stop):
+    """
+    Proces jednej kamery: przechwytywanie i inferencja dla `monitors`.
+    active[monitor] / stop - multiprocessing.Event sterowane przez CameraHub.
+    Wyniki: (monitor, czas przechwycenia, szerokość, wysokość, dane).
+    """
+    from vision.camera_factory import open_camera_source
+    from vision.camera_modes import negotiate_camera_mode, device_key
+
+    try:
+        cap, backend_name, index = open_camera_source(source)
+    except Exception as e:
+        results.put(('error', time.monotonic(), 0, 0, f"{type(e).__name__}: {e}"))
+        return
+    if backend_name != 'FILE':
+        negotiate_camera_mode(cap, monitors, device_key(cap, index))
+
+    pulse = pose_model = None
+    if 'pulse' in monitors:
+        from vision.pulse_monitor import HeartRateMonitor
+        pulse = HeartRateMonitor(own_camera=False)
+    if 'posture' in monitors:
+        from vision.model_loader import pose_async
+        # Jak PostureTracker: najlżejszy Pose
+        pose_model = pose_async(model_complexity=0, min_detection_confidence=0.7, min_tracking_confidence=0.7)
+
+    next_due = dict.fromkeys(monitors, 0.0)
+    was_active = set()
+    try:
+        while not stop.is_set():
+            current = {monitor for monitor in monitors if active[monitor].is_set()}
+            if not current:
+                cap.grab()
+                time.sleep(IDLE_GRAB_INTERVAL_S)
+                was_active = current
+                continue
+            if pulse is not None and 'pulse' in current - was_active:
+                pulse.reset(now=time.monotonic())  # nowa przerwa - ROI szukany od nowa
+            was_active = current
+
+            ret, frame = cap.read()
+            capture_time = time.monotonic()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            height, width = frame.shape[:2]
+
+            due = [monitor for monitor in current if capture_time >= next_due[monitor]]
+            for monitor in due:
+                next_due[monitor] = capture_time + MONITOR_INTERVALS_S[monitor]
+
+            if 'pulse' in due:
+                sample = pulse.roi_sample(frame)
+                center, mean = sample if sample is not None else (None, None)
+                _put_latest(results, ('pulse', capture_time, width, height,
+                                      (None if center is None else tuple(center),
+                                       None if mean is None else np.asarray(mean, dtype=np.float32))))
+            if 'posture' in due:
+                pose = pose_model.get()
+                if pose is not None:
+                    landmarks = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).pose_landmarks
+                    _put_latest(results, ('posture', capture_time, width, height, _pose_array(landmarks)))
+    finally:
+        cap.release()
+        if pulse is not None:
+            pulse.release()
+        if pose_model is not None:
+            pose_model.close()
+
+
+class CameraProcess:
+    """Uchwyt procesu jednej kamery (start/stop, aktywność monitorów)."""
+
+    def __init__(self, context, source, monitors, results):
+        self.source = source
+        self.monitors = monitors
+        self.active = {monitor: context.Event() for monitor in monitors}
+        self.stop_event = context.Event()
+        self.process = context.Process(target=camera_process_main,
+                                       args=(source, monitors, results, self.active, self.stop_event),
+                                       name=f"camera-{source}", daemon=True)
+        self.reported_dead = False
+
+    def start(self):
+        self.process.start()
+
+    def set_active(self, monitor, active):
+        if active:
+            self.active[monitor].set()
+        else:
+            self.active[monitor].clear()
+
+    def stop(self, timeout=3.0):
+        self.stop_event.set()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1.0)
+
+
+class CameraHub(QThread):
+    """
+    Procesy kamer z rejestru i łączenie ich wyników.
+
+    Wyniki z kolejki trafiają do kopca po czasie przechwycenia i są
+    przekazywane dopiero po REORDER_DELAY_S - odbiorcy dostają je w kolejności
+    czasu, także gdy procesy odsyłają je w różnym tempie. Odbiorca
+    (connect_monitor) jest wołany w wątku huba - powinien tylko kolejkować.
+    """
+
+    def __init__(self, sources, reorder_delay_s=REORDER_DELAY_S, parent=None):
+        super().__init__(parent)
+        self.reorder_delay_s = reorder_delay_s
+        context = multiprocessing.get_context('spawn')
+        self.results = context.Queue(RESULT_QUEUE_SIZE)
+        self.processes = [CameraProcess(context, source, monitors, self.results)
+                          for source, monitors in sources.items()]
+        self._by_monitor = {monitor: process for process in self.processes for monitor in process.monitors}
+        self._handlers = {}
+        self._pending = []  # kopiec (czas, numer, wiadomość)
+        self._counter = 0
+        self.delivered = 0
+        self.out_of_order = 0  # wyniki starsze niż już przekazane (spóźnione ponad REORDER_DELAY_S)
+        self._last_delivered_time = 0.0
+        self.running = True
+
+    def monitors(self):
+        return tuple(self._by_monitor)
+
+    def connect_monitor(self, monitor, handler):
+        """handler(czas, szerokość, wysokość, dane) dla wyników monitora."""
+        self._handlers[monitor] = handler
+
+    def set_active(self, monitor, active):
+        process = self._by_monitor.get(monitor)
+        if process is not None:
+            process.set_active(monitor, active)
+
+    def _deliver_ready(self, now):
+        while self._pending and self._pending[0][0] <= now - self.reorder_delay_s:
+            capture_time, _counter, message = heapq.heappop(self._pending)
+            if capture_time < self._last_delivered_time:
+                self.out_of_order += 1
+            self._last_delivered_time = max(self._last_delivered_time, capture_time)
+            handler = self._handlers.get(message[0])
+            if handler is not None:
+                try:
+                    handler(*message[1:])
+                except Exception as e:
+                    print(f"CameraHub: błąd obsługi wyniku {message[0]}: {e}")
+            self.delivered += 1
+
+    def _check_processes(self):
+        for process in self.processes:
+            if not process.reported_dead and not process.process.is_alive():
+                process.reported_dead = True
+                print(f"CameraHub: proces kamery {process.source} zakończył się "
+                      f"(kod {process.process.exitcode}) - {', '.join(process.monitors)} wyłączone")
+
+    def run(self):
+        for process in self.processes:
+            process.start()
+        last_check = time.monotonic()
+        while self.running:
+            try:
+                message = self.results.get(timeout=0.05)
+            except queue_module.Empty:
+                message = None
+            if message is not None:
+                if message[0] == 'error':
+                    print(f"CameraHub: {message[4]}")
+                else:
+                    self._counter += 1
+                    heapq.heappush(self._pending, (message[1], self._counter, message))
+
+            now = time.monotonic()
+            self._deliver_ready(now)
+            if now - last_check >= 1.0:
+                last_check = now
+                self._check_processes()
+
+    def stop(self):
+        self.running = False
+        self.wait()
+        for process in self.processes:
+            process.stop()
+        print(f"CameraHub: zatrzymano {len(self.processes)} proces(y) kamer, wyniki: {self.delivered}, "
+              f"poza kolejnością: {self.out_of_order}")
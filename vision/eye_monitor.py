@@ -1,45 +1,138 @@
 import cv2
-import mediapipe as mp
-import numpy as np
 import time
-import math
 from PyQt5.QtCore import QThread, pyqtSignal
 
-mp_face_mesh = mp.solutions.face_mesh
+from vision.angle_filter import OneEuroAngleFilter
+from vision.head_pose import HeadPoseEstimator
+from vision.presence_gate import PresenceGate, AWAY, STATIC
+from vision.frame_mailbox import LatestFrameCapture
+from vision.camera_modes import negotiate_camera_mode, device_key
+from vision.camera_factory import open_camera
+from vision.model_loader import face_mesh_async
+from vision.blink_detector import BlinkDetector
+from vision.palming_detector import PalmingDetector
+
+# Histereza patrzenia w ekran (stopnie) i minimalny czas utrzymania nowego stanu
+GAZE_ENTER_DEG = 8.0    # |yaw| i |pitch| poniżej -> zaczyna patrzeć
+GAZE_EXIT_DEG = 12.0    # |yaw| lub |pitch| powyżej -> przestaje patrzeć
+GAZE_MIN_DWELL_S = 0.4
+
+
+class GazeStateMachine:
+    """
+    Stan patrzenia w ekran z histerezą (osobne progi wejścia/wyjścia)
+    i minimalnym czasem utrzymania, żeby szum na granicy progu nie
+    przełączał stanu co klatkę.
+    """
+
+    def __init__(self, enter_deg=GAZE_ENTER_DEG, exit_deg=GAZE_EXIT_DEG, min_dwell_s=GAZE_MIN_DWELL_S):
+        self.enter_deg = enter_deg
+        self.exit_deg = exit_deg
+        self.min_dwell_s = min_dwell_s
+        self.reset()
+
+    def reset(self):
+        self.state = None  # None = jeszcze nieznany
+        self._candidate = None
+        self._candidate_since = 0.0
+
+    def update(self, yaw, pitch, now=None):
+        """Przetwarza próbkę kątów. Zwraca True, jeśli stan się zmienił."""
+        now = time.monotonic() if now is None else now
+        inside_enter = abs(yaw) < self.enter_deg and abs(pitch) < self.enter_deg
+        outside_exit = abs(yaw) > self.exit_deg or abs(pitch) > self.exit_deg
+
+        if self.state is None:
+            self.state = inside_enter
+            return True
+
+        # Patrzący zostaje "patrzącym" aż przekroczy próg wyjścia, i odwrotnie
+        target = (not outside_exit) if self.state else inside_enter
+        if target == self.state:
+            self._candidate = None
+            return False
+
+        if self._candidate != target:
+            self._candidate = target
+            self._candidate_since = now
+        if now - self._candidate_since >= self.min_dwell_s:
+            self.state = target
+            self._candidate = None
+            return True
+        return False
+
+    def set_state(self, looking):
+        """Wymusza stan bez histerezy (np. brak użytkownika = nie patrzy). Zwraca True przy zmianie."""
+        changed = self.state != looking
+        self.state = looking
+        self._candidate = None
+        return changed
 
 
 class EyeTracker:
-    def __init__(self, rest_threshold=10):
-        self.cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-        if not self.cap.isOpened():
-            raise RuntimeError("Camera not accessible")
-
-        self.face_mesh = mp_face_mesh.FaceMesh(
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.6,
-            min_tracking_confidence=0.6
-        )
+    def __init__(self, rest_threshold=10, cap=None, camera_index=0, inference=None,
+                 own_camera=True, load_model=True):
+        """
+        `cap` - już otwarta kamera (np. z CameraOpenThread); None otwiera ją przez open_camera().
+        `inference` - wspólna inferencja (SharedInference) zamiast własnego FaceMesh.
+        own_camera=False, load_model=False - sama logika (gaze_from_landmarks), np. przy
+        odtwarzaniu nagrania (vision/landmark_recorder.py).
+        """
+        self.cap = None
+        self.frames = None
+        if own_camera:
+            if cap is None:
+                cap, _backend, camera_index = open_camera()
+            self.cap = cap
+            if not self.cap.isOpened():
+                raise RuntimeError("Camera not accessible")
+
+            # Do śledzenia wzroku wystarczy mały tryb (zamiast domyślnego np. 1080p)
+            self.camera_key = device_key(self.cap, camera_index)
+            self.camera_mode = negotiate_camera_mode(self.cap, ('gaze',), self.camera_key)
+            self.frames = LatestFrameCapture(self.cap)
+        self.inference = inference
+        if inference is not None:
+            self.face_mesh_model = inference.model  # zamyka właściciel SharedInference
+        elif not load_model:
+            self.face_mesh_model = None
+        else:
+            # Graf FaceMesh budowany w tle - gotowość: self.face_mesh_model.ready
+            self.face_mesh_model = face_mesh_async(
+                max_num_faces=1,
+                refine_landmarks=True,
+                min_detection_confidence=0.6,
+                min_tracking_confidence=0.6
+            )
         self.last_focus_time = time.time()
         self.rest_threshold = rest_threshold
+        self.gaze_state = GazeStateMachine()
+        self.head_pose = HeadPoseEstimator()
+        self.angle_filter = OneEuroAngleFilter(channels=2)  # yaw, pitch
+        self.gaze_confidence = 0.0
+        self.presence_gate = PresenceGate()
+        self.user_present = True
+        self._last_gaze = None
+        # Mrugnięcia z tych samych landmarków (bez dodatkowej inferencji)
+        self.blink_detector = BlinkDetector()
+        self.blink_tracking = False  # True: każda klatka przez FaceMesh (bez skrótu STATIC)
+        # Palming bez inferencji - region oczu z ostatniego przebiegu FaceMesh
+        self.palming_detector = PalmingDetector()
+        self.recorder = None  # LandmarkRecorder - nagrywanie landmarków i kątów
         self.h = 0
         self.w = 0
 
-    def get_head_angles(self, landmarks):
-        """Oblicz yaw i pitch (obrót i pochylenie głowy)."""
-        nose = np.array([landmarks[1].x, landmarks[1].y, landmarks[1].z])
-        left_eye = np.array([landmarks[33].x, landmarks[33].y, landmarks[33].z])
-        right_eye = np.array([landmarks[263].x, landmarks[263].y, landmarks[263].z])
-        forehead = np.array([landmarks[10].x, landmarks[10].y, landmarks[10].z])
-        chin = np.array([landmarks[152].x, landmarks[152].y, landmarks[152].z])
-
-        # Wektory osi twarzy
-        horizontal = right_eye - left_eye
-        vertical = chin - forehead
-
-        yaw = math.degrees(math.atan2(horizontal[1], horizontal[0]))  # obrót w bok
-        pitch = math.degrees(math.atan2(vertical[2], vertical[1]))    # pochylenie góra/dół
+    def set_camera_consumers(self, consumers):
+        """Zmienia tryb kamery pod aktywnych konsumentów, np. ('gaze', 'pulse') w trakcie przerwy."""
+        def configure(cap):
+            self.camera_mode = negotiate_camera_mode(cap, consumers, self.camera_key)
+        self.frames.reconfigure(configure)
 
+    def get_head_angles(self, landmarks):
+        """Oblicz yaw i pitch (obrót i pochylenie głowy) - ta sama estymacja co w kalibracji."""
+        ok, (yaw, pitch, _roll) = self.head_pose.estimate(landmarks, (self.h, self.w))
+        if not ok:
+            return None
         return yaw, pitch
 
     def draw_face_mesh(self, frame, landmarks):
@@ -51,29 +144,68 @@ class EyeTracker:
         return frame
 
     def get_gaze(self, show_frame=False):
-        ret, frame = self.cap.read()
+        ret, frame, capture_time = self.frames.read()
         if not ret:
             return None
+        try:
+            return self._gaze_from_frame(frame, show_frame, capture_time)
+        finally:
+            self.frames.mark_decision(capture_time)
 
-        self.h, self.w, _ = frame.shape
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(frame_rgb)
+    def get_palming(self):
+        """
+        Palming bez FaceMesh: (zakryte, czy zmiana stanu, czas przechwycenia)
+        albo None, gdy brak klatki.
+        """
+        ret, frame, capture_time = self.frames.read()
+        if not ret:
+            return None
+        try:
+            changed = self.palming_detector.update(frame, capture_time)
+            return self.palming_detector.covered, changed, capture_time
+        finally:
+            self.frames.mark_decision(capture_time)
 
-        looking_at_screen, yaw, pitch = None, None, None
+    def _gaze_from_frame(self, frame, show_frame, capture_time):
+        self.h, self.w, _ = frame.shape
 
-        if results.multi_face_landmarks:
-            face_landmarks = results.multi_face_landmarks[0].landmark
+        # Tani test obecności - bez twarzy / bez ruchu nie uruchamiamy FaceMesh
+        presence = self.presence_gate.check(frame)
+        self.user_present = presence != AWAY
+        if presence == AWAY:
+            if self.blink_tracking:
+                self.blink_detector.update(None, self.w, self.h, capture_time)
+            self.gaze_state.set_state(False)
+            self.angle_filter.reset()
+            self.head_pose.reset()
+            self._last_gaze = None
+            return False, 0.0, 0.0
+        if presence == STATIC and self._last_gaze is not None and not show_frame and not self.blink_tracking:
+            _, yaw, pitch = self._last_gaze
+            self.gaze_state.update(yaw, pitch)  # odliczanie histerezy biegnie dalej
+            self._last_gaze = (self.gaze_state.state, yaw, pitch)
+            return self._last_gaze
 
-            yaw, pitch = self.get_head_angles(face_landmarks)
+        face_mesh = self.face_mesh_model.get()
+        if face_mesh is None:
+            return None  # model jeszcze się rozgrzewa
+        if self.inference is not None:
+            results = self.inference.process(frame)  # wynik wspólny z tętnem/postawą
+        else:
+            results = face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
 
-            # Czy patrzy w ekran (prosty próg)
-            looking_at_screen = abs(yaw) < 10 and abs(pitch) < 10
-            if looking_at_screen:
-                self.last_focus_time = time.time()
-            else:
-                if time.time() - self.last_focus_time > self.rest_threshold:
-                    looking_at_screen = False
+        face_landmarks = results.multi_face_landmarks[0].landmark if results.multi_face_landmarks else None
+        if face_landmarks is not None:
+            # Odniesienie palmingu tylko z klatek z twarzą i otwartymi oczami
+            ear = self.blink_detector.eye_aspect_ratio(face_landmarks, self.w, self.h)
+            self.palming_detector.observe_open_eyes(frame, face_landmarks, ear)
+        gaze = self.gaze_from_landmarks(face_landmarks, capture_time)
+        if self.recorder is not None:
+            self.recorder.record_gaze(capture_time, self.w, self.h, face_landmarks,
+                                      gaze[1:] if gaze else None)
 
+        if gaze is not None:
+            looking_at_screen, yaw, pitch = gaze
             if show_frame:
                 frame = self.draw_face_mesh(frame, face_landmarks)
                 state = "Patrzysz 👀" if looking_at_screen else "Nie patrzysz 👁️"
@@ -87,42 +219,200 @@ class EyeTracker:
             cv2.imshow("Face Angle Mesh Tracker", frame)
             cv2.waitKey(1)
 
-        if looking_at_screen is not None:
-            return looking_at_screen, yaw, pitch
-        return None
+        self._last_gaze = gaze
+        return gaze
+
+    def gaze_from_landmarks(self, face_landmarks, capture_time, now=None):
+        """
+        Logika wzroku i mrugnięć dla landmarków jednej klatki (None = brak twarzy),
+        bez inferencji - także przy odtwarzaniu nagrania (now = czas z nagrania).
+        Zwraca (looking, yaw, pitch) albo None.
+        """
+        if self.blink_tracking:
+            self.blink_detector.update(face_landmarks, self.w, self.h, capture_time, now=now)
+        if face_landmarks is None:
+            return None
+        self.palming_detector.set_eye_region(face_landmarks)
+
+        angles = self.get_head_angles(face_landmarks)
+        if angles is None:
+            return None
+
+        # Wygładzone kąty (One-Euro) zamiast surowych, zaszumionych pomiarów
+        self.angle_filter.update(*angles, now=now)
+        yaw, pitch = self.angle_filter.value[0], self.angle_filter.value[1]
+        self.gaze_confidence = self.angle_filter.confidence(now=now)
+
+        # Czy patrzy w ekran (histereza + minimalny czas utrzymania stanu)
+        self.gaze_state.update(yaw, pitch, now=now)
+        looking_at_screen = self.gaze_state.state
+        if looking_at_screen:
+            self.last_focus_time = time.time()
+        return looking_at_screen, yaw, pitch
 
     def release(self):
-        self.cap.release()
+        if self.frames is not None:
+            self.frames.stop()
+        if self.inference is None and self.face_mesh_model is not None:
+            self.face_mesh_model.close()
+        if self.cap is not None:
+            self.cap.release()
         cv2.destroyAllWindows()
 
 
 class EyeMonitorWorker(QThread):
     """Wątek roboczy, który używa EyeTracker w tle (dla PyQt GUI)."""
+    # Emitowany tylko przy ZMIANIE stanu patrzenia (looking, yaw, pitch)
     gaze_detected_signal = pyqtSignal(bool, float, float)
+    # Kąty głowy z niską częstotliwością (telemetria, co telemetry_interval_s)
+    gaze_telemetry_signal = pyqtSignal(float, float)
+    # Obecność użytkownika przy biurku (tylko przy zmianie)
+    presence_signal = pyqtSignal(bool)
+    # Model FaceMesh zbudowany (True) albo jego budowa się nie powiodła (False) - raz
+    models_ready_signal = pyqtSignal(bool)
+    # Mrugnięcia na minutę, liczba mrugnięć, czas z widoczną twarzą (s) - co BLINK_REPORT_INTERVAL_S
+    blink_rate_signal = pyqtSignal(float, int, float)
+    # Palming: oczy zakryte (True/False) i czas przechwycenia pierwszej klatki tego stanu
+    # (time.monotonic()) - przy zmianie i raz na początku ćwiczenia
+    palming_signal = pyqtSignal(bool, float)
+
+    STATE_WARMING = "warming"
+    STATE_READY = "ready"
+    STATE_FAILED = "failed"
 
     def __init__(self, tracker_instance, parent=None):
         super().__init__(parent)
         self.running = True
+        self.state = self.STATE_WARMING
         self.is_tracking_enabled = False  # NOWA FLAGA
+        self.is_blink_tracking_enabled = False  # mrugnięcia z prędkością kamery
         self.tracker = tracker_instance
-        self.check_interval_ms = 100
+        self.check_interval_ms = 250  # 4 Hz wystarcza przy wygładzonych kątach
+        self.palming_interval_ms = 100  # statystyki wycinka - koszt pomijalny
+        self.is_palming_enabled = False
+        self._palming_reset_requested = False
+        self._last_palming_state = None
+        self.telemetry_interval_s = 1.0
+        self._last_emitted_state = None
+        self._last_presence = None
+        self._last_telemetry_time = 0.0
+        self._reset_requested = False
+        self._blink_reset_requested = False
+
+    def set_blink_tracking(self, enabled: bool):
+        """Liczenie mrugnięć: każda klatka kamery przez FaceMesh (ten sam przebieg co wzrok)."""
+        if enabled and not self.is_blink_tracking_enabled:
+            self._blink_reset_requested = True
+        self.is_blink_tracking_enabled = enabled
+        print(f"EyeMonitorWorker: Blink tracking set to {enabled}")
+
+    def set_palming_mode(self, enabled: bool):
+        """Palming: zamiast FaceMesh tylko statystyki regionu oczu (działa też bez modelu)."""
+        if enabled and not self.is_palming_enabled:
+            self._palming_reset_requested = True
+        self.is_palming_enabled = enabled
+        print(f"EyeMonitorWorker: Palming mode set to {enabled}")
 
     def set_tracking_enabled(self, enabled: bool):
         """Ustawia, czy wątek ma aktywnie monitorować wzrok i emitować sygnały."""
+        if enabled and not self.is_tracking_enabled:
+            self._reset_requested = True  # nowa przerwa -> pierwszy stan zawsze emitowany
         self.is_tracking_enabled = enabled
         print(f"EyeMonitorWorker: Tracking enabled set to {enabled}")
 
+    def _check_models(self):
+        """Kończy stan "warming", gdy graf FaceMesh jest gotowy (lub jego budowa padła)."""
+        model = self.tracker.face_mesh_model
+        if not model.future.done():
+            return
+        self.state = self.STATE_READY if model.ready else self.STATE_FAILED
+        print(f"EyeMonitorWorker: model FaceMesh -> {self.state}")
+        self.models_ready_signal.emit(model.ready)
+
+    def _process_gaze(self):
+        if self._reset_requested:
+            self._reset_requested = False
+            self._last_emitted_state = None
+            self._last_presence = None
+            self.tracker.gaze_state.reset()
+            self.tracker.angle_filter.reset()
+            self.tracker.presence_gate.reset()
+
+        result = self.tracker.get_gaze(show_frame=False)
+
+        if self.tracker.user_present != self._last_presence:
+            self._last_presence = self.tracker.user_present
+            self.presence_signal.emit(self._last_presence)
+
+        if not result or not self.is_tracking_enabled:
+            return  # sam pomiar mrugnięć (praca) - stan wzroku nie jest emitowany
+        looking, yaw, pitch = result
+
+        if looking != self._last_emitted_state:
+            self._last_emitted_state = looking
+            self.gaze_detected_signal.emit(looking, yaw, pitch)
+
+        now = time.monotonic()
+        if now - self._last_telemetry_time >= self.telemetry_interval_s:
+            self._last_telemetry_time = now
+            self.gaze_telemetry_signal.emit(yaw, pitch)
+
+    def _process_palming(self):
+        if self._palming_reset_requested:
+            self._palming_reset_requested = False
+            self._last_palming_state = None
+            self.tracker.palming_detector.reset()
+
+        result = self.tracker.get_palming()
+        if result is None:
+            return
+        covered, changed, capture_time = result
+        if self._last_palming_state is None or changed:
+            at = self.tracker.palming_detector.transition_time if changed else capture_time
+            self._last_palming_state = covered
+            self.palming_signal.emit(covered, at)
+
+    def _report_blinks(self):
+        detector = self.tracker.blink_detector
+        if not detector.report_due():
+            return
+        rate = detector.blinks_per_minute()
+        if rate is not None:
+            self.blink_rate_signal.emit(rate, detector.report_blinks, detector.tracked_s)
+        detector.start_report()
+
     def run(self):
         while self.running:
             start_time = time.time()
 
-            if self.is_tracking_enabled:
-                result = self.tracker.get_gaze(show_frame=False)
-                if result:
-                    looking, yaw, pitch = result
-                    self.gaze_detected_signal.emit(looking, yaw, pitch)
-            else:
-                self.tracker.cap.grab()
+            if self.state == self.STATE_WARMING:
+                self._check_models()
+
+            if self.is_palming_enabled:
+                self.tracker.frames.set_active(True)
+                self._process_palming()
+                elapsed = time.time() - start_time
+                sleep_time = (self.palming_interval_ms / 1000) - elapsed
+                if sleep_time > 0:
+                    time.sleep(sleep_time)
+                continue
+
+            blink_tracking = self.is_blink_tracking_enabled
+            active = (self.is_tracking_enabled or blink_tracking) and self.state == self.STATE_READY
+
+            if self._blink_reset_requested:
+                self._blink_reset_requested = False
+                self.tracker.blink_detector.reset()
+                self.tracker.blink_detector.start_report()
+            self.tracker.blink_tracking = blink_tracking
+
+            # Nieaktywna skrzynka tylko opróżnia bufor kamery (grab)
+            self.tracker.frames.set_active(active)
+            if active:
+                self._process_gaze()
+                if blink_tracking:
+                    self._report_blinks()
+                    continue  # prędkość kamery - read() czeka na kolejną klatkę
 
             elapsed = time.time() - start_time
             sleep_time = (self.check_interval_ms / 1000) - elapsed
@@ -132,4 +422,11 @@ class EyeMonitorWorker(QThread):
     def stop(self):
         self.running = False
         self.wait()
-        print("Eye Monitor: Zatrzymano wątek roboczy.")
+        stats = self.tracker.frames.stats()
+        print(f"Eye Monitor: Zatrzymano wątek roboczy. Klatki: {stats['frames']}, "
+              f"pominięte: {stats['dropped']}, spóźnione decyzje: {stats['late']}, "
+              f"maks. opóźnienie: {stats['max_latency'] * 1000:.0f} ms")
+        blinks = self.tracker.blink_detector
+        if blinks.frames:
+            print(f"Eye Monitor: mrugnięcia: {blinks.total_blinks}, klatki ponad budżet "
+                  f"{blinks.latency_budget_s * 1000:.0f} ms: {blinks.over_budget}/{blinks.frames}")
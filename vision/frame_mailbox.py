@@ -0,0 +1,171 @@
+import threading
+import time
+
+import cv2
+
+
+class FrameSubscription:
+    """Niezależny odbiorca klatek ze skrzynki (np. monitor tętna obok śledzenia wzroku)."""
+
+    def __init__(self, mailbox):
+        self._mailbox = mailbox
+        self.taken_seq = 0
+
+    def read(self, timeout=1.0):
+        return self._mailbox._read(self, timeout)
+
+
+class LatestFrameCapture:
+    """
+    Skrzynka na najnowszą klatkę.
+
+    Osobny wątek ciągle czyta kamerę i nadpisuje jedną "skrzynkę", więc
+    przetwarzanie zawsze dostaje najświeższą klatkę zamiast zaległej z bufora
+    OpenCV (CAP_PROP_BUFFERSIZE ustawiony na 1, tam gdzie backend pozwala).
+    Kilku odbiorców może czytać tę samą klatkę (subscribe()); read() to
+    odbiorca domyślny. Liczniki (dla odbiorcy domyślnego):
+      - dropped: klatki nadpisane zanim ktokolwiek je odebrał,
+      - late: decyzje podjęte później niż deadline_s od przechwycenia klatki.
+    """
+
+    def __init__(self, cap, deadline_s=0.3, idle_grab_interval_s=0.25):
+        self.cap = cap
+        self.deadline_s = deadline_s
+        self.idle_grab_interval_s = idle_grab_interval_s
+        try:
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        except Exception:
+            pass  # nie każdy backend to obsługuje
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_time = 0.0
+        self._seq = 0
+        self._default = FrameSubscription(self)
+        self._subscriptions = [self._default]
+        self._pending_config = []  # funkcje cap -> None wykonywane w wątku przechwytywania
+
+        self.dropped = 0
+        self.late = 0
+        self.decisions = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+
+        self._active_consumers = {'default'}
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="LatestFrameCapture", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def subscribe(self):
+        """Nowy niezależny odbiorca najnowszych klatek."""
+        subscription = FrameSubscription(self)
+        with self._cond:
+            subscription.taken_seq = self._seq
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def set_active(self, active, consumer='default'):
+        """
+        Skrzynka czyta pełne klatki, dopóki choć jeden odbiorca jest aktywny;
+        bez aktywnych odbiorców tylko opróżnia bufor kamery (grab) co idle_grab_interval_s.
+        """
+        with self._cond:
+            was_active = bool(self._active_consumers)
+            if active:
+                self._active_consumers.add(consumer)
+            else:
+                self._active_consumers.discard(consumer)
+            if self._active_consumers and not was_active:
+                for subscription in self._subscriptions:
+                    subscription.taken_seq = self._seq  # klatka sprzed pauzy jest już nieaktualna
+
+    def reconfigure(self, configure):
+        """Wykonuje configure(cap) w wątku przechwytywania (między odczytami)."""
+        if not self._running:
+            configure(self.cap)
+            return
+        with self._cond:
+            self._pending_config.append(configure)
+
+    def _run(self):
+        while self._running:
+            with self._cond:
+                pending, self._pending_config = self._pending_config, []
+                active = bool(self._active_consumers)
+            for configure in pending:
+                try:
+                    configure(self.cap)
+                except Exception as e:
+                    print(f"LatestFrameCapture: zmiana konfiguracji kamery nie powiodła się: {e}")
+
+            if not active:
+                self.cap.grab()
+                time.sleep(self.idle_grab_interval_s)
+                continue
+
+            ret, frame = self.cap.read()
+            now = time.monotonic()
+            if not ret:
+                time.sleep(0.01)
+                continue
+
+            with self._cond:
+                if self._seq > self._default.taken_seq:
+                    self.dropped += 1
+                self._frame = frame
+                self._frame_time = now
+                self._seq += 1
+                self._cond.notify_all()
+
+    def read(self, timeout=1.0):
+        """
+        Najnowsza jeszcze nieodebrana klatka: (ret, frame, capture_time).
+        Czeka maksymalnie `timeout` sekund na nową klatkę.
+        """
+        return self._read(self._default, timeout)
+
+    def _read(self, subscription, timeout):
+        # Klatka jest współdzielona między odbiorcami - nie wolno jej modyfikować
+        if not self._running:
+            self.start()
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > subscription.taken_seq or not self._running, timeout):
+                return False, None, 0.0
+            if self._seq <= subscription.taken_seq:
+                return False, None, 0.0
+            subscription.taken_seq = self._seq
+            return True, self._frame, self._frame_time
+
+    def mark_decision(self, capture_time):
+        """Rejestruje opóźnienie przechwycenie -> decyzja dla klatki z read()."""
+        latency = time.monotonic() - capture_time
+        self.decisions += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        if latency > self.deadline_s:
+            self.late += 1
+        return latency
+
+    def stats(self):
+        return {
+            'frames': self._seq,
+            'dropped': self.dropped,
+            'late': self.late,
+            'decisions': self.decisions,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency
+        }
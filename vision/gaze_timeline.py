@@ -0,0 +1,101 @@
+import time
+from array import array
+
+
+class GazeTimeline:
+    """
+    Oś czasu przerwy zakodowana run-length: zapisujemy tylko momenty zmiany
+    stanu patrzenia (czas monotoniczny w array('d')). Stany kolejnych
+    odcinków naprzemiennie się zmieniają, więc wystarczy stan pierwszego.
+
+    Z osi wyprowadzamy rzeczywiste interwały odpoczynku (odcinki
+    "nie patrzy w ekran") i liczbę przerwań w O(liczba zmian). Pamięć jest
+    ograniczona przez max_runs - najstarsze odcinki są zwijane do sum.
+    """
+
+    def __init__(self, max_runs=4096):
+        self.max_runs = max(2, max_runs)
+        self._starts = array('d')  # początek każdego odcinka
+        self._first_looking = False  # stan odcinka _starts[0]
+        self._end = None  # koniec osi (po stop())
+        self._folded_rest = 0.0  # odpoczynek ze zwiniętych odcinków
+        self._folded_interruptions = 0
+
+    def reset(self):
+        """Czyści oś; nowa zaczyna się od pierwszego mark() - bez zgadywania stanu sprzed sygnału."""
+        self._starts = array('d')
+        self._first_looking = False
+        self._end = None
+        self._folded_rest = 0.0
+        self._folded_interruptions = 0
+
+    def start(self, looking=False, now=None):
+        """Rozpoczyna nową oś w znanym stanie `looking`."""
+        now = time.monotonic() if now is None else now
+        self.reset()
+        self._starts.append(now)
+        self._first_looking = bool(looking)
+
+    @property
+    def started(self):
+        return len(self._starts) > 0
+
+    def _state_of(self, index):
+        return self._first_looking ^ bool(index & 1)
+
+    def mark(self, looking, now=None):
+        """Zapisuje stan patrzenia; powtórzony stan nie tworzy nowego odcinka."""
+        now = time.monotonic() if now is None else now
+        if not self.started:
+            self.start(looking, now)
+            return
+        if self._end is not None or bool(looking) == self._state_of(len(self._starts) - 1):
+            return
+
+        self._starts.append(max(now, self._starts[-1]))
+        if len(self._starts) > self.max_runs:
+            self._fold_oldest()
+
+    def _fold_oldest(self):
+        """Zwija dwa najstarsze odcinki do sum, zachowując naprzemienność stanów."""
+        for index in (0, 1):
+            duration = self._starts[index + 1] - self._starts[index]
+            if self._state_of(index):
+                if index > 0 or self._folded_rest > 0:
+                    self._folded_interruptions += 1
+            else:
+                self._folded_rest += duration
+        del self._starts[:2]
+
+    def stop(self, now=None):
+        """Zamyka oś - kolejne mark() są ignorowane."""
+        if self.started and self._end is None:
+            now = time.monotonic() if now is None else now
+            self._end = max(now, self._starts[-1])
+
+    def _runs(self, now=None):
+        end = self._end
+        if end is None:
+            end = time.monotonic() if now is None else now
+        count = len(self._starts)
+        for index in range(count):
+            run_end = self._starts[index + 1] if index + 1 < count else end
+            yield self._state_of(index), max(0.0, run_end - self._starts[index])
+
+    def time_intervals(self, now=None):
+        """Czasy kolejnych odcinków odpoczynku (s); zwinięte odcinki jako jeden interwał."""
+        intervals = [self._folded_rest] if self._folded_rest > 0 else []
+        intervals.extend(duration for looking, duration in self._runs(now)
+                         if not looking and duration > 0)
+        return intervals
+
+    def interruption_count(self):
+        """Ile razy użytkownik wrócił do ekranu po rozpoczęciu odpoczynku."""
+        count = self._folded_interruptions
+        rested = self._folded_rest > 0
+        for index in range(len(self._starts)):
+            if self._state_of(index):
+                count += rested
+            else:
+                rested = True
+        return count
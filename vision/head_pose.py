@@ -0,0 +1,108 @@
+import logging
+
+import cv2
+import numpy as np
+
+# Punkty FaceMesh: nos, oko L, oko P, usta L, usta P, broda
+POSE_LANDMARK_IDS = (1, 33, 263, 61, 291, 199)
+
+# Model 3D twarzy (te same punkty co w dotychczasowej kalibracji - zapisane
+# szablony kalibracji pozostają porównywalne z kątami w czasie działania)
+MODEL_POINTS = np.array([
+    (0.0, 0.0, 0.0),
+    (-60.0, -40.0, -30.0),
+    (60.0, -40.0, -30.0),
+    (-50.0, 40.0, -60.0),
+    (50.0, 40.0, -60.0),
+    (0.0, 110.0, -20.0)
+], dtype=np.float64)
+
+
+class HeadPoseEstimator:
+    """
+    Wspólna estymacja pozy głowy (yaw, pitch, roll w stopniach) z landmarków FaceMesh.
+
+    - macierz kamery i współczynniki dystorsji liczone raz na rozmiar klatki,
+    - bufor punktów obrazu alokowany raz i wypełniany w miejscu,
+    - solvePnP ITERATIVE rozgrzewany poprzednią pozą (useExtrinsicGuess),
+      albo opcjonalnie SOLVEPNP_SQPNP (bez rozgrzewania, inna konwencja kątów
+      niż zapisane szablony kalibracji).
+    """
+
+    def __init__(self, use_sqpnp=False, warm_start=True):
+        self.use_sqpnp = use_sqpnp and hasattr(cv2, 'SOLVEPNP_SQPNP')
+        self.warm_start = warm_start and not self.use_sqpnp
+        self._intrinsics = {}  # (w, h) -> (camera_matrix, dist_coeffs)
+        self._image_points = np.zeros((len(POSE_LANDMARK_IDS), 2), dtype=np.float64)
+        self._rvec = None
+        self._tvec = None
+
+    def reset(self):
+        """Zapomina poprzednią pozę (np. po utracie twarzy)."""
+        self._rvec = None
+        self._tvec = None
+
+    def _camera(self, w, h):
+        key = (w, h)
+        intrinsics = self._intrinsics.get(key)
+        if intrinsics is None:
+            focal_length = w
+            camera_matrix = np.array([[focal_length, 0, w / 2],
+                                      [0, focal_length, h / 2],
+                                      [0, 0, 1]], dtype=np.float64)
+            intrinsics = (camera_matrix, np.zeros((4, 1)))
+            self._intrinsics[key] = intrinsics
+            self.reset()  # poprzednia poza dotyczyła innej rozdzielczości
+        return intrinsics
+
+    def _solve(self, camera_matrix, dist_coeffs):
+        if self.use_sqpnp:
+            return cv2.solvePnP(MODEL_POINTS, self._image_points, camera_matrix, dist_coeffs,
+                                flags=cv2.SOLVEPNP_SQPNP)
+        if self.warm_start and self._rvec is not None:
+            success, rvec, tvec = cv2.solvePnP(
+                MODEL_POINTS, self._image_points, camera_matrix, dist_coeffs,
+                self._rvec, self._tvec, useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE
+            )
+            if success and np.all(np.isfinite(rvec)):
+                return success, rvec, tvec
+        return cv2.solvePnP(MODEL_POINTS, self._image_points, camera_matrix, dist_coeffs,
+                            flags=cv2.SOLVEPNP_ITERATIVE)
+
+    @staticmethod
+    def _euler_degrees(rotation_vector):
+        rmat, _ = cv2.Rodrigues(rotation_vector)
+        sy = np.sqrt(rmat[0, 0] * rmat[0, 0] + rmat[1, 0] * rmat[1, 0])
+        if sy >= 1e-6:
+            x = np.arctan2(rmat[2, 1], rmat[2, 2])
+            y = np.arctan2(-rmat[2, 0], sy)
+            z = np.arctan2(rmat[1, 0], rmat[0, 0])
+        else:
+            x = np.arctan2(-rmat[1, 2], rmat[1, 1])
+            y = np.arctan2(-rmat[2, 0], sy)
+            z = 0.0
+        # yaw, pitch, roll
+        return float(np.degrees(y)), float(np.degrees(x)), float(np.degrees(z))
+
+    def estimate(self, landmarks, image_shape):
+        """Zwraca (ok, (yaw, pitch, roll)) - ten sam kontrakt co dawne estimate_head_pose."""
+        try:
+            h, w = image_shape[0], image_shape[1]
+            camera_matrix, dist_coeffs = self._camera(w, h)
+
+            points = self._image_points
+            for row, index in enumerate(POSE_LANDMARK_IDS):
+                points[row, 0] = landmarks[index].x * w
+                points[row, 1] = landmarks[index].y * h
+
+            success, rotation_vector, translation_vector = self._solve(camera_matrix, dist_coeffs)
+            if not success:
+                self.reset()
+                return False, (0.0, 0.0, 0.0)
+
+            self._rvec, self._tvec = rotation_vector, translation_vector
+            return True, self._euler_degrees(rotation_vector)
+        except Exception:
+            logging.exception("estimate_head_pose failed")
+            self.reset()
+            return False, (0.0, 0.0, 0.0)
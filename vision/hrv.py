@@ -0,0 +1,240 @@
+import math
+from array import array
+
+# Zakres tętna = pasmo filtru i dopuszczalne odstępy między uderzeniami
+MIN_HR_BPM = 40
+MAX_HR_BPM = 180
+
+HRV_WINDOW_BEATS = 30     # okno RMSSD/SDNN (uderzenia)
+HRV_MIN_BEATS = 10        # poniżej tego wynik jest niewiarygodny
+IBI_MAX_DEVIATION = 0.3   # odrzuć IBI różniące się o >30% od średniej okna (artefakt)
+IBI_MAX_REJECTED = 5      # tyle odrzuceń z rzędu = zmiana rytmu -> nowe okno
+
+# RMSSD (ms) -> wskaźnik stresu 0-1: liniowo między "zrelaksowany" a "zestresowany".
+# Progi orientacyjne dla spoczynkowego RMSSD dorosłych; rPPG z kamery jest
+# zaszumione (rozdzielczość ~1/fps), więc to wskaźnik trendu, nie diagnoza.
+RMSSD_RELAXED_MS = 50.0
+RMSSD_STRESSED_MS = 15.0
+
+
+def stress_from_rmssd(rmssd_ms):
+    """Niskie RMSSD (mała zmienność rytmu) = wysoki stres; wynik 0-1."""
+    span = RMSSD_RELAXED_MS - RMSSD_STRESSED_MS
+    return min(1.0, max(0.0, (RMSSD_RELAXED_MS - rmssd_ms) / span))
+
+
+class Biquad:
+    """Filtr IIR 2. rzędu (RBJ cookbook) - stan w czterech liczbach, O(1) na próbkę."""
+
+    def __init__(self, kind, cutoff_hz, fs, q=1 / math.sqrt(2)):
+        if kind not in ('lowpass', 'highpass'):
+            raise ValueError(f"Biquad: nieobsługiwany typ {kind!r}")
+        self.kind = kind
+        self.cutoff_hz = cutoff_hz
+        self.q = q
+        self.design(fs)
+        self.reset()
+
+    def design(self, fs):
+        """(Prze)licza współczynniki dla częstotliwości próbkowania fs; stan zostaje."""
+        self.fs = fs
+        w0 = 2.0 * math.pi * min(self.cutoff_hz, 0.45 * fs) / fs
+        cos_w0 = math.cos(w0)
+        alpha = math.sin(w0) / (2.0 * self.q)
+        if self.kind == 'lowpass':
+            b0 = b2 = (1.0 - cos_w0) / 2.0
+            b1 = 1.0 - cos_w0
+        else:
+            b0 = b2 = (1.0 + cos_w0) / 2.0
+            b1 = -(1.0 + cos_w0)
+        a0 = 1.0 + alpha
+        self.b0, self.b1, self.b2 = b0 / a0, b1 / a0, b2 / a0
+        self.a1, self.a2 = -2.0 * cos_w0 / a0, (1.0 - alpha) / a0
+
+    def reset(self):
+        self.x1 = self.x2 = self.y1 = self.y2 = 0.0
+        self.primed = False
+
+    def process(self, x):
+        if not self.primed:
+            # Stan ustalony dla stałego wejścia x - bez skoku na starcie (jasność ~100-200)
+            dc_gain = 1.0 if self.kind == 'lowpass' else 0.0
+            self.x1 = self.x2 = x
+            self.y1 = self.y2 = dc_gain * x
+            self.primed = True
+        y = self.b0 * x + self.b1 * self.x1 + self.b2 * self.x2 - self.a1 * self.y1 - self.a2 * self.y2
+        self.x2, self.x1 = self.x1, x
+        self.y2, self.y1 = self.y1, y
+        return y
+
+
+class IbiWindow:
+    """
+    Przesuwne okno odstępów między uderzeniami (IBI, sekundy).
+
+    Sumy IBI, kwadratów IBI i kwadratów kolejnych różnic są aktualizowane
+    przy każdym uderzeniu (dodanie nowego, usunięcie najstarszego), więc
+    RMSSD i SDNN kosztują O(1) na uderzenie. Bufor jest prealokowany.
+    """
+
+    def __init__(self, size=HRV_WINDOW_BEATS):
+        self.size = max(2, size)
+        self._ibis = array('d', [0.0]) * self.size
+        self.reset()
+
+    def reset(self):
+        self.count = 0   # IBI w oknie
+        self._head = 0   # indeks najstarszego
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._sum_diff_sq = 0.0
+        self._rejected = 0
+        self._updates = 0
+
+    def _at(self, i):
+        """i-te IBI od najstarszego."""
+        return self._ibis[(self._head + i) % self.size]
+
+    def _resync(self):
+        # Co jakiś czas sumy od nowa - bez kumulacji błędów zaokrągleń
+        values = [self._at(i) for i in range(self.count)]
+        self._sum = math.fsum(values)
+        self._sum_sq = math.fsum(v * v for v in values)
+        self._sum_diff_sq = math.fsum((b - a) ** 2 for a, b in zip(values, values[1:]))
+
+    @property
+    def mean(self):
+        return self._sum / self.count if self.count else 0.0
+
+    def add(self, ibi):
+        """Dodaje IBI; False, gdy odrzucone jako artefakt."""
+        if not (60.0 / MAX_HR_BPM <= ibi <= 60.0 / MIN_HR_BPM):
+            return False
+        if self.count >= 3 and abs(ibi - self.mean) > IBI_MAX_DEVIATION * self.mean:
+            self._rejected += 1
+            if self._rejected >= IBI_MAX_REJECTED:
+                self.reset()  # rytm się zmienił - zacznij okno od nowa
+            return False
+        self._rejected = 0
+
+        if self.count == self.size:
+            oldest, second = self._at(0), self._at(1)
+            self._sum -= oldest
+            self._sum_sq -= oldest * oldest
+            self._sum_diff_sq -= (second - oldest) ** 2
+            self._head = (self._head + 1) % self.size
+            self.count -= 1
+
+        if self.count:
+            newest = self._at(self.count - 1)
+            self._sum_diff_sq += (ibi - newest) ** 2
+        self._ibis[(self._head + self.count) % self.size] = ibi
+        self.count += 1
+        self._sum += ibi
+        self._sum_sq += ibi * ibi
+
+        self._updates += 1
+        if self._updates % (self.size * 32) == 0:
+            self._resync()
+        return True
+
+    @property
+    def rmssd_ms(self):
+        if self.count < 2:
+            return 0.0
+        return 1000.0 * math.sqrt(max(0.0, self._sum_diff_sq) / (self.count - 1))
+
+    @property
+    def sdnn_ms(self):
+        if self.count < 2:
+            return 0.0
+        mean = self.mean
+        return 1000.0 * math.sqrt(max(0.0, self._sum_sq / self.count - mean * mean))
+
+
+class StreamingIbiExtractor:
+    """
+    Uderzenia serca i HRV z sygnału PPG, próbka po próbce.
+
+    Filtr pasmowy (górnoprzepustowy + dolnoprzepustowy biquad, pasmo
+    MIN_HR_BPM-MAX_HR_BPM), detekcja lokalnych maksimów z adaptacyjnym progiem
+    i okresem refrakcji, interpolacja paraboliczna czasu piku (klatki co
+    ~50 ms to za mało dla HRV). Kolejne IBI trafiają do IbiWindow.
+    Współczynniki filtra są przeliczane, gdy faktyczne fps odbiega od założonego.
+    """
+
+    def __init__(self, fs=20.0, window_beats=HRV_WINDOW_BEATS):
+        self.fs = fs
+        self.highpass = Biquad('highpass', MIN_HR_BPM / 60.0, fs)
+        self.lowpass = Biquad('lowpass', MAX_HR_BPM / 60.0, fs)
+        self.window = IbiWindow(window_beats)
+        self.reset()
+
+    def reset(self):
+        self.highpass.reset()
+        self.lowpass.reset()
+        self.window.reset()
+        self._y = [0.0, 0.0, 0.0]  # trzy ostatnie próbki po filtrze
+        self._t = [0.0, 0.0, 0.0]
+        self._samples = 0
+        self._abs_level = 0.0      # EMA |y| - próg detekcji
+        self._dt = 1.0 / self.fs   # EMA odstępu próbek
+        self._last_peak = None
+        self.beats = 0
+
+    def _retune(self, dt):
+        self._dt += 0.05 * (dt - self._dt)
+        fs = 1.0 / self._dt
+        if abs(fs - self.fs) > 0.2 * self.fs:
+            self.fs = fs
+            self.highpass.design(fs)
+            self.lowpass.design(fs)
+
+    def update(self, value, t):
+        """Dodaje próbkę PPG z czasu t (s); zwraca nowe IBI (s) albo None."""
+        if self._samples and t > self._t[2]:
+            self._retune(t - self._t[2])
+        y = self.lowpass.process(self.highpass.process(value))
+        self._y[0], self._y[1], self._y[2] = self._y[1], self._y[2], y
+        self._t[0], self._t[1], self._t[2] = self._t[1], self._t[2], t
+        self._samples += 1
+        self._abs_level += 0.05 * (abs(y) - self._abs_level)
+        if self._samples < 3:
+            return None
+
+        y0, y1, y2 = self._y
+        if not (y1 > y0 and y1 >= y2 and y1 > 0.5 * self._abs_level):
+            return None
+
+        # Interpolacja paraboliczna położenia piku między próbkami
+        denominator = y0 - 2.0 * y1 + y2
+        offset = 0.5 * (y0 - y2) / denominator if denominator else 0.0
+        peak_time = self._t[1] + offset * (self._t[2] - self._t[0]) / 2.0
+
+        if self._last_peak is not None and peak_time - self._last_peak < 60.0 / MAX_HR_BPM:
+            return None  # refrakcja - fala dykrotyczna albo szum
+        previous, self._last_peak = self._last_peak, peak_time
+        if previous is None:
+            return None
+        ibi = peak_time - previous
+        if not self.window.add(ibi):
+            return None
+        self.beats += 1
+        return ibi
+
+    @property
+    def ready(self):
+        return self.window.count >= HRV_MIN_BEATS
+
+    @property
+    def rmssd_ms(self):
+        return self.window.rmssd_ms
+
+    @property
+    def sdnn_ms(self):
+        return self.window.sdnn_ms
+
+    @property
+    def stress(self):
+        """Wskaźnik stresu 0-1 z RMSSD; None, dopóki okno ma za mało uderzeń."""
+        return stress_from_rmssd(self.rmssd_ms) if self.ready else None
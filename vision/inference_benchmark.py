@@ -0,0 +1,224 @@
+"""
+Porównanie kosztu trybów inferencji dla każdego zestawu monitorów.
+
+Dla każdej kombinacji (wzrok, tętno, postawa) i trybu (osobne grafy, Holistic,
+Pose + FaceMesh na wycinku twarzy) mierzy czas ściany na klatkę, CPU% procesu
+i RSS. Każda konfiguracja działa w osobnym procesie (czysty pomiar pamięci)
+na tych samych klatkach - nagranych raz z kamery albo z pliku wideo.
+
+Mierzona jest sama inferencja na klatkę, w której działają wszystkie wybrane
+monitory (bez ich logiki i różnych częstotliwości próbkowania w aplikacji).
+
+Użycie:
+    python -m vision.inference_benchmark --frames 200
+    python -m vision.inference_benchmark --video nagranie.mp4 --modes separate holistic
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import queue as queue_module
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from vision.shared_inference import SharedInference, INFERENCE_MODES, INFERENCE_SEPARATE
+
+MONITORS = ('gaze', 'pulse', 'posture')
+WARMUP_FRAMES = 10
+
+
+def current_rss_mb():
+    """Bieżące RSS procesu w MB (psutil, /proc albo szczyt z getrusage)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024.0
+    except ImportError:
+        return float('nan')
+
+
+def record_frames(path, count, video=None):
+    """Zapisuje `count` klatek (z kamery albo pliku) do .npy - wspólne wejście dla wszystkich konfiguracji."""
+    if video:
+        cap = cv2.VideoCapture(video)
+    else:
+        from vision.camera_factory import open_camera
+        cap, _backend, _index = open_camera()
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise RuntimeError("Brak klatek do benchmarku")
+    np.save(path, np.stack(frames))
+    return len(frames)
+
+
+def _separate_models(monitors):
+    """Modele tak, jak tworzą je monitory w trybie INFERENCE_SEPARATE."""
+    import mediapipe as mp
+    models = []
+    if 'gaze' in monitors:  # EyeTracker
+        models.append(mp.solutions.face_mesh.FaceMesh(max_num_faces=1, refine_landmarks=True,
+                                                      min_detection_confidence=0.6,
+                                                      min_tracking_confidence=0.6))
+    if 'pulse' in monitors:  # HeartRateMonitor
+        models.append(mp.solutions.face_mesh.FaceMesh(max_num_faces=1, refine_landmarks=False,
+                                                      min_detection_confidence=0.7,
+                                                      min_tracking_confidence=0.7))
+    if 'posture' in monitors:  # PostureTracker
+        models.append(mp.solutions.pose.Pose(model_complexity=0, min_detection_confidence=0.7,
+                                             min_tracking_confidence=0.7))
+    return models
+
+
+def run_configuration(frames_path, monitors, mode):
+    """Mierzy jedną konfigurację (wywoływane w osobnym procesie)."""
+    frames = np.load(frames_path, mmap_mode='r')
+    rss_before = current_rss_mb()
+
+    if mode == INFERENCE_SEPARATE:
+        models = _separate_models(monitors)
+
+        def step(frame):
+            for model in models:
+                model.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    else:
+        shared = SharedInference(mode)
+        graph = shared.model.get(timeout=120)
+        if graph is None:
+            raise RuntimeError(f"nie udało się zbudować {shared.model.name}")
+        models = [graph]
+
+        def step(frame):
+            for _ in monitors:  # każdy monitor pyta; liczy tylko pierwszy
+                shared.process(frame)
+
+    for i in range(min(WARMUP_FRAMES, len(frames))):
+        step(np.array(frames[i]))
+
+    measured = [np.array(frame) for frame in frames[WARMUP_FRAMES:]] or [np.array(frames[-1])]
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    for frame in measured:
+        step(frame)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    rss_after = current_rss_mb()
+
+    for model in models:
+        model.close()
+
+    return {
+        'monitors': '+'.join(monitors),
+        'mode': mode,
+        'frames': len(measured),
+        'ms_per_frame': 1000.0 * wall / len(measured),
+        'cpu_percent': 100.0 * cpu / wall if wall > 0 else 0.0,
+        'rss_mb': rss_after,
+        'rss_delta_mb': rss_after - rss_before,
+    }
+
+
+def _child(frames_path, monitors, mode, queue):
+    try:
+        queue.put(run_configuration(frames_path, monitors, mode))
+    except Exception as e:
+        queue.put({'monitors': '+'.join(monitors), 'mode': mode, 'error': str(e)})
+
+
+def _wait_for_result(process, queue, monitors, mode):
+    """Wynik z procesu potomnego; błąd zamiast zawieszenia, gdy proces padł (np. segfault grafu)."""
+    while True:
+        try:
+            return queue.get(timeout=1.0)
+        except queue_module.Empty:
+            if process.is_alive():
+                continue
+            try:
+                return queue.get(timeout=1.0)
+            except queue_module.Empty:
+                return {'monitors': '+'.join(monitors), 'mode': mode,
+                        'error': f"proces zakończony bez wyniku (kod {process.exitcode})"}
+
+
+def run_benchmark(frames_path, modes=INFERENCE_MODES, monitor_sets=None):
+    """Lista wyników dla każdego zestawu monitorów i trybu (każdy w nowym procesie)."""
+    if monitor_sets is None:
+        monitor_sets = [combo for n in range(1, len(MONITORS) + 1)
+                        for combo in itertools.combinations(MONITORS, n)]
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for monitors in monitor_sets:
+        for mode in modes:
+            queue = context.Queue()
+            process = context.Process(target=_child, args=(frames_path, monitors, mode, queue))
+            process.start()
+            result = _wait_for_result(process, queue, monitors, mode)
+            process.join()
+            results.append(result)
+            print(format_result(result))
+    return results
+
+
+def format_result(result):
+    label = f"{result['monitors']:<20} {result['mode']:<9}"
+    if 'error' in result:
+        return f"{label} BŁĄD: {result['error']}"
+    return (f"{label} {result['ms_per_frame']:7.1f} ms/klatkę  CPU {result['cpu_percent']:5.0f}%  "
+            f"RSS {result['rss_mb']:6.0f} MB (+{result['rss_delta_mb']:.0f})")
+
+
+def cheapest_per_monitor_set(results):
+    """Najtańszy (ms/klatkę) tryb dla każdego zestawu monitorów."""
+    best = {}
+    for result in results:
+        if 'error' in result:
+            continue
+        current = best.get(result['monitors'])
+        if current is None or result['ms_per_frame'] < current['ms_per_frame']:
+            best[result['monitors']] = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Koszt trybów inferencji MediaPipe")
+    parser.add_argument('--video', help="plik wideo zamiast kamery")
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--modes', nargs='+', choices=INFERENCE_MODES, default=list(INFERENCE_MODES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        frames_path = os.path.join(tmp, 'frames.npy')
+        count = record_frames(frames_path, args.frames + WARMUP_FRAMES, args.video)
+        print(f"Klatki: {count} ({WARMUP_FRAMES} na rozgrzewkę)\n")
+        results = run_benchmark(frames_path, modes=args.modes)
+
+    print("\nNajtańszy tryb:")
+    for monitors, result in cheapest_per_monitor_set(results).items():
+        print(f"  {monitors:<20} -> {result['mode']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+"""
+Nagrywanie tego, co widział stos wizji, i odtwarzanie bez inferencji.
+
+Nagranie to katalog z trzema strumieniami (gaze, pulse, posture). Każdy
+strumień to kolejne pliki .npy (tablice strukturalne, po CHUNK_FRAMES
+rekordów), dopisywane i nigdy nie przepisywane, oraz wspólny index.json
+aktualizowany po każdym pliku. Pliki otwierane są przez np.load(mmap_mode='r'),
+więc odczyt długiego nagrania nie wczytuje go do pamięci.
+
+Odtwarzanie (replay_gaze/replay_pulse/replay_posture) przepuszcza rekordy
+przez logikę EyeTracker/HeartRateMonitor/PostureTracker z czasami z nagrania -
+strojenie progów i testy regresji kosztują tylko geometrię, nie FaceMesh/Pose.
+
+Użycie:
+    python -m vision.landmark_recorder nagranie/
+"""
+import argparse
+import itertools
+import json
+import operator
+import os
+import threading
+import time
+
+import numpy as np
+
+INDEX_FILE = 'index.json'
+FORMAT_VERSION = 1
+CHUNK_FRAMES = 256
+FACE_LANDMARKS = 478  # 468 punktów twarzy + 10 tęczówek (refine_landmarks=True)
+POSE_LANDMARKS = 33
+STREAMS = ('gaze', 'pulse', 'posture')
+
+
+def stream_dtype(name, landmark_dtype=np.float16):
+    """Typ rekordu strumienia; brak danych w rekordzie = NaN."""
+    common = [('t', 'f8'), ('size', 'i4', (2,))]  # czas przechwycenia (monotonic), (szer., wys.)
+    if name == 'gaze':
+        return np.dtype(common + [('face', landmark_dtype, (FACE_LANDMARKS, 3)),
+                                  ('angles', 'f4', (2,))])  # yaw, pitch po filtrze
+    if name == 'pulse':
+        return np.dtype(common + [('roi_center', 'f4', (2,)),   # piksele pełnej klatki
+                                  ('roi_mean', 'f4', (3,))])    # średnie BGR ROI czoła
+    if name == 'posture':
+        return np.dtype(common + [('pose', 'f4', (POSE_LANDMARKS, 4))])  # x, y, z, visibility
+    raise ValueError(f"Nieznany strumień {name!r}")
+
+
+class _StreamWriter:
+    """Bufor jednego strumienia (prealokowany) zapisywany plikami po chunk_frames rekordów."""
+
+    def __init__(self, directory, name, dtype, chunk_frames):
+        self.name = name
+        self.directory = os.path.join(directory, name)
+        os.makedirs(self.directory, exist_ok=True)
+        self.buffer = np.zeros(chunk_frames, dtype=dtype)
+        self.count = 0
+        self.chunks = []
+
+    def next_row(self, t, width, height):
+        row = self.count
+        self.buffer['t'][row] = t
+        self.buffer['size'][row] = (width, height)
+        return row
+
+    def commit_row(self):
+        """Zatwierdza rekord; True, gdy bufor został zapisany jako nowy plik."""
+        self.count += 1
+        if self.count == len(self.buffer):
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        if not self.count:
+            return False
+        filename = f"chunk_{len(self.chunks):06d}.npy"
+        records = self.buffer[:self.count]
+        np.save(os.path.join(self.directory, filename), records)
+        self.chunks.append({'file': f"{self.name}/{filename}", 'frames': int(self.count),
+                            't_first': float(records['t'][0]), 't_last': float(records['t'][-1])})
+        self.count = 0
+        return True
+
+
+def _fill_landmarks(target, landmarks, fields):
+    """Kopiuje landmarki MediaPipe (obiekty z .x/.y/...) do wiersza tablicy; reszta = NaN."""
+    if landmarks is None:
+        target[:] = np.nan
+        return
+    count = min(len(landmarks), len(target))
+    getter = operator.attrgetter(*fields)
+    target[:count] = np.array([getter(p) for p in itertools.islice(landmarks, count)], dtype=np.float32)
+    target[count:] = np.nan
+
+
+class LandmarkRecorder:
+    """
+    Zapis strumieni landmarków (bezpieczny dla wielu wątków - EyeMonitorWorker,
+    PulseMonitorWorker i PostureWorker zapisują równolegle).
+    """
+
+    def __init__(self, directory, chunk_frames=CHUNK_FRAMES, landmark_dtype=np.float16):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.landmark_dtype = np.dtype(landmark_dtype)
+        self._lock = threading.Lock()
+        self._streams = {name: _StreamWriter(directory, name, stream_dtype(name, self.landmark_dtype),
+                                             max(1, chunk_frames))
+                         for name in STREAMS}
+        self.closed = False
+        self._write_index()
+
+    def _write_index(self):
+        index = {
+            'version': FORMAT_VERSION,
+            'landmark_dtype': self.landmark_dtype.str,
+            'streams': {name: stream.chunks for name, stream in self._streams.items()},
+        }
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=1)
+        os.replace(path + '.tmp', path)  # indeks zawsze spójny, także po awarii
+
+    def _append(self, name, t, width, height, fill):
+        with self._lock:
+            if self.closed:
+                return
+            stream = self._streams[name]
+            row = stream.next_row(t, width, height)
+            fill(stream.buffer, row)
+            if stream.commit_row():
+                self._write_index()
+
+    def record_gaze(self, t, width, height, face_landmarks=None, angles=None):
+        def fill(buffer, row):
+            _fill_landmarks(buffer['face'][row], face_landmarks, ('x', 'y', 'z'))
+            buffer['angles'][row] = angles if angles is not None else (np.nan, np.nan)
+        self._append('gaze', t, width, height, fill)
+
+    def record_pulse(self, t, width, height, roi_center=None, roi_mean=None):
+        def fill(buffer, row):
+            buffer['roi_center'][row] = roi_center if roi_center is not None else (np.nan, np.nan)
+            buffer['roi_mean'][row] = roi_mean if roi_mean is not None else (np.nan, np.nan, np.nan)
+        self._append('pulse', t, width, height, fill)
+
+    def record_posture(self, t, width, height, pose_landmarks=None):
+        def fill(buffer, row):
+            _fill_landmarks(buffer['pose'][row], pose_landmarks, ('x', 'y', 'z', 'visibility'))
+        self._append('posture', t, width, height, fill)
+
+    def flush(self):
+        """Zapisuje niepełne bufory jako pliki (nagranie da się od razu odczytać)."""
+        with self._lock:
+            if any([stream.flush() for stream in self._streams.values()]):
+                self._write_index()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.closed = True
+
+
+class _Point:
+    __slots__ = ('x', 'y', 'z', 'visibility')
+
+    def __init__(self, row):
+        self.x, self.y, self.z = float(row[0]), float(row[1]), float(row[2])
+        self.visibility = float(row[3]) if len(row) > 3 else 1.0
+
+
+class LandmarkView:
+    """Wiersz (N, 3|4) z nagrania udający listę landmarków MediaPipe (.x/.y/.z/.visibility)."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return _Point(self.rows[index])
+
+    def __iter__(self):
+        return (_Point(row) for row in self.rows)
+
+
+class LandmarkRecording:
+    """Odczyt nagrania; pliki strumieni są mapowane do pamięci przy pierwszym użyciu."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Nieobsługiwana wersja nagrania: {index.get('version')}")
+        self.landmark_dtype = np.dtype(index['landmark_dtype'])
+        self._chunks = index['streams']
+        self._arrays = {}
+
+    def frames(self, name):
+        return sum(chunk['frames'] for chunk in self._chunks.get(name, []))
+
+    def chunks(self, name):
+        """Tablice strukturalne kolejnych plików strumienia (np.memmap)."""
+        if name not in self._arrays:
+            self._arrays[name] = [np.load(os.path.join(self.directory, chunk['file']), mmap_mode='r')
+                                  for chunk in self._chunks.get(name, [])]
+        return self._arrays[name]
+
+    def field(self, name, field):
+        """Całe pole strumienia jako jedna tablica (np. 't' albo 'angles') - do analiz wektorowych."""
+        parts = [chunk[field] for chunk in self.chunks(name)]
+        if not parts:
+            return np.zeros((0,) + stream_dtype(name, self.landmark_dtype)[field].shape)
+        return np.concatenate(parts)
+
+    def records(self, name):
+        for chunk in self.chunks(name):
+            for row in range(len(chunk)):
+                yield chunk[row]
+
+
+def _size(record):
+    width, height = record['size']
+    return int(width), int(height)
+
+
+def replay_gaze(recording, tracker=None, blink_tracking=True):
+    """
+    Logika EyeTrackera (kąty głowy, stan patrzenia, mrugnięcia, region oczu) na
+    nagranych landmarkach, z czasami z nagrania. Zwraca generator
+    (t, (looking, yaw, pitch) albo None); tracker jest dostępny po odtworzeniu.
+    """
+    try:
+        from vision.eye_monitor import EyeTracker
+    except ImportError:  # uruchamiany bezpośrednio jako skrypt z katalogu vision/
+        from eye_monitor import EyeTracker
+    if tracker is None:
+        tracker = EyeTracker(own_camera=False, load_model=False)
+    tracker.blink_tracking = blink_tracking
+    for record in recording.records('gaze'):
+        t = float(record['t'])
+        tracker.w, tracker.h = _size(record)
+        face = record['face']
+        landmarks = None if np.isnan(face[0, 0]) else LandmarkView(face)
+        yield t, tracker.gaze_from_landmarks(landmarks, t, now=t)
+
+
+def replay_pulse(recording, monitor=None):
+    """Logika HeartRateMonitor (FFT, stabilizacja, HRV) na nagranych średnich ROI; (t, stable_hr)."""
+    try:
+        from vision.pulse_monitor import HeartRateMonitor
+    except ImportError:  # uruchamiany bezpośrednio jako skrypt z katalogu vision/
+        from pulse_monitor import HeartRateMonitor
+    if monitor is None:
+        monitor = HeartRateMonitor(own_camera=False, load_model=False)
+    started = False
+    for record in recording.records('pulse'):
+        t = float(record['t'])
+        if not started:
+            monitor.reset(now=t)
+            started = True
+        green = float(record['roi_mean'][1])
+        monitor.last_calc_time = t  # jak w process_frame przed add_sample
+        yield t, monitor.add_sample(None if np.isnan(green) else green, t)
+
+
+def replay_posture(recording, tracker=None):
+    """Logika PostureTracker na nagranych landmarkach Pose; (t, wynik process_landmarks albo None)."""
+    try:
+        from vision.spine_monitor import PostureTracker
+    except ImportError:  # uruchamiany bezpośrednio jako skrypt z katalogu vision/
+        from spine_monitor import PostureTracker
+    if tracker is None:
+        tracker = PostureTracker(own_camera=False, load_model=False)
+    for record in recording.records('posture'):
+        t = float(record['t'])
+        tracker.w, tracker.h = _size(record)
+        pose = record['pose']
+        result = None if np.isnan(pose[0, 0]) else tracker.process_landmarks(LandmarkView(pose))
+        yield t, result
+
+
+def _timed(results):
+    """Odtwarza generator do końca; (liczba rekordów, sekundy, ostatni wynik)."""
+    count, last, start = 0, None, time.perf_counter()
+    for count, last in enumerate(results, 1):
+        pass
+    return count, time.perf_counter() - start, last
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Odtwarzanie nagrania landmarków bez inferencji")
+    parser.add_argument('directory', help="katalog nagrania (LandmarkRecorder)")
+    args = parser.parse_args()
+
+    recording = LandmarkRecording(args.directory)
+    for name in STREAMS:
+        times = recording.field(name, 't')
+        span = float(times[-1] - times[0]) if len(times) > 1 else 0.0
+        print(f"{name:<8} {len(times):6d} rekordów, {span:7.1f} s nagrania")
+
+    from vision.eye_monitor import EyeTracker
+    tracker = EyeTracker(own_camera=False, load_model=False)
+    count, elapsed, _last = _timed(replay_gaze(recording, tracker))
+    if count:
+        blinks = tracker.blink_detector
+        print(f"wzrok:    {count / max(elapsed, 1e-9):8.0f} rekordów/s, mrugnięcia: {blinks.total_blinks}")
+
+    count, elapsed, last = _timed(replay_pulse(recording))
+    if count:
+        print(f"tętno:    {count / max(elapsed, 1e-9):8.0f} rekordów/s, ostatnie BPM: {last[1]:.0f}")
+
+    count, elapsed, _last = _timed(replay_posture(recording))
+    if count:
+        print(f"postawa:  {count / max(elapsed, 1e-9):8.0f} rekordów/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Jeden wątek na budowanie grafów MediaPipe - ładowanie modeli TFLite nie blokuje
+# startu (ikona w zasobniku i timer pracy działają od razu)
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-init")
+
+
+class AsyncModel:
+    """
+    Model budowany w tle. `future` to "ready future"; get() zwraca model,
+    gdy jest gotowy, a None w trakcie rozgrzewania albo po błędzie.
+    """
+
+    def __init__(self, builder, name):
+        self.name = name
+        self.future = _executor.submit(builder)
+        self._error_logged = False
+
+    @property
+    def ready(self):
+        return self.future.done() and self.future.exception() is None
+
+    @property
+    def failed(self):
+        return self.future.done() and self.future.exception() is not None
+
+    def get(self, timeout=0):
+        """Model albo None; timeout > 0 czeka na zakończenie budowania."""
+        if not timeout and not self.future.done():
+            return None
+        try:
+            return self.future.result(timeout=timeout or None)
+        except Exception as e:
+            if not self._error_logged:
+                self._error_logged = True
+                logging.error(f"{self.name} init failed: {e}")
+            return None
+
+    def close(self):
+        """Zamyka model - także taki, który jeszcze się buduje."""
+        def _close(future):
+            if future.exception() is None:
+                try:
+                    future.result().close()
+                except Exception:
+                    pass
+        self.future.add_done_callback(_close)
+
+
+def face_mesh_async(**kwargs):
+    """FaceMesh(**kwargs) budowany w tle."""
+    def build():
+        import mediapipe as mp
+        return mp.solutions.face_mesh.FaceMesh(**kwargs)
+    return AsyncModel(build, "FaceMesh")
+
+
+def pose_async(**kwargs):
+    """Pose(**kwargs) budowany w tle."""
+    def build():
+        import mediapipe as mp
+        return mp.solutions.pose.Pose(**kwargs)
+    return AsyncModel(build, "Pose")
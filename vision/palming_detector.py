@@ -0,0 +1,156 @@
+import time
+
+import cv2
+import numpy as np
+
+from vision.blink_detector import EYELID_LANDMARKS
+
+# Region oczu: ramka punktów powiek z ostatniego przebiegu FaceMesh + margines
+EYE_REGION_MARGIN = 0.6               # względem szerokości/wysokości ramki powiek
+MIN_EYE_REGION = 0.08                 # minimalny bok regionu (ułamek klatki)
+DEFAULT_EYE_REGION = (0.3, 0.25, 0.7, 0.5)  # gdy twarzy jeszcze nie widziano
+PATCH_SIZE = (32, 16)                 # region skalowany do tylu pikseli (szer., wys.)
+
+# Zakryte oczy: region płaski (dłoń zamiast oczu/brwi) i ciemny albo w kolorze skóry
+COVER_FLAT_RATIO = 0.5    # odchylenie jasności < 50% odniesienia (otwarte oczy)
+COVER_FLAT_ABS = 6.0      # ...albo poniżej tej wartości niezależnie od odniesienia
+COVER_DARK_RATIO = 0.6    # średnia jasność < 60% odniesienia
+COVER_SKIN_RATIO = 0.6    # ponad 60% pikseli w kolorze skóry
+REFERENCE_ALPHA = 0.05    # EMA odniesienia (tylko klatki z odkrytymi oczami)
+PALMING_MIN_DWELL_S = 0.3  # tyle musi trwać nowy stan, zanim zostanie przyjęty
+OPEN_EYE_MIN_EAR = 0.2    # EAR z FaceMesh powyżej tego = oczy otwarte (klatka na odniesienie)
+
+# Kolor skóry w YCrCb (klasyczne progi Chai & Ngan)
+SKIN_CR = (133, 173)
+SKIN_CB = (77, 127)
+
+
+class PalmingDetector:
+    """
+    Weryfikacja palmingu (dłonie na oczach) bez inferencji.
+
+    Na klatkę: wycinek ostatniego znanego regionu oczu przeskalowany do
+    PATCH_SIZE, z niego średnia i odchylenie jasności oraz udział pikseli
+    w kolorze skóry. Odkryte oczy (brwi, źrenice, białka) dają kontrast;
+    dłoń daje płaski, ciemny albo skórny region. Odniesienie pochodzi
+    tylko z klatek, na których FaceMesh potwierdził otwarte oczy
+    (observe_open_eyes) - bez niego detektor nie zgłasza zakrycia.
+    W trakcie ćwiczenia jest dalej uśredniane (EMA) z klatek z odkrytymi oczami.
+
+    Zmiana stanu musi trwać PALMING_MIN_DWELL_S, ale jest datowana na
+    czas przechwycenia pierwszej klatki nowego stanu - odcinki zakrycia
+    mają dokładne granice.
+    """
+
+    def __init__(self, min_dwell_s=PALMING_MIN_DWELL_S):
+        self.min_dwell_s = min_dwell_s
+        self.eye_region = None  # (x0, y0, x1, y1), współrzędne znormalizowane
+        self.open_reference = None  # (średnia, odchylenie) z klatek z FaceMesh i otwartymi oczami
+        self._patch = np.empty((PATCH_SIZE[1], PATCH_SIZE[0], 3), dtype=np.uint8)
+        self._ycrcb = np.empty_like(self._patch)
+        self.reset()
+
+    def reset(self):
+        """Nowe ćwiczenie - region oczu i zweryfikowane odniesienie zostają, odcinki od nowa."""
+        self.reference = self.open_reference  # (średnia, odchylenie) jasności odkrytych oczu
+        self.covered = False
+        self.stats = (0.0, 0.0, 0.0)
+        self._candidate = None
+        self._candidate_since = 0.0
+        self.covered_since = None
+        self.intervals = []     # zakończone odcinki zakrycia (start, koniec)
+        self.frames = 0
+
+    def set_eye_region(self, landmarks):
+        """Zapamiętuje region oczu z landmarków FaceMesh (wywoływane przy przebiegu wzroku)."""
+        xs = [landmarks[i].x for i in EYELID_LANDMARKS]
+        ys = [landmarks[i].y for i in EYELID_LANDMARKS]
+        x0, x1, y0, y1 = min(xs), max(xs), min(ys), max(ys)
+        mx = max((x1 - x0) * EYE_REGION_MARGIN, MIN_EYE_REGION / 2)
+        my = max((y1 - y0) * EYE_REGION_MARGIN * 2, MIN_EYE_REGION / 2)  # powieki są wąskie - więcej w pionie
+        self.eye_region = (max(0.0, x0 - mx), max(0.0, y0 - my),
+                           min(1.0, x1 + mx), min(1.0, y1 + my))
+
+    def observe_open_eyes(self, frame, landmarks, ear):
+        """
+        Klatka z twarzą z FaceMesh (przebieg wzroku): region oczu, a przy otwartych
+        oczach (ear - EAR z BlinkDetector) także odniesienie dla kolejnych ćwiczeń.
+        """
+        self.set_eye_region(landmarks)
+        if ear < OPEN_EYE_MIN_EAR:
+            return
+        mean, std, _ = self.region_stats(frame)
+        if self.open_reference is None:
+            self.open_reference = (mean, std)
+        else:
+            ref_mean, ref_std = self.open_reference
+            self.open_reference = (ref_mean + REFERENCE_ALPHA * (mean - ref_mean),
+                                   ref_std + REFERENCE_ALPHA * (std - ref_std))
+
+    def region_stats(self, frame):
+        """(średnia jasność, odchylenie jasności, udział skóry) regionu oczu."""
+        h, w = frame.shape[:2]
+        x0, y0, x1, y1 = self.eye_region or DEFAULT_EYE_REGION
+        x0, x1 = int(x0 * w), max(int(x0 * w) + 1, int(x1 * w))
+        y0, y1 = int(y0 * h), max(int(y0 * h) + 1, int(y1 * h))
+        cv2.resize(frame[y0:y1, x0:x1], PATCH_SIZE, dst=self._patch, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._patch, cv2.COLOR_BGR2YCrCb, dst=self._ycrcb)
+        luma, cr, cb = self._ycrcb[..., 0], self._ycrcb[..., 1], self._ycrcb[..., 2]
+        mean, std = cv2.meanStdDev(luma)
+        skin = ((cr >= SKIN_CR[0]) & (cr <= SKIN_CR[1]) &
+                (cb >= SKIN_CB[0]) & (cb <= SKIN_CB[1]))
+        return float(mean[0, 0]), float(std[0, 0]), float(skin.mean())
+
+    def _is_covered(self, mean, std, skin):
+        ref_mean, ref_std = self.reference
+        flat = std < max(COVER_FLAT_ABS, ref_std * COVER_FLAT_RATIO)
+        occluded = mean < ref_mean * COVER_DARK_RATIO or skin > COVER_SKIN_RATIO
+        return flat and occluded
+
+    def update(self, frame, capture_time):
+        """Jedna klatka BGR z czasu przechwycenia capture_time. Zwraca True przy zmianie stanu."""
+        self.frames += 1
+        if self.reference is None:
+            self.reference = self.open_reference
+            if self.reference is None:
+                return False  # brak klatki z potwierdzonymi otwartymi oczami - nie zgadujemy
+        mean, std, skin = self.stats = self.region_stats(frame)
+
+        target = self._is_covered(mean, std, skin)
+        if target == self.covered:
+            self._candidate = None
+            if not target:
+                ref_mean, ref_std = self.reference
+                self.reference = (ref_mean + REFERENCE_ALPHA * (mean - ref_mean),
+                                  ref_std + REFERENCE_ALPHA * (std - ref_std))
+            return False
+
+        if self._candidate != target:
+            self._candidate = target
+            self._candidate_since = capture_time
+        if capture_time - self._candidate_since < self.min_dwell_s:
+            return False
+
+        self.covered = target
+        self._candidate = None
+        if target:
+            self.covered_since = self._candidate_since
+        else:
+            self.intervals.append((self.covered_since, self._candidate_since))
+            self.covered_since = None
+        return True
+
+    @property
+    def transition_time(self):
+        """Czas przechwycenia pierwszej klatki bieżącego stanu (dla ostatniej zmiany)."""
+        if self.covered:
+            return self.covered_since
+        return self.intervals[-1][1] if self.intervals else None
+
+    def covered_seconds(self, now=None):
+        """Łączny czas zakrycia oczu (s), łącznie z trwającym odcinkiem."""
+        total = sum(end - start for start, end in self.intervals)
+        if self.covered_since is not None:
+            now = time.monotonic() if now is None else now
+            total += max(0.0, now - self.covered_since)
+        return total
@@ -0,0 +1,80 @@
+import time
+
+import cv2
+
+PRESENT = 'present'  # jest twarz / coś się ruszyło -> uruchom pełną inferencję
+AWAY = 'away'        # nikogo przy biurku -> pomiń FaceMesh/Pose
+STATIC = 'static'    # nic się nie zmieniło -> można użyć poprzedniego wyniku
+
+
+class PresenceGate:
+    """
+    Tani filtr przed FaceMesh/Pose.
+
+    Klatka jest zmniejszana do ~160 px w skali szarości. Najpierw test różnicy
+    z poprzednią klatką (czy cokolwiek się ruszyło), dopiero przy ruchu
+    detektor Haar twarzy na małym obrazie. Dopiero gdy twarz jest obecna,
+    warto uruchamiać drogą inferencję. "Away" wymaga kilku kolejnych
+    chybień, obecność jest zgłaszana od razu.
+    """
+
+    def __init__(self, width=160, motion_threshold=3.0, away_after=3, refresh_s=1.0):
+        self.width = width
+        self.motion_threshold = motion_threshold  # średnia |różnica| jasności (0-255)
+        self.away_after = away_after
+        self.refresh_s = refresh_s  # co tyle sekund pełne sprawdzenie mimo braku ruchu
+
+        self.face_cascade = None
+        try:
+            self.face_cascade = cv2.CascadeClassifier(
+                cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+            if self.face_cascade.empty():
+                self.face_cascade = None
+        except Exception:
+            self.face_cascade = None
+        if self.face_cascade is None:
+            print("PresenceGate: Haar cascade niedostępny - tylko test ruchu")
+
+        self.reset()
+
+    def reset(self):
+        self.present = True  # dopóki nie udowodnimy inaczej
+        self._previous = None
+        self._misses = 0
+        self._last_full_check = 0.0
+
+    def _small_gray(self, frame):
+        h, w = frame.shape[:2]
+        scale = self.width / float(w)
+        small = cv2.resize(frame, (self.width, max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def check(self, frame, now=None):
+        """Zwraca PRESENT, AWAY albo STATIC dla klatki BGR."""
+        now = time.monotonic() if now is None else now
+        small = self._small_gray(frame)
+        previous, self._previous = self._previous, small
+
+        moved = True
+        if previous is not None and previous.shape == small.shape:
+            moved = cv2.absdiff(small, previous).mean() > self.motion_threshold
+
+        if not moved and now - self._last_full_check < self.refresh_s:
+            return STATIC if self.present else AWAY
+        self._last_full_check = now
+
+        if self.face_cascade is None:
+            self.present = True
+            return PRESENT
+
+        faces = self.face_cascade.detectMultiScale(small, scaleFactor=1.2, minNeighbors=3, minSize=(20, 20))
+        if len(faces) > 0:
+            self._misses = 0
+            self.present = True
+        else:
+            self._misses += 1
+            if self._misses >= self.away_after:
+                self.present = False
+        return PRESENT if self.present else AWAY
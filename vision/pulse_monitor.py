@@ -1,10 +1,29 @@
 import cv2
 import mediapipe as mp
 import numpy as np
+import queue
+import threading
 import time
 from collections import deque
-from scipy.signal import detrend
 from numpy.fft import fft, fftfreq
+from PyQt5.QtCore import QThread, pyqtSignal
+
+try:
+    from vision.camera_modes import negotiate_camera_mode, device_key
+    from vision.camera_factory import open_camera
+    from vision.hrv import StreamingIbiExtractor
+except ImportError:  # uruchamiany bezpośrednio jako skrypt z katalogu vision/
+    from camera_modes import negotiate_camera_mode, device_key
+    from camera_factory import open_camera
+    from hrv import StreamingIbiExtractor
+
+
+def detrend(signal):
+    """Usuwa trend liniowy (jak scipy.signal.detrend) - bez zależności od scipy."""
+    x = np.arange(len(signal), dtype=np.float64)
+    slope, intercept = np.polyfit(x, signal, 1)
+    return signal - (slope * x + intercept)
+
 
 # ---- MediaPipe Setup ----
 mp_face_mesh = mp.solutions.face_mesh
@@ -22,43 +41,75 @@ CALC_INTERVAL = 1.0
 # --- NOWA STAŁA: Czas odświeżania wyświetlanego tętna (w sekundach) ---
 DISPLAY_UPDATE_INTERVAL = 10.0
 
+# Budżet klatek dla PulseMonitorWorker (analiza FFT wymaga >= MIN_FPS)
+PULSE_FRAME_BUDGET_FPS = 20
+
+# Dwie rozdzielczości: landmarki z małej klatki, średnia ROI z pełnej
+INFERENCE_WIDTH = 256  # szerokość klatki dla FaceMesh (0 = pełna rozdzielczość)
+LANDMARK_EVERY_N = 3   # FaceMesh co N-tą klatkę, pomiędzy ROI śledzone przesunięciem fazowym
+TRACK_PATCH = 64       # bok łaty (px pełnej klatki) do śledzenia ROI
+TRACK_MIN_RESPONSE = 0.2  # minimalna pewność phaseCorrelate, poniżej ROI zostaje w miejscu
+
 
 class HeartRateMonitor:
     """Monitor tętna oparty o analizę zmian koloru twarzy w czasie rzeczywistym."""
 
-    def __init__(self, buffer_size=BUFFER_SIZE):
-        self.cap = cv2.VideoCapture(0, cv2.CAP_MSMF)
-
-        if not self.cap.isOpened():
-            raise RuntimeError("Camera not accessible or currently in use.")
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        self.cap.set(cv2.CAP_PROP_FPS, 30)
+    def __init__(self, buffer_size=BUFFER_SIZE, own_camera=True, inference=None,
+                 inference_width=INFERENCE_WIDTH, landmark_every_n=LANDMARK_EVERY_N, load_model=True):
+        """
+        own_camera=False - klatki podaje wywołujący przez process_frame() (np. PulseMonitorWorker).
+        load_model=False - bez FaceMesh; próbki przez add_sample() (odtwarzanie nagrania).
+        inference - wspólna inferencja (SharedInference) zamiast własnego FaceMesh.
+        inference_width - FaceMesh na klatce zmniejszonej do tej szerokości; ROI z pełnej.
+        landmark_every_n - landmarki co N-tą klatkę (1 = każda), pomiędzy ROI jest śledzone.
+        """
+        self.cap = None
+        if own_camera:
+            self.cap, _backend, camera_index = open_camera()
+            self.camera_mode = negotiate_camera_mode(self.cap, ('pulse',), device_key(self.cap, camera_index))
 
         self.drawing_spec = mp_drawing.DrawingSpec(thickness=1, circle_radius=1)
 
-        self.face_mesh = mp_face_mesh.FaceMesh(
-            max_num_faces=1,
-            refine_landmarks=False,
-            min_detection_confidence=0.7,
-            min_tracking_confidence=0.7
-        )
+        self.inference = inference
+        self.face_mesh = None
+        if inference is None and load_model:
+            self.face_mesh = mp_face_mesh.FaceMesh(
+                max_num_faces=1,
+                refine_landmarks=False,
+                min_detection_confidence=0.7,
+                min_tracking_confidence=0.7
+            )
         self.raw_signal = deque(maxlen=buffer_size)
         self.times = deque(maxlen=buffer_size)
-        self.last_calc_time = time.time()
+        self.last_calc_time = time.monotonic()  # zegar próbek = czas przechwycenia klatek
 
         # --- NOWE ZMIENNE DLA STABILIZACJI WYNIKU ---
         self.stable_hr = 0.0  # Wynik wyświetlany na ekranie (stabilny)
-        self.last_display_update_time = time.time()  # Czas ostatniej aktualizacji stable_hr
+        self.last_display_update_time = time.monotonic()  # Czas ostatniej aktualizacji stable_hr
         self.hr_history = deque(
             maxlen=int(DISPLAY_UPDATE_INTERVAL / CALC_INTERVAL) + 2)  # Historia ostatnich obliczonych HR
         # ---------------------------------------------
 
         self.estimated_hr = 0.0  # Wynik z ostatniej FFT (może skakać)
+        self.signal_quality = 0.0  # Udział piku tętna w mocy pasma 40-180 BPM (0-1)
         self.w, self.h = 0, 0
         self.pulse_values = deque(maxlen=30)
         self.current_pulse_color = (0, 255, 255)
 
+        # ROI czoła w pikselach pełnej klatki (None = brak twarzy)
+        self.inference_width = inference_width
+        self.landmark_every_n = max(1, landmark_every_n)
+        self.roi_center = None
+        self._last_results = None
+        self._frames_since_landmarks = 0
+        self._track_patch = None
+        self.landmark_frames = 0  # ile klatek przeszło przez FaceMesh (statystyka kosztu)
+
+        # Uderzenia i HRV (RMSSD/SDNN) na bieżąco z tych samych próbek PPG
+        self.ibi_extractor = StreamingIbiExtractor(fs=PULSE_FRAME_BUDGET_FPS)
+        self.last_roi_mean = None  # średnie BGR ostatniego ROI
+        self.recorder = None  # LandmarkRecorder - nagrywanie ROI
+
     # ... (draw_pulsating_face_mesh, get_roi_color, analyze_signal - BEZ ZMIAN) ...
 
     def draw_pulsating_face_mesh(self, frame, results, avg_green):
@@ -91,10 +142,14 @@ class HeartRateMonitor:
                     )
                 )
 
-    def get_roi_color(self, frame, landmarks):
+    def get_roi_color(self, frame, landmarks, draw=True):
         """Średni kolor z fragmentu czoła."""
         p = landmarks[FOREHEAD_CENTER_INDEX]
-        cx, cy = int(p.x * self.w), int(p.y * self.h)
+        return self.get_roi_color_at(frame, p.x * self.w, p.y * self.h, draw=draw)
+
+    def get_roi_color_at(self, frame, x, y, draw=True):
+        """Średnia składowa zielona kwadratu ROI_SIZE wokół (x, y) w pikselach pełnej klatki."""
+        cx, cy = int(x), int(y)
         x1, y1 = max(0, cx - ROI_SIZE), max(0, cy - ROI_SIZE)
         x2, y2 = min(self.w, cx + ROI_SIZE), min(self.h, cy + ROI_SIZE)
         roi = frame[y1:y2, x1:x2]
@@ -102,8 +157,10 @@ class HeartRateMonitor:
         if roi.size > 0:
             avg_color = np.mean(roi, axis=(0, 1))
             avg_green = avg_color[1]
+            self.last_roi_mean = avg_color
 
-            cv2.circle(frame, (cx, cy), 3, (0, 0, 255), -1)
+            if draw:
+                cv2.circle(frame, (cx, cy), 3, (0, 0, 255), -1)
 
             return avg_green
         return None
@@ -137,7 +194,11 @@ class HeartRateMonitor:
         if len(fft_abs) == 0:
             return 0.0
 
-        return bpm[np.argmax(fft_abs)]
+        peak = np.argmax(fft_abs)
+        power = fft_abs ** 2
+        total_power = power.sum()
+        self.signal_quality = float(power[peak] / total_power) if total_power > 0 else 0.0
+        return bpm[peak]
 
     # --- Modyfikacja: Wyświetlamy stable_hr, a nie estimated_hr ---
     def draw_info(self, frame, current_fps):
@@ -150,7 +211,7 @@ class HeartRateMonitor:
         cv2.putText(frame, f"FPS: {current_fps:.1f}", (20, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 1)
 
         # Dodajemy informację o czasie do następnej aktualizacji
-        time_to_update = DISPLAY_UPDATE_INTERVAL - (time.time() - self.last_display_update_time)
+        time_to_update = DISPLAY_UPDATE_INTERVAL - (time.monotonic() - self.last_display_update_time)
         if time_to_update < 0: time_to_update = 0
         cv2.putText(frame, f"NASTEPNY WYNIK: {time_to_update:.1f}s", (20, 130), cv2.FONT_HERSHEY_SIMPLEX, 0.7,
                     (255, 255, 255), 1)
@@ -160,46 +221,131 @@ class HeartRateMonitor:
     # --- KLUCZOWA ZMIANA: Logika aktualizacji HR ---
     def get_heart_rate(self, show_frame=False):
         ret, frame = self.cap.read()
+        capture_time = time.monotonic()
         if not ret: return self.stable_hr
+        return self.process_frame(frame, show_frame=show_frame, capture_time=capture_time)
+
+    def _detect_landmarks(self, frame):
+        """FaceMesh na klatce zmniejszonej do inference_width (współrzędne i tak są znormalizowane)."""
+        self.landmark_frames += 1
+        if self.inference is not None:
+            return self.inference.process(frame)  # None, gdy wspólne grafy jeszcze się budują
+        if self.inference_width and self.w > self.inference_width:
+            height = max(1, int(round(self.h * self.inference_width / float(self.w))))
+            frame = cv2.resize(frame, (self.inference_width, height), interpolation=cv2.INTER_AREA)
+        return self.face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    def _patch(self, frame, cx, cy):
+        """Łata w skali szarości (float32) wokół (cx, cy); None przy krawędzi klatki."""
+        half = TRACK_PATCH // 2
+        x1, y1 = int(cx) - half, int(cy) - half
+        if x1 < 0 or y1 < 0 or x1 + TRACK_PATCH > self.w or y1 + TRACK_PATCH > self.h:
+            return None
+        patch = cv2.cvtColor(frame[y1:y1 + TRACK_PATCH, x1:x1 + TRACK_PATCH], cv2.COLOR_BGR2GRAY)
+        return patch.astype(np.float32)
+
+    def _track_roi(self, frame):
+        """Przesuwa ROI o przesunięcie obrazu wokół czoła między klatkami (bez FaceMesh)."""
+        cx, cy = self.roi_center
+        patch = self._patch(frame, cx, cy)
+        if patch is not None and self._track_patch is not None:
+            (dx, dy), response = cv2.phaseCorrelate(self._track_patch, patch)
+            if response >= TRACK_MIN_RESPONSE:
+                self.roi_center = (cx + dx, cy + dy)
+                patch = self._patch(frame, *self.roi_center)
+        self._track_patch = patch
+
+    def _update_roi(self, frame):
+        """
+        Aktualizuje roi_center: FaceMesh co landmark_every_n klatek (i zawsze, gdy
+        twarz zgubiona), pomiędzy śledzenie. False, gdy model nie jest jeszcze gotowy.
+        """
+        if self.roi_center is not None and self._frames_since_landmarks + 1 < self.landmark_every_n:
+            self._frames_since_landmarks += 1
+            self._track_roi(frame)
+            return True
+
+        results = self._detect_landmarks(frame)
+        if results is None:
+            return False
+        self._frames_since_landmarks = 0
+        self._last_results = results
+        if results.multi_face_landmarks:
+            p = results.multi_face_landmarks[0].landmark[FOREHEAD_CENTER_INDEX]
+            self.roi_center = (p.x * self.w, p.y * self.h)
+            self._track_patch = self._patch(frame, *self.roi_center)
+        else:
+            self.roi_center = None
+            self._track_patch = None
+        return True
+
+    def roi_sample(self, frame):
+        """
+        (roi_center, średnie BGR ROI) dla klatki - FaceMesh/śledzenie jak w process_frame,
+        bez analizy sygnału (proces kamery z rejestru); None bez twarzy albo modelu.
+        """
+        self.h, self.w, _ = frame.shape
+        if not self._update_roi(frame) or self.roi_center is None:
+            return None
+        if self.get_roi_color_at(frame, *self.roi_center, draw=False) is None:
+            return None
+        return self.roi_center, self.last_roi_mean
+
+    def add_sample(self, avg_green, current_time):
+        """
+        Próbka PPG (średnia zieleń ROI albo None) z czasu current_time - bufory, FFT,
+        stabilizacja i HRV. Bez klatki, więc także przy odtwarzaniu nagrania.
+        """
+        if avg_green is not None:
+            self.raw_signal.append(avg_green)
+            self.times.append(current_time)
+            # Krew pochłania zieleń - skurcz to minimum jasności, stąd odwrócony sygnał
+            self.ibi_extractor.update(-avg_green, current_time)
+
+        # 1. PRZELICZANIE HR (częste, ale niewyświetlane)
+        # Przeliczamy tylko, gdy bufor jest pełny (i co CALC_INTERVAL)
+        if len(self.raw_signal) == BUFFER_SIZE or current_time - self.last_calc_time > CALC_INTERVAL:
+            temp_hr = self.analyze_signal()
+            if temp_hr > 0:
+                self.hr_history.append(temp_hr)  # Dodaj tylko sensowne wyniki
+
+        # 2. STABILIZACJA WYNIKU (rzadkie, dla wyświetlania)
+        if current_time - self.last_display_update_time >= DISPLAY_UPDATE_INTERVAL and len(self.hr_history) > 0:
+            # Oblicz średnią z ostatnich sensownych wyników HR
+            self.stable_hr = np.mean(self.hr_history)
+
+            # Zresetuj czas i historię
+            self.last_display_update_time = current_time
+            self.hr_history.clear()
+        return self.stable_hr
 
+    def process_frame(self, frame, show_frame=False, capture_time=None):
+        """
+        Przetwarza jedną klatkę BGR; klatka nie jest modyfikowana, gdy show_frame=False.
+        capture_time (time.monotonic()) to czas próbki PPG/IBI - opóźnienie przetwarzania
+        (FaceMesh co kilka klatek) nie dodaje jittera do HRV; trafia też do nagrania.
+        """
         self.h, self.w, _ = frame.shape
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(frame_rgb)
-        current_time = time.time()
+        if not self._update_roi(frame):
+            return self.stable_hr  # model jeszcze się buduje
+        current_time = time.monotonic() if capture_time is None else capture_time
 
         current_fps = 1.0 / (current_time - self.last_calc_time) if current_time > self.last_calc_time else 0.0
         self.last_calc_time = current_time
 
-        if results.multi_face_landmarks:
-            face_landmarks = results.multi_face_landmarks[0].landmark
-
-            avg_green = self.get_roi_color(frame, face_landmarks)
-
-            if avg_green is not None:
-                self.raw_signal.append(avg_green)
-                self.times.append(current_time)
-
-            # 1. PRZELICZANIE HR (częste, ale niewyświetlane)
-            # Przeliczamy tylko, gdy bufor jest pełny (i co CALC_INTERVAL)
-            if len(self.raw_signal) == BUFFER_SIZE or current_time - self.last_calc_time > CALC_INTERVAL:
-                temp_hr = self.analyze_signal()
-                if temp_hr > 0:
-                    self.hr_history.append(temp_hr)  # Dodaj tylko sensowne wyniki
-
-            # 2. STABILIZACJA WYNIKU (rzadkie, dla wyświetlania)
-            if current_time - self.last_display_update_time >= DISPLAY_UPDATE_INTERVAL and len(self.hr_history) > 0:
-                # Oblicz średnią z ostatnich sensownych wyników HR
-                self.stable_hr = np.mean(self.hr_history)
-
-                # Zresetuj czas i historię
-                self.last_display_update_time = current_time
-                self.hr_history.clear()
+        if self.roi_center is not None:
+            # Średnia z pełnej rozdzielczości - wierność sygnału jak przy FaceMesh na całej klatce
+            avg_green = self.get_roi_color_at(frame, *self.roi_center, draw=show_frame)
+            self.add_sample(avg_green, current_time)
+            if self.recorder is not None:
+                self.recorder.record_pulse(current_time, self.w, self.h, self.roi_center,
+                                           self.last_roi_mean if avg_green is not None else None)
 
             # 3. WIZUALIZACJA
             if show_frame:
                 # Wizualizacja siatki pulsującej jest stale aktualizowana
                 if avg_green is not None:
-                    self.draw_pulsating_face_mesh(frame, results, avg_green)
+                    self.draw_pulsating_face_mesh(frame, self._last_results, avg_green)
 
                 self.draw_info(frame, current_fps)
                 cv2.imshow("Heart Rate Monitor", frame)
@@ -207,12 +353,173 @@ class HeartRateMonitor:
 
         return self.stable_hr
 
+    def reset(self, now=None):
+        """Czyści bufory sygnału (nowa przerwa = nowy pomiar); now - zegar próbek (time.monotonic())."""
+        now = time.monotonic() if now is None else now
+        self.raw_signal.clear()
+        self.times.clear()
+        self.hr_history.clear()
+        self.pulse_values.clear()
+        self.stable_hr = 0.0
+        self.estimated_hr = 0.0
+        self.signal_quality = 0.0
+        self.last_calc_time = now
+        self.last_display_update_time = now
+        self.roi_center = None
+        self._track_patch = None
+        self._frames_since_landmarks = 0
+        self.ibi_extractor.reset()
+
     def release(self):
-        self.cap.release()
-        self.face_mesh.close()
+        if self.cap is not None:
+            self.cap.release()
+        if self.face_mesh is not None:
+            self.face_mesh.close()
         cv2.destroyAllWindows()
 
 
+class PulseMonitorWorker(QThread):
+    """
+    Pomiar tętna w tle, tylko w trakcie przerwy.
+
+    Klatki pochodzą ze wspólnej skrzynki EyeTrackera (subskrypcja), więc
+    kamera nie jest otwierana drugi raz. Przetwarzanie jest ograniczone do
+    frame_budget_fps; jakość sygnału emitowana co najwyżej raz na
+    quality_interval_s (BPM - przy każdym odświeżeniu stabilnego wyniku).
+    Poza przerwą wątek tylko czeka - zero kosztu w pracy.
+
+    Z `remote` (CameraHub) tętno mierzy proces osobnej kamery z rejestru -
+    wątek dostaje tylko średnie ROI (push_sample) i liczy FFT/HRV.
+    """
+    bpm_signal = pyqtSignal(object)  # int BPM albo None (brak wyniku)
+    quality_signal = pyqtSignal(float)
+    # RMSSD (ms), SDNN (ms), wskaźnik stresu 0-1 - przed bpm_signal, gdy okno HRV jest pełne
+    hrv_signal = pyqtSignal(float, float, float)
+
+    def __init__(self, frame_source, frame_budget_fps=PULSE_FRAME_BUDGET_FPS,
+                 quality_interval_s=2.0, inference=None, recorder=None, remote=None, parent=None):
+        super().__init__(parent)
+        self.frame_source = frame_source  # LatestFrameCapture (None, gdy remote)
+        self.inference = inference  # SharedInference albo None (własny FaceMesh)
+        self.recorder = recorder  # LandmarkRecorder albo None
+        self.remote = remote  # CameraHub albo None
+        self.subscription = None
+        self._samples = queue.Queue(maxsize=64)
+        if remote is not None:
+            remote.connect_monitor('pulse', self.push_sample)
+        else:
+            self.subscription = frame_source.subscribe()
+        self.frame_budget_fps = max(MIN_FPS, frame_budget_fps)
+        self.quality_interval_s = quality_interval_s
+        self.monitor = None
+        self.running = True
+        self._active = threading.Event()
+        self._reset_requested = False
+        self._last_quality_time = 0.0
+        self._last_hr_update = None
+
+    def set_active(self, active):
+        """Włącza/wyłącza pomiar; skrzynka czyta pełne klatki tylko, gdy ktoś ich potrzebuje."""
+        if self.remote is not None:
+            self.remote.set_active('pulse', active)
+        else:
+            self.frame_source.set_active(active, consumer='pulse')
+        if active:
+            self._active.set()
+        else:
+            self._active.clear()
+
+    def begin_break(self):
+        """Nowa przerwa (start_break_session) - czyści bufory i zaczyna pomiar."""
+        self._reset_requested = True
+        self.set_active(True)
+
+    def end_break(self):
+        """Koniec przerwy (start_work_session)."""
+        self.set_active(False)
+        self.bpm_signal.emit(None)
+
+    def push_sample(self, capture_time, width, height, sample):
+        """Próbka (roi_center, średnie BGR) z procesu kamery (wątek CameraHub)."""
+        try:
+            self._samples.put_nowait((capture_time, width, height, sample))
+        except queue.Full:
+            pass  # wątek nie nadąża - próbka przepada, kolejne mają dalej poprawne czasy
+
+    def _process_remote_sample(self):
+        try:
+            capture_time, width, height, (center, mean) = self._samples.get(timeout=1.0)
+        except queue.Empty:
+            return False
+        green = None if mean is None else float(mean[1])
+        self.monitor.last_calc_time = capture_time
+        self.monitor.add_sample(green, capture_time)
+        if self.recorder is not None:
+            self.recorder.record_pulse(capture_time, width, height, center, mean)
+        return True
+
+    def _emit_throttled(self):
+        # BPM: tylko gdy monitor odświeżył stabilny wynik (co DISPLAY_UPDATE_INTERVAL)
+        if self.monitor.last_display_update_time != self._last_hr_update:
+            self._last_hr_update = self.monitor.last_display_update_time
+            hrv = self.monitor.ibi_extractor
+            if hrv.ready:
+                self.hrv_signal.emit(hrv.rmssd_ms, hrv.sdnn_ms, hrv.stress)
+            if self.monitor.stable_hr > 0:
+                self.bpm_signal.emit(int(round(self.monitor.stable_hr)))
+
+        now = time.monotonic()
+        if now - self._last_quality_time >= self.quality_interval_s:
+            self._last_quality_time = now
+            self.quality_signal.emit(self.monitor.signal_quality)
+
+    def run(self):
+        frame_interval = 1.0 / self.frame_budget_fps
+        while self.running:
+            if not self._active.wait(timeout=0.5):
+                continue
+
+            if self.monitor is None:
+                try:
+                    self.monitor = HeartRateMonitor(own_camera=False, inference=self.inference,
+                                                    load_model=self.remote is None)
+                    self.monitor.recorder = self.recorder
+                except Exception as e:
+                    print(f"PulseMonitorWorker: nie można uruchomić monitora tętna: {e}")
+                    self.running = False
+                    return
+            if self._reset_requested:
+                self._reset_requested = False
+                # Stare próbki z procesu kamery nie należą do nowej przerwy
+                while not self._samples.empty():
+                    self._samples.get_nowait()
+                self.monitor.reset()
+                self._last_hr_update = self.monitor.last_display_update_time
+
+            if self.remote is not None:
+                if self._process_remote_sample():
+                    self._emit_throttled()
+                continue
+
+            start = time.monotonic()
+            ret, frame, capture_time = self.subscription.read(timeout=1.0)
+            if not ret:
+                continue
+            self.monitor.process_frame(frame, capture_time=capture_time)
+            self._emit_throttled()
+
+            sleep_time = frame_interval - (time.monotonic() - start)
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+
+    def stop(self):
+        self.set_active(False)
+        self.running = False
+        self.wait()
+        if self.monitor is not None and self.monitor.face_mesh is not None:
+            self.monitor.face_mesh.close()
+
+
 def main():
     try:
         monitor = HeartRateMonitor()
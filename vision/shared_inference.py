@@ -0,0 +1,160 @@
+import threading
+
+import cv2
+import numpy as np
+
+from vision.model_loader import AsyncModel
+
+# Tryby inferencji, gdy działa kilka monitorów naraz
+INFERENCE_SEPARATE = 'separate'  # każdy monitor ma własny graf (FaceMesh/Pose) - domyślnie
+INFERENCE_HOLISTIC = 'holistic'  # jeden graf MediaPipe Holistic (twarz + sylwetka)
+INFERENCE_SHARED = 'shared'      # Pose na całej klatce + FaceMesh na wycinku twarzy z Pose
+INFERENCE_MODES = (INFERENCE_SEPARATE, INFERENCE_HOLISTIC, INFERENCE_SHARED)
+
+# Punkty twarzy w Pose (nos, oczy, uszy, usta) - z nich wycinek dla FaceMesh
+POSE_FACE_LANDMARKS = range(0, 11)
+FACE_CROP_SCALE = 1.8  # wycinek = rozpiętość punktów twarzy z Pose * skala (kwadrat)
+MIN_FACE_CROP_PX = 64
+
+
+class SharedResult:
+    """Wynik zgodny z wynikami FaceMesh/Pose: multi_face_landmarks, pose_landmarks."""
+
+    def __init__(self, multi_face_landmarks=None, pose_landmarks=None):
+        self.multi_face_landmarks = multi_face_landmarks
+        self.pose_landmarks = pose_landmarks
+
+
+class _SharedGraph:
+    """Pose + FaceMesh dla trybu INFERENCE_SHARED (jeden obiekt -> jedno close())."""
+
+    def __init__(self, pose, face_mesh):
+        self.pose = pose
+        self.face_mesh = face_mesh
+
+    def close(self):
+        self.pose.close()
+        self.face_mesh.close()
+
+
+def face_crop_from_pose(pose_landmarks, width, height):
+    """Kwadratowy wycinek twarzy (x0, y0, x1, y1) w pikselach albo None."""
+    points = [(p.x * width, p.y * height) for i, p in enumerate(pose_landmarks.landmark)
+              if i in POSE_FACE_LANDMARKS and p.visibility > 0.5]
+    if len(points) < 3:
+        return None
+    xs, ys = zip(*points)
+    cx, cy = (min(xs) + max(xs)) / 2.0, (min(ys) + max(ys)) / 2.0
+    half = max(MIN_FACE_CROP_PX, max(max(xs) - min(xs), max(ys) - min(ys)) * FACE_CROP_SCALE) / 2.0
+    x0, y0 = int(max(0, cx - half)), int(max(0, cy - half))
+    x1, y1 = int(min(width, cx + half)), int(min(height, cy + half))
+    if x1 - x0 < MIN_FACE_CROP_PX // 2 or y1 - y0 < MIN_FACE_CROP_PX // 2:
+        return None
+    return x0, y0, x1, y1
+
+
+def _landmarks_to_frame(face_landmarks, crop, width, height):
+    """Przelicza landmarki z wycinka na współrzędne znormalizowane całej klatki."""
+    from mediapipe.framework.formats import landmark_pb2
+
+    x0, y0, x1, y1 = crop
+    crop_w, crop_h = float(x1 - x0), float(y1 - y0)
+    mapped = landmark_pb2.NormalizedLandmarkList()
+    for p in face_landmarks.landmark:
+        mapped.landmark.add(x=(x0 + p.x * crop_w) / width,
+                            y=(y0 + p.y * crop_h) / height,
+                            z=p.z * crop_w / width)  # z jest w skali szerokości obrazu
+    return mapped
+
+
+class SharedInference:
+    """
+    Jedna inferencja na klatkę dla wszystkich monitorów (wzrok, tętno, postawa).
+
+    Monitory czytają tę samą klatkę ze skrzynki (LatestFrameCapture), więc
+    wynik jest zapamiętywany dla ostatniej klatki: pierwszy monitor liczy,
+    kolejne dostają gotowy SharedResult. Grafy MediaPipe nie są bezpieczne
+    dla wielu wątków - process() jest serializowany blokadą.
+
+    Który tryb jest tańszy, zależy od zestawu monitorów - patrz
+    vision/inference_benchmark.py.
+    """
+
+    def __init__(self, mode=INFERENCE_HOLISTIC, pose_complexity=0):
+        if mode not in (INFERENCE_HOLISTIC, INFERENCE_SHARED):
+            raise ValueError(f"SharedInference: nieobsługiwany tryb {mode!r}")
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._last_frame = None
+        self._last_result = None
+        self.frames_processed = 0
+
+        def build():
+            import mediapipe as mp
+            if mode == INFERENCE_HOLISTIC:
+                return mp.solutions.holistic.Holistic(
+                    model_complexity=pose_complexity,
+                    min_detection_confidence=0.6,
+                    min_tracking_confidence=0.6
+                )
+            return _SharedGraph(
+                mp.solutions.pose.Pose(model_complexity=pose_complexity,
+                                       min_detection_confidence=0.6, min_tracking_confidence=0.6),
+                mp.solutions.face_mesh.FaceMesh(max_num_faces=1, refine_landmarks=True,
+                                                min_detection_confidence=0.6, min_tracking_confidence=0.6)
+            )
+
+        # Zgodne z AsyncModel monitorów (ready/failed/future) - EyeMonitorWorker czeka na gotowość
+        self.model = AsyncModel(build, "Holistic" if mode == INFERENCE_HOLISTIC else "Pose+FaceMesh")
+
+    @property
+    def ready(self):
+        return self.model.ready
+
+    def process(self, frame):
+        """
+        SharedResult dla klatki BGR albo None, gdy grafy jeszcze się budują.
+        Klatka nie jest modyfikowana (jest współdzielona przez monitory).
+        """
+        graph = self.model.get()
+        if graph is None:
+            return None
+        with self._lock:
+            if frame is self._last_frame:
+                return self._last_result
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            if self.mode == INFERENCE_HOLISTIC:
+                result = self._process_holistic(graph, frame_rgb)
+            else:
+                result = self._process_shared(graph, frame_rgb)
+            self._last_frame = frame
+            self._last_result = result
+            self.frames_processed += 1
+            return result
+
+    def _process_holistic(self, holistic, frame_rgb):
+        results = holistic.process(frame_rgb)
+        faces = [results.face_landmarks] if results.face_landmarks else None
+        return SharedResult(faces, results.pose_landmarks)
+
+    def _process_shared(self, graph, frame_rgb):
+        height, width = frame_rgb.shape[:2]
+        pose_results = graph.pose.process(frame_rgb)
+        crop = None
+        if pose_results.pose_landmarks:
+            crop = face_crop_from_pose(pose_results.pose_landmarks, width, height)
+
+        if crop is None:
+            # Pose nie widzi twarzy - FaceMesh na całej klatce
+            face_results = graph.face_mesh.process(frame_rgb)
+            return SharedResult(face_results.multi_face_landmarks, pose_results.pose_landmarks)
+
+        x0, y0, x1, y1 = crop
+        face_results = graph.face_mesh.process(np.ascontiguousarray(frame_rgb[y0:y1, x0:x1]))
+        faces = None
+        if face_results.multi_face_landmarks:
+            faces = [_landmarks_to_frame(face_results.multi_face_landmarks[0], crop, width, height)]
+        return SharedResult(faces, pose_results.pose_landmarks)
+
+    def close(self):
+        self.model.close()
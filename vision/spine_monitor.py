@@ -1,17 +1,73 @@
 import cv2
 import mediapipe as mp
 import numpy as np
+import queue
+import threading
 import time
 from collections import deque
+from PyQt5.QtCore import QThread, pyqtSignal
+
+try:
+    from vision.camera_modes import negotiate_camera_mode, device_key
+    from vision.camera_factory import open_camera
+    from vision.model_loader import pose_async
+    from vision.landmark_recorder import LandmarkView
+except ImportError:  # uruchamiany bezpośrednio jako skrypt z katalogu vision/
+    from camera_modes import negotiate_camera_mode, device_key
+    from camera_factory import open_camera
+    from model_loader import pose_async
+    from landmark_recorder import LandmarkView
+
+# Samokalibracja bez udziału użytkownika - tylko ze stabilnej, wyprostowanej postawy
+AUTO_CALIBRATION_MAX_STD = (0.03, 0.04, 4.0)  # dy, dz, kąt tułowia w oknie próbek
+AUTO_CALIBRATION_MAX_DY = -0.35     # ucho co najmniej tyle szerokości ramion nad barkiem
+AUTO_CALIBRATION_MAX_DZ = 0.25      # głowa nie wysunięta daleko przed barki
+AUTO_CALIBRATION_MIN_TORSO = 150.0  # kąt biodro-ramię-ucho (gdy biodro widoczne)
+
+
+def is_steady_upright(samples):
+    """
+    Czy próbki (dy, dz, kąt tułowia) nadają się na samokalibrację: mały rozrzut
+    w oknie i średnia w zakresie wyprostowanej postawy. Kąt 90.0 oznacza brak
+    biodra w kadrze - wtedy kąt tułowia nie jest sprawdzany.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if samples.ndim != 2 or len(samples) < 3:
+        return False
+    if np.any(samples.std(axis=0) > AUTO_CALIBRATION_MAX_STD):
+        return False
+    dy, dz, torso = samples.mean(axis=0)
+    if dy > AUTO_CALIBRATION_MAX_DY or dz > AUTO_CALIBRATION_MAX_DZ:
+        return False
+    return np.all(samples[:, 2] == 90.0) or torso >= AUTO_CALIBRATION_MIN_TORSO
 
 mp_pose = mp.solutions.pose
 
 
 class PostureTracker:
-    def __init__(self, smooth_window=10):
-        self.cap = cv2.VideoCapture(0)
-        self.pose = mp_pose.Pose(min_detection_confidence=0.7, min_tracking_confidence=0.7)
-        self.history = deque(maxlen=smooth_window)
+    def __init__(self, smooth_window=10, own_camera=True, model_complexity=0, inference=None,
+                 load_model=True):
+        """
+        own_camera=False - klatki podaje wywołujący przez process_frame() (np. PostureWorker).
+        inference - wspólna inferencja (SharedInference) zamiast własnego Pose.
+        load_model=False - bez Pose; landmarki przez process_landmarks() (odtwarzanie nagrania).
+        """
+        self.cap = None
+        if own_camera:
+            self.cap, _backend, camera_index = open_camera()
+            self.camera_mode = negotiate_camera_mode(self.cap, ('posture',), device_key(self.cap, camera_index))
+        self.inference = inference
+        if inference is not None:
+            self.pose_model = inference.model  # zamyka właściciel SharedInference
+        elif not load_model:
+            self.pose_model = None
+        else:
+            # Najlżejszy model Pose (complexity 0), budowany w tle
+            self.pose_model = pose_async(model_complexity=model_complexity,
+                                         min_detection_confidence=0.7, min_tracking_confidence=0.7)
+        self.smooth_window = smooth_window
+        self.history = deque()
+        self._sums = [0.0, 0.0, 0.0]  # bieżące sumy (dy, dz, torso) - średnia w O(1)
         self.h, self.w = 0, 0
 
         # Kalibracja
@@ -22,6 +78,8 @@ class PostureTracker:
         self.threshold_y = 0.05     # różnica pionowa
         self.threshold_z = 0.07     # różnica głębokości
         self.threshold_torso = 10.0 # różnica kąta (stopnie)
+        self.last_points = (None, None, None)  # ucho, bark, biodro z ostatniej oceny
+        self.recorder = None  # LandmarkRecorder - nagrywanie landmarków Pose
 
     def _get_point(self, landmarks, idx):
         p = landmarks[idx]
@@ -86,38 +144,86 @@ class PostureTracker:
 
         return dy, dz, torso_angle, ear, shoulder, hip
 
+    def _push_sample(self, sample):
+        """Dodaje próbkę do okna wygładzania i zwraca średnią (bieżące sumy, bez np.mean)."""
+        if len(self.history) == self.smooth_window:
+            old = self.history.popleft()
+            for i in range(3):
+                self._sums[i] -= old[i]
+        self.history.append(sample)
+        for i in range(3):
+            self._sums[i] += sample[i]
+        n = len(self.history)
+        return self._sums[0] / n, self._sums[1] / n, self._sums[2] / n
+
+    def set_calibration(self, base_dy, base_dz, base_torso_angle):
+        """Ustawia zapamiętaną kalibrację (np. z bazy danych)."""
+        self.base_dy, self.base_dz, self.base_torso_angle = base_dy, base_dz, base_torso_angle
+        self.calibrated = True
+
     def check_posture(self, show_frame=False):
         ret, frame = self.cap.read()
         if not ret:
             return None
+        return self.process_frame(frame, show_frame=show_frame)
+
+    def process_landmarks(self, landmarks):
+        """
+        Ocena postawy z landmarków Pose (bez inferencji - także przy odtwarzaniu nagrania).
+        Zwraca (is_straight, dy_s, dz_s, torso_s) albo None; is_straight None bez kalibracji.
+        """
+        values = self.measure_posture(landmarks)
+        if not values:
+            return None
+        dy, dz, torso_angle, ear, shoulder, hip = values
+        self.last_points = (ear, shoulder, hip)
+
+        dy_s, dz_s, torso_s = self._push_sample((float(dy), float(dz), float(torso_angle)))
+        if not self.calibrated:
+            return None, dy_s, dz_s, torso_s
+
+        is_straight = (
+            abs(dy_s - self.base_dy) < self.threshold_y and
+            abs(dz_s - self.base_dz) < self.threshold_z and
+            abs(torso_s - self.base_torso_angle) < self.threshold_torso
+        )
+        return is_straight, dy_s, dz_s, torso_s
+
+    def process_frame(self, frame, show_frame=False, capture_time=None):
+        """
+        Ocena postawy dla jednej klatki; None, gdy brak sylwetki albo model się rozgrzewa.
+        capture_time (time.monotonic()) trafia do nagrania, gdy ustawiony jest recorder.
+        """
+        pose = self.pose_model.get(timeout=30 if self.cap is not None else 0)
+        if pose is None:
+            return None
 
         self.h, self.w, _ = frame.shape
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.pose.process(frame_rgb)
+        if self.inference is not None:
+            results = self.inference.process(frame)  # wynik wspólny ze wzrokiem/tętnem
+        else:
+            results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+        if self.recorder is not None:
+            self.recorder.record_posture(time.monotonic() if capture_time is None else capture_time,
+                                         self.w, self.h,
+                                         results.pose_landmarks.landmark if results.pose_landmarks else None)
 
         if results.pose_landmarks:
-            values = self.measure_posture(results.pose_landmarks.landmark)
-            if not values:
+            result = self.process_landmarks(results.pose_landmarks.landmark)
+            if result is None:
                 return None
-            dy, dz, torso_angle, ear, shoulder, hip = values
-
-            self.history.append((dy, dz, torso_angle))
-            dy_s, dz_s, torso_s = np.mean(self.history, axis=0)
+            is_straight, dy_s, dz_s, torso_s = result
+            ear, shoulder, hip = self.last_points
 
             # Kalibracja
             if not self.calibrated:
                 color = (255, 255, 0)
                 label = "Press C to calibrate"
-                is_straight = None
             else:
                 diff_y = abs(dy_s - self.base_dy)
                 diff_z = abs(dz_s - self.base_dz)
                 diff_t = abs(torso_s - self.base_torso_angle)
-                is_straight = (
-                    diff_y < self.threshold_y and
-                    diff_z < self.threshold_z and
-                    diff_t < self.threshold_torso
-                )
                 color = (0, 255, 0) if is_straight else (0, 0, 255)
                 label = f"{'OK' if is_straight else 'SLOUCH'} dy={diff_y:.3f} dz={diff_z:.3f} t={diff_t:.1f}°"
 
@@ -139,7 +245,7 @@ class PostureTracker:
                             cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
                 cv2.imshow("Posture Tracker", frame)
 
-            return is_straight, dy_s, dz_s, torso_s
+            return result
 
         return None
 
@@ -147,15 +253,181 @@ class PostureTracker:
         if len(self.history) < 3:
             print("Zbyt mało danych do kalibracji – usiądź prosto i chwilę poczekaj.")
             return
-        self.base_dy, self.base_dz, self.base_torso_angle = np.mean(self.history, axis=0)
-        self.calibrated = True
+        n = len(self.history)
+        self.set_calibration(self._sums[0] / n, self._sums[1] / n, self._sums[2] / n)
         print(f"[KALIBRACJA] dy={self.base_dy:.3f}, dz={self.base_dz:.3f}, torso={self.base_torso_angle:.1f}°")
 
     def release(self):
-        self.cap.release()
+        if self.cap is not None:
+            self.cap.release()
+        if self.inference is None and self.pose_model is not None:
+            self.pose_model.close()
         cv2.destroyAllWindows()
 
 
+class PostureWorker(QThread):
+    """
+    Monitorowanie postawy w trakcie pracy przy niskim koszcie CPU.
+
+    Co 1/sample_hz sekundy (0.5-2 Hz) pobiera jedną świeżą klatkę ze wspólnej
+    skrzynki EyeTrackera (skrzynka jest aktywna tylko na czas odczytu) i
+    przepuszcza ją przez Pose (complexity 0). Kalibrację bierze z bazy; gdy
+    jej nie ma, kalibruje się sama dopiero z okna próbek stabilnej,
+    wyprostowanej postawy (is_steady_upright) - zgarbiony start nie staje się
+    wzorcem. Kalibracja z menu tray (recalibrate) przyjmuje najbliższe próbki
+    bez tego warunku. Wynik idzie do zapisu przez calibrated_signal. Dłuższe garbienie się -> slouch_signal
+    (z przerwą między kolejnymi powiadomieniami).
+
+    Z `remote` (CameraHub) Pose działa w procesie osobnej kamery z rejestru
+    (np. zewnętrznej, widzącej sylwetkę) - wątek dostaje landmarki (push_landmarks).
+    """
+    slouch_signal = pyqtSignal(float, float, float)  # odchylenia dy, dz, kąt tułowia
+    calibrated_signal = pyqtSignal(float, float, float)  # base_dy, base_dz, base_torso_angle
+
+    def __init__(self, frame_source, calibration=None, sample_hz=1.0, slouch_min_duration_s=30.0,
+                 notify_cooldown_s=600.0, auto_calibration_samples=10, inference=None, recorder=None,
+                 remote=None, parent=None):
+        super().__init__(parent)
+        self.frame_source = frame_source  # LatestFrameCapture (None, gdy remote)
+        self.inference = inference  # SharedInference albo None (własny Pose)
+        self.recorder = recorder  # LandmarkRecorder albo None
+        self.remote = remote  # CameraHub albo None
+        self.subscription = None
+        self._landmarks = queue.Queue(maxsize=8)
+        if remote is not None:
+            remote.connect_monitor('posture', self.push_landmarks)
+        else:
+            self.subscription = frame_source.subscribe()
+        self.sample_interval_s = 1.0 / min(2.0, max(0.5, sample_hz))
+        self.slouch_min_duration_s = slouch_min_duration_s
+        self.notify_cooldown_s = notify_cooldown_s
+        self.auto_calibration_samples = auto_calibration_samples
+        self.calibration = calibration  # (base_dy, base_dz, base_torso_angle) albo None
+        self.tracker = None
+        self.running = True
+        self._active = threading.Event()
+        self._recalibrate_requested = False
+        self._explicit_calibration = False  # użytkownik zadeklarował, że siedzi prosto
+        self._valid_samples = 0
+        self._slouch_since = None
+        self._last_notify = -notify_cooldown_s
+
+    def set_active(self, active):
+        """Aktywny w trakcie pracy, wstrzymany podczas przerwy."""
+        if self.remote is not None:
+            self.remote.set_active('posture', active)
+        if active:
+            self._active.set()
+        else:
+            self._active.clear()
+            self._slouch_since = None
+
+    def recalibrate(self):
+        """Kalibracja od nowa z najbliższych próbek (użytkownik siedzi prosto)."""
+        self._recalibrate_requested = True
+
+    def _read_fresh_frame(self):
+        self.frame_source.set_active(True, consumer='posture')
+        try:
+            ret, frame, capture_time = self.subscription.read(timeout=1.0)
+        finally:
+            self.frame_source.set_active(False, consumer='posture')
+        return (frame, capture_time) if ret else (None, None)
+
+    def push_landmarks(self, capture_time, width, height, pose):
+        """Landmarki Pose (33x4 albo None) z procesu kamery (wątek CameraHub)."""
+        try:
+            self._landmarks.put_nowait((capture_time, width, height, pose))
+        except queue.Full:
+            pass
+
+    def _remote_result(self):
+        try:
+            capture_time, width, height, pose = self._landmarks.get(timeout=1.0)
+        except queue.Empty:
+            return None
+        if self.recorder is not None:
+            self.recorder.record_posture(capture_time, width, height,
+                                         None if pose is None else LandmarkView(pose))
+        if pose is None:
+            return None
+        self.tracker.w, self.tracker.h = width, height
+        return self.tracker.process_landmarks(LandmarkView(pose))
+
+    def _sample(self):
+        if self.remote is not None:
+            result = self._remote_result()
+        else:
+            frame, capture_time = self._read_fresh_frame()
+            if frame is None:
+                return
+            result = self.tracker.process_frame(frame, capture_time=capture_time)
+        if result is None:
+            return
+        self._valid_samples += 1
+
+        if not self.tracker.calibrated:
+            if self._valid_samples >= self.auto_calibration_samples and (
+                    self._explicit_calibration or is_steady_upright(self.tracker.history)):
+                self._explicit_calibration = False
+                self.tracker.calibrate()
+                self.calibrated_signal.emit(self.tracker.base_dy, self.tracker.base_dz,
+                                            self.tracker.base_torso_angle)
+            return
+
+        is_straight, dy_s, dz_s, torso_s = result
+        now = time.monotonic()
+        if is_straight:
+            self._slouch_since = None
+            return
+        if self._slouch_since is None:
+            self._slouch_since = now
+        if (now - self._slouch_since >= self.slouch_min_duration_s and
+                now - self._last_notify >= self.notify_cooldown_s):
+            self._last_notify = now
+            self.slouch_signal.emit(abs(dy_s - self.tracker.base_dy), abs(dz_s - self.tracker.base_dz),
+                                    abs(torso_s - self.tracker.base_torso_angle))
+
+    def run(self):
+        while self.running:
+            if not self._active.wait(timeout=0.5):
+                continue
+
+            if self.tracker is None:
+                self.tracker = PostureTracker(own_camera=False, inference=self.inference,
+                                              load_model=self.remote is None)
+                self.tracker.recorder = self.recorder
+                if self.calibration is not None:
+                    self.tracker.set_calibration(*self.calibration)
+
+            if self._recalibrate_requested:
+                self._recalibrate_requested = False
+                self._explicit_calibration = True
+                self.tracker.calibrated = False
+                self.tracker.history.clear()
+                self.tracker._sums = [0.0, 0.0, 0.0]
+                self._valid_samples = 0
+
+            start = time.monotonic()
+            try:
+                self._sample()
+            except Exception as e:
+                print(f"PostureWorker: błąd analizy postawy: {e}")
+
+            if self.remote is not None:
+                continue  # tempo próbek wyznacza proces kamery
+            sleep_time = self.sample_interval_s - (time.monotonic() - start)
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+
+    def stop(self):
+        self.running = False
+        self.set_active(False)
+        self.wait()
+        if self.tracker is not None and self.inference is None and self.tracker.pose_model is not None:
+            self.tracker.pose_model.close()
+
+
 if __name__ == "__main__":
     tracker = PostureTracker(smooth_window=10)
     print("Uruchomiono PostureTracker PRO. Naciśnij 'C' aby skalibrować, ESC aby wyjść.")
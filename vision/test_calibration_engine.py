@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Testy dopasowania monitorów po kalibracji (pytest)."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip('PyQt5')  # calibration_engine to moduł wątku Qt
+
+try:
+    from vision.calibration_engine import MIN_INLIERS, SAMPLE_FIELDS, fit_monitors
+except ImportError:  # uruchamiany bezpośrednio z katalogu vision/
+    from calibration_engine import MIN_INLIERS, SAMPLE_FIELDS, fit_monitors
+
+CENTER = np.array([12.0, -4.0, 2.0, 300.0, 210.0, 360.0, 212.0])
+
+
+def monitor_samples(count, center=CENTER, seed=0):
+    rng = np.random.default_rng(seed)
+    return center + rng.normal(0.0, 0.3, (count, len(SAMPLE_FIELDS)))
+
+
+def test_nan_padding_and_empty_monitor():
+    samples = np.full((3, 30, len(SAMPLE_FIELDS)), np.nan)
+    samples[0] = monitor_samples(30)
+    samples[1, :12] = monitor_samples(12, CENTER + 20.0, seed=1)  # reszta wiersza to NaN
+
+    center, spread, inliers = fit_monitors(samples)
+
+    assert inliers.tolist() == [30, 12, 0]  # NaN nie liczy się jako zgodna próbka
+    np.testing.assert_allclose(center[0], CENTER, atol=0.3)
+    np.testing.assert_allclose(center[1], CENTER + 20.0, atol=0.5)
+    assert np.isnan(center[2]).all() and np.isnan(spread[2]).all()
+    assert np.all(spread[:2] < 1.0)
+
+
+def test_outliers_are_rejected():
+    samples = monitor_samples(20)[None]
+    samples[0, :3, 0] += 40.0  # trzy odwrócenia głowy w trakcie zbierania
+
+    center, _, inliers = fit_monitors(samples)
+
+    assert inliers[0] == 17
+    assert center[0, 0] == pytest.approx(CENTER[0], abs=0.3)
+
+
+def test_roll_wraps_around_180():
+    upright = CENTER.copy()
+    upright[2] = 179.8
+    samples = monitor_samples(30, upright)[None]
+    samples[..., 2] = (samples[..., 2] + 180.0) % 360.0 - 180.0  # część próbek to -179.x
+
+    center, spread, inliers = fit_monitors(samples)
+
+    assert inliers[0] == 30 >= MIN_INLIERS
+    assert abs((center[0, 2] - 179.8 + 180.0) % 360.0 - 180.0) < 0.3
+    assert spread[0, 2] < 1.0
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Testy osi czasu przerwy (pytest)."""
+
+import pytest
+
+try:
+    from vision.gaze_timeline import GazeTimeline
+except ImportError:  # uruchamiany bezpośrednio z katalogu vision/
+    from gaze_timeline import GazeTimeline
+
+
+def test_axis_starts_on_first_signal():
+    timeline = GazeTimeline()
+    timeline.reset()
+    assert not timeline.started
+
+    timeline.mark(True, now=100.25)   # pierwszy sygnał: patrzy jeszcze w ekran
+    timeline.mark(False, now=101.0)
+    timeline.stop(now=196.0)
+
+    # bez fantomowego odpoczynku przed pierwszym sygnałem i bez dodatkowego przerwania
+    assert timeline.time_intervals() == [95.0]
+    assert timeline.interruption_count() == 0
+
+
+def test_first_signal_not_looking_counts_from_that_signal():
+    timeline = GazeTimeline()
+    timeline.mark(False, now=10.0)
+    timeline.mark(True, now=40.0)
+    timeline.mark(False, now=45.0)
+    timeline.stop(now=70.0)
+
+    assert timeline.time_intervals() == [30.0, 25.0]
+    assert timeline.interruption_count() == 1
+
+
+def test_repeated_state_and_marks_after_stop_are_ignored():
+    timeline = GazeTimeline()
+    timeline.mark(False, now=0.0)
+    timeline.mark(False, now=5.0)
+    timeline.stop(now=10.0)
+    timeline.mark(True, now=12.0)
+
+    assert timeline.time_intervals() == [10.0]
+    assert timeline.interruption_count() == 0
+
+
+def test_no_signal_means_no_intervals():
+    timeline = GazeTimeline()
+    timeline.reset()
+    timeline.stop(now=50.0)
+
+    assert timeline.time_intervals(now=50.0) == []
+    assert timeline.interruption_count() == 0
+
+
+def test_folding_keeps_totals():
+    timeline = GazeTimeline(max_runs=4)
+    now = 0.0
+    for _ in range(10):  # 10 x (8 s odpoczynku + 2 s patrzenia)
+        timeline.mark(False, now=now)
+        timeline.mark(True, now=now + 8.0)
+        now += 10.0
+    timeline.stop(now=now)
+
+    assert sum(timeline.time_intervals()) == pytest.approx(80.0)
+    assert timeline.interruption_count() == 10
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Testy IBI/HRV na syntetycznym sygnale PPG (pytest)."""
+
+import numpy as np
+import pytest
+
+try:
+    from vision.hrv import IbiWindow, StreamingIbiExtractor, stress_from_rmssd
+except ImportError:  # uruchamiany bezpośrednio z katalogu vision/
+    from hrv import IbiWindow, StreamingIbiExtractor, stress_from_rmssd
+
+
+def rmssd_ms(ibis):
+    return 1000.0 * np.sqrt(np.mean(np.diff(ibis) ** 2))
+
+
+def synthetic_ppg(ibis, fs=30.0, start=1.0):
+    """Jasność ROI z pikiem (gaussowskim) w chwili każdego uderzenia; zwraca (czasy, sygnał, uderzenia)."""
+    beats = start + np.concatenate(([0.0], np.cumsum(ibis)))
+    t = np.arange(0.0, beats[-1] + 1.0, 1.0 / fs)
+    pulses = np.exp(-0.5 * ((t[:, None] - beats[None, :]) / 0.08) ** 2).sum(axis=1)
+    return t, 150.0 + 2.0 * pulses, beats
+
+
+def test_ibi_window_matches_numpy():
+    ibis = 0.8 + 0.05 * np.sin(np.arange(45) * 0.7)
+    window = IbiWindow(size=30)
+    for ibi in ibis:
+        assert window.add(ibi)
+
+    last = ibis[-30:]  # okno przesuwne - liczą się tylko ostatnie 30
+    assert window.count == 30
+    assert window.rmssd_ms == pytest.approx(rmssd_ms(last))
+    assert window.sdnn_ms == pytest.approx(1000.0 * np.std(last))
+
+
+def test_ibi_window_rejects_artifacts():
+    window = IbiWindow()
+    for ibi in (0.8, 0.82, 0.79, 0.81):
+        window.add(ibi)
+
+    assert not window.add(0.2)   # poza zakresem tętna
+    assert not window.add(1.3)   # >30% od średniej okna
+    assert window.count == 4
+
+
+def test_extractor_recovers_pulse_train():
+    ibis = 0.8 + 0.04 * np.sin(np.arange(60) * 0.9)
+    t, signal, _ = synthetic_ppg(ibis)
+    extractor = StreamingIbiExtractor(fs=30.0)
+
+    found = [ibi for ibi in (extractor.update(value, time) for value, time in zip(signal, t))
+             if ibi is not None]
+
+    assert len(found) == len(ibis)
+    assert np.max(np.abs(np.array(found) - ibis)) < 0.005  # interpolacja piku lepsza niż 1/fps
+    assert extractor.ready
+    window = ibis[-extractor.window.count:]
+    assert extractor.rmssd_ms == pytest.approx(rmssd_ms(window), abs=1.0)
+    assert extractor.stress == pytest.approx(stress_from_rmssd(rmssd_ms(window)), abs=0.05)
+
+
+def test_extractor_not_ready_without_enough_beats():
+    t, signal, _ = synthetic_ppg(np.full(5, 0.8))
+    extractor = StreamingIbiExtractor(fs=30.0)
+    for value, time in zip(signal, t):
+        extractor.update(value, time)
+
+    assert not extractor.ready
+    assert extractor.stress is None
+
+
+def test_stress_from_rmssd_is_clamped():
+    assert stress_from_rmssd(100.0) == 0.0
+    assert stress_from_rmssd(5.0) == 1.0
+    assert 0.0 < stress_from_rmssd(30.0) < 1.0
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Testy zapisu i odczytu nagrań landmarków (pytest)."""
+
+import numpy as np
+
+try:
+    from vision.landmark_recorder import (FACE_LANDMARKS, POSE_LANDMARKS, LandmarkRecorder,
+                                          LandmarkRecording, LandmarkView)
+except ImportError:  # uruchamiany bezpośrednio z katalogu vision/
+    from landmark_recorder import (FACE_LANDMARKS, POSE_LANDMARKS, LandmarkRecorder,
+                                   LandmarkRecording, LandmarkView)
+
+
+class Point:
+    def __init__(self, x, y, z, visibility=1.0):
+        self.x, self.y, self.z, self.visibility = x, y, z, visibility
+
+
+def test_round_trip_across_chunks(tmp_path):
+    recorder = LandmarkRecorder(str(tmp_path), chunk_frames=4)
+    face = [Point(i / 1000.0, 0.5, -0.01) for i in range(FACE_LANDMARKS)]
+    for frame in range(10):
+        recorder.record_gaze(frame * 0.25, 640, 480, face, angles=(frame, -frame))
+        recorder.record_pulse(frame * 0.05, 640, 480, roi_center=(320, 100), roi_mean=(90, 120, 150 + frame))
+    recorder.close()
+
+    recording = LandmarkRecording(str(tmp_path))
+    assert recording.frames('gaze') == 10
+    assert len(recording.chunks('gaze')) == 3  # 4 + 4 + niepełny 2 po close()
+    np.testing.assert_allclose(recording.field('gaze', 't'), np.arange(10) * 0.25)
+    np.testing.assert_allclose(recording.field('gaze', 'angles')[:, 1], -np.arange(10))
+    np.testing.assert_allclose(recording.field('pulse', 'roi_mean')[:, 2], 150 + np.arange(10))
+
+    first = next(recording.records('gaze'))
+    assert tuple(first['size']) == (640, 480)
+    assert first['face'][400][0] == np.float16(0.4)
+
+
+def test_missing_landmarks_are_nan(tmp_path):
+    recorder = LandmarkRecorder(str(tmp_path))
+    recorder.record_posture(1.0, 640, 480, None)
+    recorder.record_posture(2.0, 640, 480, [Point(0.1, 0.2, 0.3, 0.9)] * 5)  # niepełny zestaw punktów
+    recorder.close()
+
+    pose = LandmarkRecording(str(tmp_path)).field('posture', 'pose')
+    assert pose.shape == (2, POSE_LANDMARKS, 4)
+    assert np.isnan(pose[0]).all()
+    assert np.isnan(pose[1, 5:]).all()
+
+    view = LandmarkView(pose[1])
+    assert len(view) == POSE_LANDMARKS
+    assert (view[0].y, view[0].visibility) == (np.float32(0.2), np.float32(0.9))
+
+
+def test_empty_stream(tmp_path):
+    LandmarkRecorder(str(tmp_path)).close()
+
+    recording = LandmarkRecording(str(tmp_path))
+    assert recording.frames('posture') == 0
+    assert recording.field('gaze', 'angles').shape == (0, 2)
+    assert list(recording.records('pulse')) == []